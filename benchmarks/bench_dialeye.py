@@ -0,0 +1,54 @@
+"""Compare per reading latency of the subprocess and worker dialEye modes.
+
+Usage: python benchmarks/bench_dialeye.py [readings] [dialEye script]
+
+By default dialeye_simu.py is used as dialEye stand-in.
+"""
+
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from dialeye import SubprocessDialEye, WorkerDialEye  # noqa: E402
+
+ARGS = ["-f", "dialEye.conf", "-s", "-u", "meter", "image.jpg"]
+
+
+def measure(dialeye, readings: int) -> list[float]:
+    latencies = []
+    for _ in range(readings):
+        start = time.perf_counter()
+        retval, _ = dialeye.run(ARGS, timeout=30)
+        latencies.append(time.perf_counter() - start)
+        assert retval == 0  # nosec
+    dialeye.close()
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    print(
+        "%-10s first=%7.2f ms  median=%7.2f ms  mean=%7.2f ms  max=%7.2f ms"
+        % (
+            name,
+            latencies[0] * 1000,
+            statistics.median(latencies) * 1000,
+            statistics.mean(latencies) * 1000,
+            max(latencies) * 1000,
+        )
+    )
+
+
+def main() -> None:
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    script = sys.argv[2] if len(sys.argv) > 2 else os.path.join(ROOT, "dialeye_simu.py")
+    print(f"{readings} readings with {script}")
+    report("subprocess", measure(SubprocessDialEye(sys.executable, script), readings))
+    report("worker", measure(WorkerDialEye(sys.executable, script), readings))
+
+
+if __name__ == "__main__":
+    main()
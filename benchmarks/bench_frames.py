@@ -0,0 +1,115 @@
+"""Compare ways of handing frames to a recognition worker process.
+
+Usage: python benchmarks/bench_frames.py [frames] [frame size in MB ...]
+
+pickle  frame bytes pickled through a pipe
+file    frame written to a file and read back by the worker
+shm     frame copied to a recycled shared memory buffer, the worker gets a
+        read-only view
+
+Reports median handoff latency and peak RSS growth of both processes.
+"""
+
+import os
+import pickle  # nosec
+import statistics
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from framepool import FramePool, peak_rss_bytes  # noqa: E402
+
+
+def worker() -> None:
+    """Worker process, reads pickled requests from stdin."""
+    segments = {}
+    start_rss = peak_rss_bytes()
+    while True:
+        mode, payload = pickle.load(sys.stdin.buffer)  # nosec
+        if mode is None:
+            break
+        if mode == "pickle":
+            data = payload
+        elif mode == "file":
+            with open(payload, "rb") as file:
+                data = file.read()
+        else:
+            name, size = payload
+            if name not in segments:
+                segments[name] = SharedMemory(name=name)
+                resource_tracker.unregister(segments[name]._name, "shared_memory")
+            data = segments[name].buf[:size].toreadonly()
+        # touch the frame as a decoder would
+        pickle.dump(data[0] + data[-1], sys.stdout.buffer)
+        sys.stdout.flush()
+        del data
+    pickle.dump(peak_rss_bytes() - start_rss, sys.stdout.buffer)
+    sys.stdout.flush()
+
+
+def run(mode: str, frame: bytes, frames: int) -> tuple[float, int, int]:
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--worker"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )  # nosec
+
+    def request(message) -> object:
+        pickle.dump(message, process.stdin)
+        process.stdin.flush()
+        return pickle.load(process.stdout)  # nosec
+
+    pool = FramePool(slots=2, slot_size=len(frame))
+    path = os.path.join(tempfile.mkdtemp(), "frame.jpg")
+    start_rss = peak_rss_bytes()
+    latencies = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        if mode == "pickle":
+            request((mode, frame))
+        elif mode == "file":
+            with open(path, "wb") as file:
+                file.write(frame)
+            request((mode, path))
+        else:
+            buffer = pool.put(frame)
+            request((mode, (buffer.name, buffer.size)))
+            pool.release(buffer)
+        latencies.append(time.perf_counter() - start)
+    worker_rss = request((None, None))
+    process.wait()
+    pool.close()
+    if os.path.exists(path):
+        os.remove(path)
+    return statistics.median(latencies), peak_rss_bytes() - start_rss, worker_rss
+
+
+def main() -> None:
+    if sys.argv[1:] == ["--worker"]:
+        return worker()
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    sizes = [float(size) for size in sys.argv[2:]] or [1, 4, 16]
+    for size in sizes:
+        frame = os.urandom(int(size * 1024 * 1024))
+        for mode in ("pickle", "file", "shm"):
+            latency, app_rss, worker_rss = run(mode, frame, frames)
+            print(
+                "%5.1f MB %-7s median=%7.3f ms  app rss +%6.1f MB  worker rss +%6.1f MB"
+                % (
+                    size,
+                    mode,
+                    latency * 1000,
+                    app_rss / 1024 / 1024,
+                    worker_rss / 1024 / 1024,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""End to end benchmark of the update pipeline.
+
+Drives MyApp.do_update against a local HTTP image server, the
+dialeye_simu.py dialEye stand-in and an in-process MQTT stand-in, then
+measures result page latency under concurrent clients. Runs offline.
+
+Usage: python benchmarks/bench_pipeline.py [options]
+
+Results are written as JSON (--output) and can be compared against an
+earlier result file (--baseline).
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import http.client
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from flask import Flask  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+from prometheus_client import CollectorRegistry  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import MyApp, MyConfig  # noqa: E402
+from mqtt_framework.app import TriggerSource  # noqa: E402
+
+
+def create_image(width: int, height: int, angle: int) -> bytes:
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    box = (width // 4, height // 4, width // 2, height // 2)
+    draw.ellipse(box, outline="black", width=3)
+    draw.pieslice(box, angle, angle + 20, fill="red")
+    data = io.BytesIO()
+    image.save(data, "JPEG", quality=85)
+    return data.getvalue()
+
+
+class CameraHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    images = []
+    requests = 0
+
+    def do_GET(self):
+        image = self.images[CameraHandler.requests % len(self.images)]
+        CameraHandler.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(image)))
+        self.end_headers()
+        self.wfile.write(image)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Callbacks:
+    """In-process stand-in for the MQTT framework callbacks."""
+
+    def __init__(self, config: dict, web: Flask) -> None:
+        self.config = config
+        self.web = web
+        self.registry = CollectorRegistry()
+        self.published = 0
+        self.published_bytes = 0
+
+    def get_logger(self):
+        return logging.getLogger("bench")
+
+    def get_config(self) -> dict:
+        return self.config
+
+    def get_metrics_registry(self):
+        return self.registry
+
+    def add_url_rule(self, rule, **kwargs):
+        self.web.add_url_rule(rule, **kwargs)
+
+    def publish_value_to_mqtt_topic(self, topic: str, value: str, retain: bool):
+        self.published += 1
+        self.published_bytes += len(topic) + len(value)
+
+    def subscribe_to_mqtt_topic(self, topic: str):
+        pass
+
+
+def percentiles(values: list[float]) -> dict:
+    if len(values) < 2:
+        values = values * 2 or [0.0, 0.0]
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": q[49] * 1000,
+        "p95": q[94] * 1000,
+        "p99": q[98] * 1000,
+        "max": max(values) * 1000,
+    }
+
+
+def rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def cpu_time(who: int = resource.RUSAGE_SELF) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench_cycles(app: MyApp, cycles: int) -> dict:
+    latencies = []
+    cpu_start = cpu_time()
+    start = time.perf_counter()
+    for _ in range(cycles):
+        cycle_start = time.perf_counter()
+        app.do_update(TriggerSource.MANUAL)
+        latencies.append(time.perf_counter() - cycle_start)
+    duration = time.perf_counter() - start
+    return {
+        "cycles": cycles,
+        "latency_ms": percentiles(latencies),
+        "readings_per_sec": cycles / duration,
+        "app_cpu_sec_per_reading": (cpu_time() - cpu_start) / cycles,
+    }
+
+
+def bench_page(port: int, clients: int, requests: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        for _ in range(requests):
+            start = time.perf_counter()
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "requests": clients * requests,
+        "latency_ms": percentiles(latencies),
+        "requests_per_sec": clients * requests / duration,
+    }
+
+
+def run(args) -> dict:
+    os.environ["DIALEYE_SIMU_LATENCY"] = str(args.latency)
+    os.environ["DIALEYE_SIMU_FAILURE_RATE"] = str(args.failure_rate)
+    CameraHandler.images = [
+        create_image(args.width, args.height, angle)
+        for angle in range(0, 360, 360 // args.images)
+    ]
+    camera = ThreadingHTTPServer(("127.0.0.1", 0), CameraHandler)
+    threading.Thread(target=camera.serve_forever, daemon=True).start()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench-")
+    os.makedirs(os.path.join(tmp_dir, "static"))
+    config = {k: getattr(MyConfig, k) for k in dir(MyConfig) if k.isupper()}
+    config.update(
+        IMAGE_URL=f"http://127.0.0.1:{camera.server_address[1]}/image.jpg",
+        CONF_FILE=os.path.join(tmp_dir, "dialEye.conf"),
+        DATA_FILE=os.path.join(tmp_dir, "data.txt"),
+        WEB_STATIC_DIR=os.path.join(tmp_dir, "static"),
+        DIALEYE=os.path.join(ROOT, "dialeye_simu.py"),
+        DIALEYE_PYTHON=sys.executable,
+        DIALEYE_MODE=args.mode,
+        FRAME_BUFFER_SIZE=args.frame_buffer_size,
+        CHANGE_THRESHOLD=args.change_threshold,
+        RESULT_IMAGE_MAX_AGE=0,
+    )
+
+    web = Flask(
+        "bench",
+        template_folder=os.path.join(ROOT, "web", "templates"),
+        static_folder=config["WEB_STATIC_DIR"],
+    )
+    callbacks = Callbacks(config, web)
+    app = MyApp()
+    app.init(callbacks)
+    server = make_server("127.0.0.1", 0, web, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    children_cpu_start = cpu_time(resource.RUSAGE_CHILDREN)
+    try:
+        # warm up dialEye worker and connections
+        app.do_update(TriggerSource.MANUAL)
+        cycles = bench_cycles(app, args.cycles)
+        page = bench_page(server.server_port, args.clients, args.requests)
+    finally:
+        app.stop()
+        server.shutdown()
+        camera.shutdown()
+
+    # dialEye processes are accounted only after they have exited, so the
+    # average includes the warm up cycle
+    cycles["dialeye_cpu_sec_per_reading"] = (
+        cpu_time(resource.RUSAGE_CHILDREN) - children_cpu_start
+    ) / (args.cycles + 1)
+
+    return {
+        "version": app.get_version(),
+        "timestamp": datetime.now().replace(microsecond=0).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": {
+            k: v for k, v in vars(args).items() if k not in ("output", "baseline")
+        },
+        "update_cycle": cycles,
+        "result_page": page,
+        "mqtt": {
+            "messages_per_reading": callbacks.published / (args.cycles + 1),
+            "bytes_per_reading": callbacks.published_bytes / (args.cycles + 1),
+        },
+        "max_rss_mb": rss_mb(),
+    }
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    values = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def compare(result: dict, baseline: dict) -> None:
+    current, previous = flatten(result), flatten(baseline)
+    print(f"\nCompared to {baseline.get('version')} ({baseline.get('timestamp')}):")
+    for key, value in current.items():
+        if key.startswith("parameters.") or key not in previous:
+            continue
+        change = (value - previous[key]) / previous[key] * 100 if previous[key] else 0
+        print(f"  {key:45s} {previous[key]:12.3f} -> {value:12.3f} ({change:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=50)
+    parser.add_argument("--mode", choices=["worker", "subprocess"], default="worker")
+    parser.add_argument(
+        "--frame-buffer-size",
+        type=int,
+        default=MyConfig.FRAME_BUFFER_SIZE,
+        help="0 hands frames to dialEye in files",
+    )
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--change-threshold", type=float, default=0)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--output", help="write results to JSON file")
+    parser.add_argument("--baseline", help="compare to earlier JSON results")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(result, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Compare recognition cost of full, cropped and downscaled frames.
+
+Usage: python benchmarks/bench_roi.py [options]
+
+Synthetic 1080p and 4K camera snapshots are recognised by a dialEye worker
+(dialeye_simu.py by default) as full frames, cropped to the dials and
+cropped and downscaled to --max-size. Reports crop time in the app, and
+recognition CPU time and peak RSS of the worker per reading.
+"""
+
+import argparse
+import io
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from dialeye import WorkerDialEye  # noqa: E402
+from dials import Dial  # noqa: E402
+from roi import RegionCropper  # noqa: E402
+
+RESOLUTIONS = {"1080p": (1920, 1080), "4K": (3840, 2160)}
+
+
+def create_dials(width: int, height: int) -> list[Dial]:
+    """Four dials in a row, covering about a tenth of the frame width each."""
+    r = width / 24
+    return [
+        Dial(f"dial{i + 1}", width * 0.35 + i * 2.5 * r, height * 0.55, r)
+        for i in range(4)
+    ]
+
+
+def create_snapshot(width: int, height: int, dials: list[Dial]) -> bytes:
+    # noise keeps the JPEG size close to a real camera snapshot
+    noise = Image.frombytes("L", (width, height), random.randbytes(width * height))
+    image = Image.merge("RGB", (noise, noise, noise))
+    draw = ImageDraw.Draw(image)
+    for dial in dials:
+        draw.ellipse(dial.box, fill="white", outline="black", width=5)
+        draw.pieslice(dial.box, 30, 50, fill="red")
+    data = io.BytesIO()
+    image.save(data, "JPEG", quality=85)
+    return data.getvalue()
+
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss(dialeye: WorkerDialEye) -> int | None:
+    # ru_maxrss of a child includes the memory of the forked app process
+    # before exec, the high water mark of the process status doesn't
+    try:
+        with open(f"/proc/{dialeye.pid}/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return dialeye.peak_rss
+
+
+def run_worker(script: str, path: str, frame: bytes, readings: int):
+    """Children CPU time and peak RSS of a worker recognising the frame."""
+    dialeye = WorkerDialEye(sys.executable, script)
+    start = children_cpu()
+    for _ in range(readings):
+        # a new file version, so the worker doesn't reuse the decoded image
+        with open(path, "wb") as file:
+            file.write(frame)
+        retval, _ = dialeye.run(["-f", "dialEye.conf", "-s", path], timeout=60)
+        assert retval == 0  # nosec
+    rss = peak_rss(dialeye)
+    dialeye.close()
+    return children_cpu() - start, rss
+
+
+def bench(script: str, work_dir: str, name: str, frame: bytes, readings: int):
+    path = os.path.join(work_dir, f"{name}.jpg")
+    # worker start-up is excluded from the per reading CPU time
+    startup, _ = run_worker(script, path, frame, 0)
+    cpu, rss = run_worker(script, path, frame, readings)
+    return (cpu - startup) / readings, rss
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readings", type=int, default=20)
+    parser.add_argument("--margin", type=float, default=20)
+    parser.add_argument("--max-size", type=int, default=640)
+    parser.add_argument(
+        "--dialeye", default=os.path.join(ROOT, "dialeye_simu.py"), help="script"
+    )
+    args = parser.parse_args()
+
+    print(
+        "%-6s %-10s %11s %10s %12s %12s"
+        % ("frame", "mode", "size", "crop ms", "cpu ms", "peak RSS MB")
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        for resolution, (width, height) in RESOLUTIONS.items():
+            dials = create_dials(width, height)
+            snapshot = create_snapshot(width, height, dials)
+            croppers = {
+                "full": None,
+                "crop": RegionCropper(dials, args.margin),
+                "downscale": RegionCropper(dials, args.margin, args.max_size),
+            }
+            for mode, cropper in croppers.items():
+                frame, crop_time = snapshot, 0.0
+                if cropper:
+                    start = time.process_time()
+                    for _ in range(args.readings):
+                        frame = cropper.crop(snapshot)
+                    crop_time = (time.process_time() - start) / args.readings
+                with Image.open(io.BytesIO(frame)) as image:
+                    size = "%dx%d" % image.size
+                cpu, rss = bench(args.dialeye, work_dir, mode, frame, args.readings)
+                print(
+                    "%-6s %-10s %11s %10.2f %12.2f %12.1f"
+                    % (
+                        resolution,
+                        mode,
+                        size,
+                        crop_time * 1000,
+                        cpu * 1000,
+                        (rss or 0) / 1024 / 1024,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
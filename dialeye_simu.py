@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# simulate dialEye return value with the python start-up, import and image
+# decode cost of the real dialEye
+#
+# DIALEYE_SIMU_LATENCY       extra latency in seconds
+# DIALEYE_SIMU_FAILURE_RATE  share of failing executions, 0.0 - 1.0
+
+# 5678.1 = 0,56781 m3
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from PIL import Image
+
+if __name__ == "__main__":
+    # command line of dialEye, -u selects the meter section of the conf
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", dest="conf_file")
+    parser.add_argument("-s", action="store_true")
+    parser.add_argument("-r", action="store_true")
+    parser.add_argument("-u", dest="section")
+    parser.add_argument("source")
+    args = parser.parse_args()
+
+    time.sleep(float(os.environ.get("DIALEYE_SIMU_LATENCY", "0")))
+    if random.random() < float(  # nosec
+        os.environ.get("DIALEYE_SIMU_FAILURE_RATE", "0")
+    ):
+        sys.exit(1)
+
+    # opened through Image.open, which the dialEye worker serves also from
+    # shared memory
+    try:
+        image = Image.open(args.source)
+        image.load()
+    except OSError:
+        image = None
+    if args.r:
+        (image or Image.new("RGB", (64, 64))).save("dialeye_result.png")
+        print("dialeye_result.png")
+    else:
+        print("5678.1")
@@ -1,18 +1,30 @@
-import ast
 from mqtt_framework import Framework
 from mqtt_framework import Config
 from mqtt_framework.callbacks import Callbacks
 from mqtt_framework.app import TriggerSource
 
-from prometheus_client import Counter
-from flask import render_template
+from prometheus_client import Gauge
+from flask import abort, jsonify, make_response, request, send_file
 
-from datetime import datetime
-import time
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import hmac
+import json
 import os
-import subprocess  # nosec
+import shutil
+import tempfile
+import threading
 
-from meter import Meter
+from framepool import peak_rss_bytes
+from profiler import CycleProfiler
+from reader import MeterReader, ReaderMetrics
+from scheduler import AdaptiveScheduler
+from tracing import TraceLogger, trace
+
+
+def is_enabled(value) -> bool:
+    return str(value).lower() in ("true", "1", "yes", "on")
 
 
 class MyConfig(Config):
@@ -24,6 +36,7 @@ class MyConfig(Config):
     # App specific variables
 
     IMAGE_URL = None
+    IMAGE_SOURCE = "snapshot"
     TIMEOUT = 5
     CONF_FILE = "/conf/dialEye.conf"
     DATA_FILE = "/data/data.txt"
@@ -31,44 +44,116 @@ class MyConfig(Config):
 
     DIALEYE = "/opt/dialEye/dialEye.py"
     DIALEYE_PYTHON = "python3"
+    DIALEYE_MODE = "worker"
+    DIALEYE_START_TIMEOUT = 60
+    FRAME_BUFFER_SIZE = 8388608
+    IMAGE_REGION = "full"
+    UPDATE_MODE = "serial"
+    ROI_MARGIN = 20
+    ROI_MAX_SIZE = 0
+    RESULT_IMAGE_MAX_AGE = 60
+    CHANGE_THRESHOLD = 0
+    CHANGE_MAX_SKIPS = 10
+    ADAPTIVE_POLLING = False
+    POLL_MIN_INTERVAL = 5
+    POLL_MAX_INTERVAL = 300
+    POLL_BACKOFF_FACTOR = 2
+    DATA_FLUSH_INTERVAL = 60
+    HISTORY_SIZE = 17280
+    STREAM_MAX_CLIENTS = 4
+    METERS = None
+    METER_WORKERS = 4
+    PUBLISH_HEARTBEAT = 0
+    PUBLISH_MODE = "topics"
+    STATE_TOPIC = "state"
+    BURST_SIZE = 1
+    BURST_INTERVAL = 0.5
+    BURST_WORKERS = 2
+    BURST_TOLERANCE = 1.0
+    BURST_MIN_CONFIDENCE = 0.5
+    CAMERA_FAILURE_THRESHOLD = 3
+    CAMERA_BACKOFF = 30
+    CAMERA_MAX_BACKOFF = 600
+    CAMERA_PROBE_TIMEOUT = 2
+    PLAUSIBILITY_MAX_FLOW = 0
+    PLAUSIBILITY_THRESHOLD = 0
+    PLAUSIBILITY_WINDOW = 60
+    PLAUSIBILITY_MAX_REJECTIONS = 3
+    PROFILE_TOKEN = None
+    RECORDER_SIZE = 0
+    RECORDER_DIR = "/data/recorder"
+    RECORDER_MAX_BYTES = 104857600
+    PROFILE_MAX_CYCLES = 100
 
 
 class MyApp:
     def init(self, callbacks: Callbacks) -> None:
-        self.logger = callbacks.get_logger()
+        self.logger = TraceLogger(callbacks.get_logger())
         self.config = callbacks.get_config()
         self.metrics_registry = callbacks.get_metrics_registry()
         self.add_url_rule = callbacks.add_url_rule
         self.publish_value_to_mqtt_topic = callbacks.publish_value_to_mqtt_topic
         self.subscribe_to_mqtt_topic = callbacks.subscribe_to_mqtt_topic
-        self.succesfull_fecth_metric = Counter(
-            "succesfull_fecth", "", registry=self.metrics_registry
+        self.update_interval_metric = Gauge(
+            "update_interval_seconds", "", registry=self.metrics_registry
         )
-        self.fecth_errors_metric = Counter(
-            "fecth_errors", "", registry=self.metrics_registry
+        self.peak_rss_metric = Gauge(
+            "peak_rss_bytes", "", registry=self.metrics_registry
         )
+        self.reader_metrics = ReaderMetrics(self.metrics_registry)
+        self.update_duration_metric = self.reader_metrics.update_duration
         self.exit = False
+        self.idle = threading.Event()
+        self.idle.set()
+        self.active = False
+        self.update_lock = threading.Lock()
+        # every stream client holds a thread of the web server
+        self.stream_slots = threading.BoundedSemaphore(
+            int(self.config["STREAM_MAX_CLIENTS"])
+        )
+        self.profiler = CycleProfiler(logger=self.logger)
         self.add_url_rule("/", view_func=self.result_page)
-        self.meter = self.init_meter()
-        self.logger.debug(f"{self.meter}")
+        self.add_url_rule("/api/history", view_func=self.history_page)
+        self.add_url_rule("/api/state", view_func=self.state_page)
+        self.add_url_rule("/api/stream", view_func=self.stream_page)
+        self.add_url_rule("/api/recorder", view_func=self.recorder_page)
+        self.add_url_rule("/api/profile", view_func=self.profile_page)
+        self.add_url_rule("/api/profile/cpu", view_func=self.profile_cpu_page)
+        self.add_url_rule("/api/profile/memory", view_func=self.profile_memory_page)
+        self.work_dir = tempfile.mkdtemp(prefix=f"{self.config['APP_NAME']}-")
+        self.readers = self.create_readers()
+        self.executor = (
+            ThreadPoolExecutor(
+                max_workers=min(int(self.config["METER_WORKERS"]), len(self.readers)),
+                thread_name_prefix="meter",
+            )
+            if len(self.readers) > 1
+            else None
+        )
+        self.scheduler = self.create_scheduler()
+        threading.Thread(target=self.prime, name="prime", daemon=True).start()
 
     def get_version(self) -> str:
         return "2.0.7"
 
     def stop(self) -> None:
-        def wait_until(condition, interval=0.1, timeout=1, *args):
-            start = time.time()
-            while condition(*args) and time.time() - start < timeout:
-                time.sleep(interval)
-
         self.logger.debug("Stopping...")
         self.exit = True
-        if self.executing:
-            timeout = int(self.config["TIMEOUT"]) + 1
-            self.logger.debug("Wait max %d sec to dialEye execution ends...", timeout)
-            wait_until(lambda: self.executing, timeout=timeout)
-
-        self.publish_zero_consumption()
+        # running recognitions are aborted, so the update ends promptly also
+        # when it runs in the scheduler thread
+        for reader in self.readers:
+            reader.cancel()
+        timeout = int(self.config["TIMEOUT"]) + 1
+        if self.scheduler:
+            self.scheduler.stop(timeout)
+        if not self.idle.wait(timeout):
+            self.logger.warning("Update didn't end in %d sec", timeout)
+
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        for reader in self.readers:
+            reader.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
         self.logger.debug("Exit")
 
     def subscribe_to_mqtt_topics(self) -> None:
@@ -78,190 +163,214 @@ class MyApp:
         pass
 
     def do_healthy_check(self) -> bool:
-        return True
+        unavailable = [
+            reader.label for reader in self.readers if reader.camera_breaker.is_open
+        ]
+        if unavailable:
+            self.logger.warning(f"Camera unavailable: {', '.join(unavailable)}")
+        return not unavailable
 
     # Do work
     def do_update(self, trigger_source: TriggerSource) -> None:
         self.logger.debug(f"Update called, trigger_source={trigger_source}")
-        self.executing = True
+        if self.scheduler and trigger_source == TriggerSource.INTERVAL:
+            self.logger.debug("Adaptive polling in use, ignore interval trigger")
+            return
+        self.run_update()
+
+    def run_update(self) -> None:
+        if self.exit or not self.update_lock.acquire(blocking=False):
+            self.logger.debug("Update already in progress or stopping, skip")
+            return
+        self.idle.clear()
         try:
-            self.update()
+            with trace():
+                if all(reader.pipeline is not None for reader in self.readers):
+                    # cycles are timed and profiled in the pipeline stages
+                    self.update()
+                else:
+                    with self.profiler.cycle(), self.update_duration_metric.time():
+                        self.update()
+            self.peak_rss_metric.set(peak_rss_bytes())
         finally:
-            self.executing = False
+            self.idle.set()
+            self.update_lock.release()
 
-    def update(self) -> None:
-        retval, raw = self.get_dialeye_value()
-        litre = self.convert_dialeye_value_to_litre(retval, raw)
-        if retval == 0 and litre is not None:
-            self.succesfull_fecth_metric.inc()
-            self.handle_update(litre)
-        else:
-            self.logger.error(f"DialEye command execution failed: {retval} {raw}")
-            self.fecth_errors_metric.inc()
-            self.publish_zero_consumption()
-
-    def get_dialeye_value(self) -> tuple[int, str | None]:
-        start = time.time()
-        retval, result = self.execute_command(
-            [
-                self.config["DIALEYE_PYTHON"],
-                self.config["DIALEYE"],
-                "-f",
-                self.config["CONF_FILE"],
-                "-s",
-                "-u",
-                "meter",
-                self.config["IMAGE_URL"],
-            ],
-            timeout=self.config["TIMEOUT"],
-        )
-        end = time.time()
-        result = result.strip()
-
-        self.logger.debug(
-            "DialEye result (retval=%d, time=%f): %s",
-            retval,
-            (end - start),
-            result,
-        )
-        return retval, result
-
-    def convert_dialeye_value_to_litre(self, retval: int, value: str) -> float | None:
-        return float(value) / 10 if retval == 0 else None
-
-    def handle_update(self, litre: float):
-        self.meter.update_litre(litre)
-        self.logger.debug(f"{self.meter}")
-        self.store_data(
-            self.meter.m3,
-            self.meter.m3_already_increased,
-            self.meter.value,
-        )
-        if self.meter.instant_consumption_l_per_min >= 0:
-            self.handle_consumption()
-        else:
-            self.handle_negative_consumption()
-
-    def handle_consumption(self) -> None:
-        self.logger.info(
-            "Current value = %.5f m3, consumption = %.2f l/min",
-            self.meter.value,
-            self.meter.instant_consumption_l_per_min,
-        )
-        self.publish_consumption_values(
-            self.meter.value,
-            self.meter.instant_consumption_l_per_min,
-        )
+    def prime(self) -> None:
+        for reader in self.readers:
+            reader.prime()
 
-    def handle_negative_consumption(self) -> None:
-        self.logger.error(
-            "Consuption %.2f l/min is less than 0, ignore update",
-            self.meter.instant_consumption_l_per_min,
-        )
-        self.publish_zero_consumption()
-
-    def execute_command(self, cmd, timeout=5, cwd=None) -> tuple[int, str]:
-        r = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=timeout, cwd=cwd
-        )  # nosec
-        return (r.returncode, r.stdout)
-
-    def init_meter(self) -> Meter:
-        meter = self.create_meter_from_file_data()
-        if meter is None:
-            m3 = int(self.config["M3_INIT_VALUE"])
-            self.logger.info(f"Initialize m3 to {m3}")
-            meter = Meter(m3=m3, m3_already_increased=False, value=float(m3))
-
-        self.logger.info(
-            "Initial values: m3=%d, m3_already_increased=%r, value=%f",
-            meter.m3,
-            meter.m3_already_increased,
-            meter.value,
-        )
-        return meter
-
-    def create_meter_from_file_data(self) -> Meter | None:
-        filename = self.config["DATA_FILE"]
-        if not os.path.isfile(filename):
-            self.logger.info(f"{filename} file does not exists")
-            return None
-        self.logger.info(f"Initialize data from {filename} file")
-        data = self.read_data_file(filename)
+    def scheduled_update(self) -> bool:
         try:
-            return self.create_meter_from_string(data)
+            self.run_update()
+            pipelined = [r for r in self.readers if r.pipeline is not None]
+            if pipelined:
+                # the frame is recognised after the update has returned
+                timeout = float(self.config["TIMEOUT"]) + 1
+                for reader in pipelined:
+                    reader.wait_cycle(timeout)
+                self.active = any(reader.active for reader in self.readers)
         except Exception:
-            self.logger.info(f"{filename} file content is invalid")
+            self.logger.exception("Update failed")
+            return False
+        return self.active
+
+    def create_scheduler(self) -> AdaptiveScheduler | None:
+        if not is_enabled(self.config["ADAPTIVE_POLLING"]):
+            if self.config.get("UPDATE_INTERVAL"):
+                self.update_interval_metric.set(float(self.config["UPDATE_INTERVAL"]))
             return None
-
-    def create_meter_from_string(self, data: str) -> Meter:
-        m3_str, m3_already_increased_str, value_str = data.strip().split(";")
-        return Meter(
-            m3=int(m3_str),
-            m3_already_increased=ast.literal_eval(m3_already_increased_str),
-            value=float(value_str),
+        scheduler = AdaptiveScheduler(
+            self.scheduled_update,
+            min_interval=float(self.config["POLL_MIN_INTERVAL"]),
+            max_interval=float(self.config["POLL_MAX_INTERVAL"]),
+            factor=float(self.config["POLL_BACKOFF_FACTOR"]),
+            on_interval_change=self.update_interval_metric.set,
         )
-
-    def store_data(self, m3: int, m3_already_increased: bool, current_value: float):
-        self.write_data_file(
-            self.config["DATA_FILE"],
-            "%d;%r;%f" % (m3, m3_already_increased, current_value),
-        )
-
-    def read_data_file(self, filename: str) -> str:
-        with open(filename, "r+") as file:
-            data = file.read().strip()
-        return data
-
-    def write_data_file(self, filename: str, data: str) -> None:
-        with open(filename, "w+") as file:
-            file.seek(0)
-            file.write(data)
-            file.truncate()
-
-    def publish_consumption_values(
-        self, current_value: float, instant_consumption_l_per_min: float
-    ) -> None:
-        self.publish_value_to_mqtt_topic("value", f"{current_value:.5f}", True)
-        self.publish_value_to_mqtt_topic(
-            "consumptionLitrePerMin",
-            f"{instant_consumption_l_per_min:.2f}",
-            True,
+        self.logger.info(
+            "Adaptive polling enabled, interval %.1f - %.1f sec",
+            scheduler.min_interval,
+            scheduler.max_interval,
         )
-        self.publish_value_to_mqtt_topic(
-            "lastUpdateTime",
-            str(datetime.now().replace(microsecond=0).isoformat()),
-            True,
+        scheduler.start()
+        return scheduler
+
+    def create_readers(self) -> list[MeterReader]:
+        meters = self.config.get("METERS") or {}
+        if isinstance(meters, str):
+            meters = json.loads(meters)
+        if not meters:
+            return [self.create_reader("", self.config)]
+        self.logger.info(f"Meters: {', '.join(meters)}")
+        return [
+            self.create_reader(
+                name, ChainMap(self.meter_config(name, conf), self.config)
+            )
+            for name, conf in meters.items()
+        ]
+
+    def meter_config(self, name: str, conf: dict) -> dict:
+        conf = dict(conf)
+        if "DATA_FILE" not in conf:
+            base, ext = os.path.splitext(self.config["DATA_FILE"])
+            conf["DATA_FILE"] = f"{base}_{name}{ext}"
+        return conf
+
+    def create_reader(self, name: str, config) -> MeterReader:
+        work_dir = os.path.join(self.work_dir, name or "default")
+        os.makedirs(work_dir)
+        return MeterReader(
+            name,
+            config,
+            self.logger.logger,
+            self.publish_value_to_mqtt_topic,
+            self.reader_metrics,
+            work_dir,
+            profiler=self.profiler,
         )
 
-    def publish_zero_consumption(self) -> None:
-        self.publish_value_to_mqtt_topic("consumptionLitrePerMin", "0.00", True)
-        self.publish_value_to_mqtt_topic(
-            "lastUpdateTime",
-            str(datetime.now().replace(microsecond=0).isoformat()),
-            True,
+    def update(self) -> None:
+        if self.executor is None:
+            self.readers[0].update()
+        else:
+            # readings of different meters run concurrently, so one slow camera
+            # doesn't delay the others
+            futures = {
+                reader: self.executor.submit(
+                    contextvars.copy_context().run, self.profiler.call, reader.update
+                )
+                for reader in self.readers
+            }
+            for reader, future in futures.items():
+                try:
+                    future.result()
+                except Exception:
+                    reader.logger.exception("Update failed")
+        self.active = any(reader.active for reader in self.readers)
+
+    def get_reader(self) -> MeterReader:
+        name = request.args.get("meter")
+        if not name:
+            return self.readers[0]
+        for reader in self.readers:
+            if reader.name == name:
+                return reader
+        abort(404)
+
+    def result_page(self):
+        return self.get_reader().result_page([reader.name for reader in self.readers])
+
+    def history_page(self):
+        return jsonify(self.get_reader().history.summary())
+
+    def state_page(self):
+        return jsonify(self.get_reader().state())
+
+    def stream_page(self):
+        if not self.stream_slots.acquire(blocking=False):
+            abort(503)
+        try:
+            response = self.get_reader().stream()
+        except BaseException:
+            self.stream_slots.release()
+            raise
+        response.call_on_close(self.stream_slots.release)
+        return response
+
+    def recorder_page(self):
+        reader = self.get_reader()
+        if reader.recorder is None:
+            abort(404)
+        file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, dir=self.work_dir)
+        reader.recorder.archive(file)
+        file.seek(0)
+        return send_file(
+            file,
+            mimetype="application/gzip",
+            as_attachment=True,
+            download_name=f"recorder_{reader.label}.tar.gz",
         )
 
-    def result_page(self) -> str:
-        self.update_image()
-        return render_template("index.html", current_value_m3=self.meter.value)
-
-    def update_image(self) -> None:
-        retval, result = self.execute_command(
-            [
-                self.config["DIALEYE_PYTHON"],
-                self.config["DIALEYE"],
-                "-f",
-                self.config["CONF_FILE"],
-                "-r",
-                "-u",
-                "meter",
-                self.config["IMAGE_URL"],
-            ],
-            timeout=self.config["TIMEOUT"],
-            cwd=self.config["WEB_STATIC_DIR"],
+    def check_profile_access(self) -> None:
+        token = self.config.get("PROFILE_TOKEN")
+        if not token:
+            abort(404)
+        auth = request.headers.get("Authorization", "")
+        given = auth.removeprefix("Bearer ") if auth else request.args.get("token")
+        if not given or not hmac.compare_digest(given.encode(), str(token).encode()):
+            abort(401)
+
+    def profile_page(self):
+        self.check_profile_access()
+        cycles = request.args.get("cycles", 1, type=int)
+        if not 1 <= cycles <= int(self.config["PROFILE_MAX_CYCLES"]):
+            abort(400)
+        self.profiler.start(cycles)
+        self.logger.info(f"Profiling next {cycles} update cycles")
+        return jsonify({"cycles": cycles})
+
+    def profile_cpu_page(self):
+        self.check_profile_access()
+        if request.args.get("format") == "text":
+            return self.text_response(self.profiler.report())
+        path = os.path.join(self.work_dir, "profile.prof")
+        if not self.profiler.dump_stats(path):
+            abort(404)
+        return send_file(
+            path, as_attachment=True, download_name=f"{self.config['APP_NAME']}.prof"
         )
-        self.logger.info("Image update result (retval=%d): %s", retval, result)
+
+    def profile_memory_page(self):
+        self.check_profile_access()
+        limit = request.args.get("limit", 25, type=int)
+        return self.text_response(self.profiler.top_allocations(limit))
+
+    def text_response(self, text: str | None):
+        if text is None:
+            abort(404)
+        response = make_response(text)
+        response.mimetype = "text/plain"
+        return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+import time
+from typing import Callable
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# metric values of the states
+STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Stop calling a failing resource and retry it with exponential backoff.
+
+    The breaker opens after threshold consecutive failures. Once the backoff
+    delay has passed one call is allowed through (half open). Success closes
+    the breaker, failure opens it again with doubled delay up to max_backoff.
+    Threshold 0 never opens the breaker.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        backoff: float,
+        max_backoff: float,
+        on_state_change: Callable[[str], None] = None,
+    ) -> None:
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self.failures = 0
+        self.delay = backoff
+        self.retry_time = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() >= self.retry_time:
+            self._set_state(HALF_OPEN)
+        return self.state != OPEN
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.delay = self.backoff
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.delay = min(self.delay * 2, self.max_backoff)
+            self._open()
+        elif self.state == CLOSED and 0 < self.threshold <= self.failures:
+            self.delay = self.backoff
+            self._open()
+
+    def _open(self) -> None:
+        self.retry_time = time.monotonic() + self.delay
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            if self.on_state_change:
+                self.on_state_change(state)
@@ -0,0 +1,42 @@
+import threading
+
+
+class Broadcaster:
+    """Hand the latest message to any number of waiting clients.
+
+    Clients wait on a shared condition and get the latest message with its
+    sequence number, so a slow client skips intermediate messages instead of
+    queueing them.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._message = None
+        self.closed = False
+
+    @property
+    def sequence(self) -> int:
+        return self._sequence
+
+    def publish(self, message: str) -> None:
+        with self._condition:
+            self._sequence += 1
+            self._message = message
+            self._condition.notify_all()
+
+    def wait(self, sequence: int, timeout: float) -> tuple[int, str | None]:
+        """Wait for message newer than sequence. Returns the given sequence
+        and None on timeout or when closed."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._sequence != sequence or self.closed, timeout
+            )
+            if self._sequence == sequence:
+                return sequence, None
+            return self._sequence, self._message
+
+    def close(self) -> None:
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
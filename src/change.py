@@ -0,0 +1,83 @@
+import io
+
+from PIL import Image, ImageChops, ImageStat
+
+from dials import Dial
+from frame import Frame
+
+THUMBNAIL_SIZE = 16
+
+
+class ChangeDetector:
+    """Detect whether the dials have moved since the last recognised frame.
+
+    Frames are decoded at reduced scale in grayscale and every dial region is
+    shrunk to a small thumbnail. The largest mean absolute difference of the
+    dial thumbnails against the reference frame is compared to the threshold.
+    The whole frame is compared if no dials are configured.
+    """
+
+    def __init__(self, dials: list[Dial], threshold: float, max_skips: int) -> None:
+        self.dials = dials
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.difference = None
+        self._reference = None
+        self._candidate = None
+        self._skips = 0
+
+    def changed(self, frame: Frame) -> bool:
+        if self.threshold <= 0:
+            return True
+        if self._reference is not None and self._skips < self.max_skips:
+            if not frame.changed:
+                self.difference = 0.0
+                self._skips += 1
+                return False
+            self._candidate = self.thumbnails(frame.data)
+            self.difference = max(
+                ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
+                for a, b in zip(self._candidate, self._reference)
+            )
+            if self.difference < self.threshold:
+                self._skips += 1
+                return False
+        else:
+            self._candidate = self.thumbnails(frame.data)
+            self.difference = None
+        return True
+
+    def commit(self) -> None:
+        """Use the last changed frame as reference for the coming frames."""
+        if self._candidate is not None:
+            self._reference = self._candidate
+            self._candidate = None
+        self._skips = 0
+
+    def thumbnails(self, data: bytes) -> list[Image.Image]:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            # JPEG images are decoded directly at reduced scale
+            image.draft("L", (width // 8, height // 8))
+            scale = image.width / width
+            gray = image.convert("L")
+        if not self.dials:
+            return [gray.resize((THUMBNAIL_SIZE * 4, THUMBNAIL_SIZE * 3))]
+        return [
+            gray.resize(
+                (THUMBNAIL_SIZE, THUMBNAIL_SIZE),
+                box=self._clamp(dial.box, scale, gray.size),
+            )
+            for dial in self.dials
+        ]
+
+    @staticmethod
+    def _clamp(box, scale: float, size: tuple[int, int]) -> tuple:
+        left, top, right, bottom = (v * scale for v in box)
+        width, height = size
+        return (
+            min(max(left, 0), width - 1),
+            min(max(top, 0), height - 1),
+            max(min(right, width), 1),
+            max(min(bottom, height), 1),
+        )
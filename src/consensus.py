@@ -0,0 +1,25 @@
+import statistics
+from collections import Counter
+from dataclasses import dataclass
+
+
+@dataclass
+class Consensus:
+    value: float | None
+    # share of all frames agreeing with the value
+    confidence: float
+    readings: int
+
+
+def vote(readings: list[float | None], tolerance: float) -> Consensus:
+    """Pick reading of a burst by majority vote, or median if there's no
+    majority. Failed readings are given as None."""
+    values = sorted(reading for reading in readings if reading is not None)
+    if not values:
+        return Consensus(None, 0.0, 0)
+    value, count = Counter(values).most_common(1)[0]
+    if count * 2 <= len(values):
+        # median_low to always pick an actual reading
+        value = statistics.median_low(values)
+    agreeing = sum(1 for reading in values if abs(reading - value) <= tolerance)
+    return Consensus(value, agreeing / len(readings), len(values))
@@ -0,0 +1,242 @@
+import json
+import os
+import queue
+import subprocess  # nosec
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+
+from framepool import FrameBuffer
+
+WORKER_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "dialeye_worker.py"
+)
+
+
+class DialEye(ABC):
+    # whether frames can be passed in shared memory
+    shared_frames = False
+
+    def __init__(self, python: str, dialeye: str) -> None:
+        self.python = python
+        self.dialeye = dialeye
+        # time spent inside dialEye by the last command, when known
+        self.exec_time = None
+        # peak memory usage of long-lived dialEye process, when known
+        self.peak_rss = None
+
+    @abstractmethod
+    def run(
+        self,
+        args: list[str],
+        timeout: float,
+        cwd: str = None,
+        frame: FrameBuffer = None,
+    ) -> tuple[int, str]:
+        """Run dialEye with args, returns exit code and output."""
+
+    def start(self, timeout: float) -> bool:
+        """Load dialEye ahead of the first command when supported."""
+        return True
+
+    def cancel(self) -> None:
+        """Abort running command when supported and refuse new ones."""
+
+    def close(self) -> None:
+        pass
+
+
+class SubprocessDialEye(DialEye):
+    """Start a fresh dialEye interpreter for every command. Shared frames are
+    not supported, dialEye reads the image file."""
+
+    def run(
+        self,
+        args: list[str],
+        timeout: float,
+        cwd: str = None,
+        frame: FrameBuffer = None,
+    ) -> tuple[int, str]:
+        r = subprocess.run(
+            [self.python, self.dialeye, *args],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            cwd=cwd,
+        )  # nosec
+        return (r.returncode, r.stdout)
+
+
+class WorkerDialEye(DialEye):
+    """Keep dialEye loaded in a supervised child process.
+
+    Commands are sent to the worker as JSON lines over its stdin and results
+    are read back from its stdout. The worker is started lazily, killed on
+    timeout and restarted on the next command if it has died.
+    """
+
+    shared_frames = True
+
+    def __init__(self, python: str, dialeye: str) -> None:
+        super().__init__(python, dialeye)
+        self._lock = threading.Lock()
+        self._process = None
+        self._responses = None
+        self._cancelled = False
+
+    @property
+    def pid(self) -> int | None:
+        return self._process.pid if self._process else None
+
+    def run(
+        self,
+        args: list[str],
+        timeout: float,
+        cwd: str = None,
+        frame: FrameBuffer = None,
+    ) -> tuple[int, str]:
+        with self._lock:
+            self.exec_time = None
+            if self._cancelled:
+                return (-1, "")
+            if not self._is_alive() and not self._start(timeout):
+                return self._worker_exited()
+            try:
+                request = {"args": args, "cwd": cwd}
+                if frame is not None:
+                    request["frame"] = asdict(frame)
+                self._process.stdin.write(json.dumps(request))
+                self._process.stdin.write("\n")
+                self._process.stdin.flush()
+            except OSError:
+                return self._worker_exited()
+            response = self._read(timeout)
+            if response is None:
+                return self._worker_exited()
+            self.exec_time = response.get("time")
+            self.peak_rss = response.get("peak_rss", self.peak_rss)
+            return (response["retval"], response["output"])
+
+    def start(self, timeout: float) -> bool:
+        with self._lock:
+            if self._cancelled:
+                return False
+            return self._is_alive() or self._start(timeout)
+
+    def cancel(self) -> None:
+        # without the lock, which is held by the running command
+        self._cancelled = True
+        process = self._process
+        if process is not None:
+            process.kill()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self._kill()
+            self._process = None
+
+    def _is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self, timeout: float) -> bool:
+        if self._process is not None:
+            self._kill()
+        self._process = subprocess.Popen(
+            [self.python, WORKER_SCRIPT, self.dialeye],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )  # nosec
+        self._responses = queue.Queue()
+        threading.Thread(
+            target=self._reader,
+            args=(self._process.stdout, self._responses),
+            daemon=True,
+        ).start()
+        # worker reports readiness once dialEye and its imports are loaded
+        return self._read(timeout) is not None
+
+    def _read(self, timeout: float) -> dict | None:
+        try:
+            line = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            self._kill()
+            raise subprocess.TimeoutExpired([self.python, self.dialeye], timeout)
+        return json.loads(line) if line is not None else None
+
+    def _worker_exited(self) -> tuple[int, str]:
+        retval = self._process.wait()
+        self._process = None
+        return (-1 if retval is None else retval, "")
+
+    def _kill(self) -> None:
+        self._process.kill()
+        self._process.wait()
+        self._process = None
+
+    @staticmethod
+    def _reader(stream, responses: queue.Queue) -> None:
+        for line in stream:
+            responses.put(line)
+        responses.put(None)
+
+
+class DialEyePool(DialEye):
+    """Share dialEye instances between threads.
+
+    Every command is run on an idle instance, so up to len(instances)
+    commands execute concurrently.
+    """
+
+    def __init__(self, instances: list[DialEye]) -> None:
+        self._local = threading.local()
+        super().__init__(instances[0].python, instances[0].dialeye)
+        self.instances = instances
+        self.shared_frames = instances[0].shared_frames
+        self._idle = queue.Queue()
+        for instance in instances:
+            self._idle.put(instance)
+
+    @property
+    def exec_time(self) -> float | None:
+        return getattr(self._local, "exec_time", None)
+
+    @exec_time.setter
+    def exec_time(self, value: float | None) -> None:
+        self._local.exec_time = value
+
+    def run(
+        self,
+        args: list[str],
+        timeout: float,
+        cwd: str = None,
+        frame: FrameBuffer = None,
+    ) -> tuple[int, str]:
+        instance = self._idle.get()
+        try:
+            result = instance.run(args, timeout=timeout, cwd=cwd, frame=frame)
+            self.exec_time = instance.exec_time
+            self.peak_rss = max(
+                (i.peak_rss for i in self.instances if i.peak_rss), default=None
+            )
+            return result
+        finally:
+            self._idle.put(instance)
+
+    def start(self, timeout: float) -> bool:
+        return all([instance.start(timeout) for instance in self.instances])
+
+    def cancel(self) -> None:
+        for instance in self.instances:
+            instance.cancel()
+
+    def close(self) -> None:
+        for instance in self.instances:
+            instance.close()
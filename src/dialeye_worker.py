@@ -0,0 +1,192 @@
+"""Long-lived dialEye worker.
+
+Usage: dialeye_worker.py <path to dialEye.py>
+
+dialEye is compiled and its imports are loaded once at startup. After that
+the worker reads one JSON request per line from stdin, runs dialEye as if it
+was started from the command line and writes one JSON response per line to
+stdout. The worker exits when stdin is closed.
+
+The latest decoded image is kept in memory, so the value reading and the
+result image rendering of the same frame decode the image only once. When
+the request refers to a frame in shared memory, the image is decoded from a
+read-only view of it instead of the image file.
+"""
+
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+import traceback
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+
+class MemoryReader(io.RawIOBase):
+    """Read-only file object over a memoryview."""
+
+    def __init__(self, view: memoryview) -> None:
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._view[self._pos : self._pos + len(buffer)]
+        buffer[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}
+        self._pos = max(base[whence] + offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class SharedFrames:
+    """Frame buffers shared by the app, attached once and viewed read-only."""
+
+    def __init__(self) -> None:
+        self._segments = {}
+        self.path = None
+        self.key = None
+        self.view = None
+
+    def set(self, path: str | None, frame: dict | None) -> None:
+        if frame is None:
+            self.path = self.key = self.view = None
+            return
+        memory = self._segments.get(frame["name"])
+        if memory is None:
+            memory = SharedMemory(name=frame["name"])
+            # the app owns the buffers, don't let the tracker unlink them
+            resource_tracker.unregister(memory._name, "shared_memory")
+            self._segments[frame["name"]] = memory
+        self.path = os.path.abspath(path)
+        self.key = ("shm", frame["name"], frame["generation"])
+        self.view = memory.buf[: frame["size"]].toreadonly()
+
+
+class ImageCache:
+    def __init__(self, open_image, shared: SharedFrames) -> None:
+        self._open_image = open_image
+        self._shared = shared
+        self._key = None
+        self._image = None
+
+    def open(self, fp, *args, **kwargs):
+        if not isinstance(fp, (str, os.PathLike)):
+            return self._open_image(fp, *args, **kwargs)
+        if self._shared.view is not None and os.path.abspath(fp) == self._shared.path:
+            key = self._shared.key
+            source = io.BufferedReader(MemoryReader(self._shared.view))
+        else:
+            stat = os.stat(fp)
+            key = (os.path.abspath(fp), stat.st_mtime_ns, stat.st_size)
+            source = fp
+        if key != self._key:
+            image = self._open_image(source, *args, **kwargs)
+            image.load()
+            self._key, self._image = key, image
+        image = self._image.copy()
+        image.format = self._image.format
+        return image
+
+
+def install_image_cache(shared: SharedFrames) -> None:
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+    Image.open = ImageCache(Image.open, shared).open
+
+
+def peak_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def load(path: str):
+    with open(path, "r") as file:
+        code = compile(file.read(), path, "exec")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    # execute module level code without running the main block to warm up
+    # imports (Pillow etc.)
+    sys.argv = [path]
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            exec(code, {"__name__": "dialeye", "__file__": path})  # nosec
+    except (SystemExit, Exception):
+        traceback.print_exc()
+    return code
+
+
+def execute(code, path: str, args: list[str], cwd: str | None) -> tuple[int, str]:
+    output = io.StringIO()
+    orig_cwd = os.getcwd()
+    sys.argv = [path, *args]
+    retval = 0
+    try:
+        if cwd:
+            os.chdir(cwd)
+        with contextlib.redirect_stdout(output):
+            exec(code, {"__name__": "__main__", "__file__": path})  # nosec
+    except SystemExit as e:
+        retval = exit_code(e.code)
+    except Exception:
+        traceback.print_exc()
+        retval = 1
+    finally:
+        os.chdir(orig_cwd)
+    return retval, output.getvalue()
+
+
+def exit_code(code) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def main() -> None:
+    path = sys.argv[1]
+    code = load(path)
+    shared = SharedFrames()
+    install_image_cache(shared)
+    out = sys.stdout
+    out.write(json.dumps({"ready": True}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        request = json.loads(line)
+        start = time.perf_counter()
+        args = request["args"]
+        try:
+            shared.set(args[-1] if args else None, request.get("frame"))
+        except OSError:
+            traceback.print_exc()
+            shared.set(None, None)
+        retval, output = execute(code, path, args, request.get("cwd"))
+        response = {
+            "retval": retval,
+            "output": output,
+            "time": time.perf_counter() - start,
+            "peak_rss": peak_rss_bytes(),
+        }
+        out.write(json.dumps(response) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import configparser
+import re
+from dataclasses import dataclass
+
+# dialEye configuration section of the meter, selected with "-u meter"
+METER_SECTION = "meter"
+DIAL_VALUE = re.compile(
+    r"^\s*(\d+(?:\.\d+)?)[\s,;]+(\d+(?:\.\d+)?)[\s,;]+(\d+(?:\.\d+)?)"
+)
+
+
+@dataclass
+class Dial:
+    name: str
+    x: float
+    y: float
+    r: float
+
+    @property
+    def box(self) -> tuple[float, float, float, float]:
+        return (self.x - self.r, self.y - self.r, self.x + self.r, self.y + self.r)
+
+
+def read_dials(conf_file: str, section: str = METER_SECTION) -> list[Dial]:
+    """Read dial geometry from dialEye configuration.
+
+    Options of the section whose name contains "dial" and whose value starts
+    with three numbers are interpreted as dial center x, y and radius in image
+    coordinates. Empty list is returned if no dials are found.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(conf_file)
+    except configparser.Error:
+        return []
+    if not parser.has_section(section):
+        return []
+    dials = []
+    for name, value in parser.items(section):
+        match = DIAL_VALUE.match(value)
+        if "dial" in name and match:
+            dials.append(Dial(name, *(float(v) for v in match.groups())))
+    return dials
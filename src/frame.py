@@ -0,0 +1,231 @@
+import base64
+import http.client
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from urllib.parse import urlsplit
+
+from stream import MjpegStream
+
+
+class FrameError(Exception):
+    pass
+
+
+@dataclass
+class Frame:
+    data: bytes
+    path: str
+    time: float
+    changed: bool = True
+    # whether the file at path holds the frame
+    stored: bool = True
+
+
+def write_frame(path: str, data: bytes) -> None:
+    """Replace frame file atomically, so dialEye never reads a partial frame."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+class FrameFetcher:
+    """Fetch meter images once per cycle.
+
+    HTTP images are downloaded over a kept-alive connection using conditional
+    GET when the camera provides ETag or Last-Modified headers. The latest
+    image is stored to a local file, which is handed to dialEye. With store
+    False the file is not written and the frames are marked not stored, for
+    when they are handed to dialEye in shared memory. Other sources are
+    treated as local files and read as they are.
+
+    In MJPEG mode one stream connection is kept open and fetch returns the
+    latest frame received from it. Fetches from several threads are
+    serialised, as they share the connection and the latest frame.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        path: str,
+        timeout: float,
+        mjpeg: bool = False,
+        store: bool = True,
+    ) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.store = store
+        self._parts = urlsplit(url or "")
+        ext = ".jpg" if mjpeg else os.path.splitext(self._parts.path)[1]
+        self._path = path + ext
+        self._connection = None
+        self._etag = None
+        self._last_modified = None
+        self._frame = None
+        self._stream = (
+            MjpegStream(url, timeout, headers=self._auth_headers()) if mjpeg else None
+        )
+        self._sequence = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_http(self) -> bool:
+        return self._parts.scheme in ("http", "https")
+
+    def start(self) -> None:
+        """Open MJPEG stream ahead of the first fetch."""
+        if self._stream is not None:
+            self._stream.start()
+
+    def fetch(self) -> Frame:
+        with self._lock:
+            if self._stream is not None:
+                return self._fetch_stream()
+            if self.is_http:
+                return self._fetch_http()
+            return self._read_file()
+
+    def probe(self, timeout: float) -> bool:
+        """Check cheaply that the image source is reachable."""
+        if self._stream is not None:
+            return self._stream.latest(timeout) is not None
+        if not self.is_http:
+            return os.path.isfile(self.url)
+        connection = self._create_connection(timeout)
+        try:
+            status = self._request(connection, "HEAD")
+            if status in (405, 501):
+                # HEAD not supported by the camera
+                status = self._request(connection, "GET")
+            return status < 400
+        except (http.client.HTTPException, OSError):
+            return False
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _fetch_stream(self) -> Frame:
+        latest = self._stream.latest(self.timeout)
+        if latest is None:
+            raise FrameError(f"No frame from MJPEG stream: {self._stream.error}")
+        sequence, data, frame_time = latest
+        if sequence == self._sequence:
+            if time.time() - frame_time > self.timeout:
+                raise FrameError(f"MJPEG stream stalled: {self._stream.error}")
+            return replace(self._frame, time=time.time(), changed=False)
+        self._sequence = sequence
+        self._write_file(data)
+        changed = self._frame is None or self._frame.data != data
+        self._frame = Frame(
+            data=data,
+            path=self._path,
+            time=frame_time,
+            changed=changed,
+            stored=self.store,
+        )
+        return self._frame
+
+    def _read_file(self) -> Frame:
+        with open(self.url, "rb") as file:
+            data = file.read()
+        changed = self._frame is None or self._frame.data != data
+        self._frame = Frame(data=data, path=self.url, time=time.time(), changed=changed)
+        return self._frame
+
+    def _fetch_http(self) -> Frame:
+        status, headers, data = self._get(self._request_headers())
+        if status == 304 and self._frame is not None:
+            self._frame = replace(self._frame, time=time.time(), changed=False)
+            return self._frame
+        if status != 200:
+            raise FrameError(f"Image fetch failed with HTTP status {status}")
+
+        self._etag = headers.get("ETag")
+        self._last_modified = headers.get("Last-Modified")
+        self._write_file(data)
+        changed = self._frame is None or self._frame.data != data
+        self._frame = Frame(
+            data=data,
+            path=self._path,
+            time=time.time(),
+            changed=changed,
+            stored=self.store,
+        )
+        return self._frame
+
+    def _auth_headers(self) -> dict:
+        headers = {}
+        if self._parts.username:
+            credentials = f"{self._parts.username}:{self._parts.password or ''}"
+            token = base64.b64encode(credentials.encode()).decode()
+            headers["Authorization"] = f"Basic {token}"
+        return headers
+
+    def _request_headers(self) -> dict:
+        headers = self._auth_headers()
+        if self._frame is not None and self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._frame is not None and self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        return headers
+
+    def _request(self, connection: http.client.HTTPConnection, method: str) -> int:
+        connection.request(method, self._target, headers=self._request_headers())
+        response = connection.getresponse()
+        response.read()
+        return response.status
+
+    @property
+    def _target(self) -> str:
+        target = self._parts.path or "/"
+        if self._parts.query:
+            target += "?" + self._parts.query
+        return target
+
+    def _get(self, headers: dict) -> tuple[int, http.client.HTTPMessage, bytes]:
+        target = self._target
+
+        # a kept-alive connection may have been closed by the camera, so retry
+        # once with a fresh connection
+        reused = self._connection is not None
+        while True:
+            try:
+                connection = self._get_connection()
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                self.close()
+                if not reused:
+                    raise FrameError(f"Image fetch failed: {e}") from e
+                reused = False
+
+        if response.will_close:
+            self.close()
+        return response.status, response.headers, data
+
+    def _get_connection(self) -> http.client.HTTPConnection:
+        if self._connection is None:
+            self._connection = self._create_connection(self.timeout)
+        return self._connection
+
+    def _create_connection(self, timeout: float) -> http.client.HTTPConnection:
+        cls = (
+            http.client.HTTPSConnection
+            if self._parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return cls(self._parts.hostname, self._parts.port, timeout=timeout)
+
+    def _write_file(self, data: bytes) -> None:
+        if self.store:
+            write_frame(self._path, data)
@@ -0,0 +1,85 @@
+import queue
+import resource
+import sys
+import threading
+import weakref
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+
+@dataclass(frozen=True)
+class FrameBuffer:
+    """Handle of a frame in shared memory, passed to the dialEye worker."""
+
+    name: str
+    size: int
+    # changes every time the buffer is reused
+    generation: int
+
+
+def close_segments(segments: list[SharedMemory]) -> None:
+    for memory in segments:
+        memory.close()
+        memory.unlink()
+    segments.clear()
+
+
+class FramePool:
+    """Fixed pool of shared memory buffers for handing frames to dialEye
+    workers without writing and reading them through files.
+
+    Buffers are allocated on first use and recycled after that. Frames larger
+    than slot_size, or when all buffers are in use, are not pooled.
+    """
+
+    def __init__(self, slots: int, slot_size: int) -> None:
+        self.slots = slots
+        self.slot_size = slot_size
+        self._segments = []
+        self._free = queue.SimpleQueue()
+        self._in_use = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        weakref.finalize(self, close_segments, self._segments)
+
+    def put(self, data: bytes) -> FrameBuffer | None:
+        if len(data) > self.slot_size:
+            return None
+        memory = self._get_free()
+        if memory is None:
+            return None
+        memory.buf[: len(data)] = data
+        with self._lock:
+            self._generation += 1
+            buffer = FrameBuffer(memory.name, len(data), self._generation)
+            self._in_use[buffer] = memory
+        return buffer
+
+    def release(self, buffer: FrameBuffer) -> None:
+        with self._lock:
+            memory = self._in_use.pop(buffer, None)
+        if memory is not None:
+            self._free.put(memory)
+
+    def close(self) -> None:
+        with self._lock:
+            self._in_use.clear()
+            close_segments(self._segments)
+
+    def _get_free(self) -> SharedMemory | None:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._segments) >= self.slots:
+                return None
+            memory = SharedMemory(create=True, size=self.slot_size)
+            self._segments.append(memory)
+            return memory
+
+
+def peak_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
@@ -0,0 +1,92 @@
+from array import array
+from collections import deque
+
+WINDOWS = {"1min": 60, "15min": 900, "1h": 3600, "24h": 86400}
+
+
+class History:
+    """Fixed size ring buffer of meter readings with windowed aggregates.
+
+    Readings are stored to preallocated arrays, so memory usage is bounded by
+    the capacity. Every window keeps the index of its base reading, which is
+    the latest reading at or before the window start. Peak flow is tracked
+    with a monotonic queue over the longest window. Both are advanced
+    incrementally, so adding a reading and querying the aggregates is
+    amortized O(1).
+    """
+
+    def __init__(self, capacity: int, windows: dict[str, float] = WINDOWS) -> None:
+        self.capacity = capacity
+        self.windows = windows
+        self._times = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._flows = array("d", bytes(8 * capacity))
+        self._count = 0
+        self._bases = {name: 0 for name in windows}
+        self._peaks = deque()
+        self._peak_window = max(windows.values())
+        self._flow_start = None
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def add(self, timestamp: float, value: float, flow: float) -> None:
+        index = self._count
+        if flow <= 0:
+            self._flow_start = None
+        elif self._flow_start is None:
+            # flow is measured over the interval since the previous reading
+            previous = self._times[(index - 1) % self.capacity] if index else timestamp
+            self._flow_start = previous
+
+        slot = index % self.capacity
+        self._times[slot] = timestamp
+        self._values[slot] = value
+        self._flows[slot] = flow
+        self._count += 1
+
+        oldest = self._count - len(self)
+        for name, window in self.windows.items():
+            self._bases[name] = self._advance(
+                self._bases[name], oldest, timestamp - window
+            )
+
+        while self._peaks and self._flows[self._peaks[-1] % self.capacity] <= flow:
+            self._peaks.pop()
+        self._peaks.append(index)
+        start = timestamp - self._peak_window
+        while (
+            self._peaks[0] < oldest
+            or self._times[self._peaks[0] % self.capacity] < start
+        ):
+            self._peaks.popleft()
+
+    def litres(self, name: str) -> float:
+        if not self._count:
+            return 0.0
+        base = self._bases[name] % self.capacity
+        latest = (self._count - 1) % self.capacity
+        return (self._values[latest] - self._values[base]) * 1000
+
+    def peak_flow(self) -> float:
+        return self._flows[self._peaks[0] % self.capacity] if self._peaks else 0.0
+
+    def continuous_flow_seconds(self) -> float:
+        if self._flow_start is None:
+            return 0.0
+        return self._times[(self._count - 1) % self.capacity] - self._flow_start
+
+    def summary(self) -> dict:
+        return {
+            "readings": len(self),
+            "litres": {name: round(self.litres(name), 3) for name in self.windows},
+            "peakFlowLitrePerMin": round(self.peak_flow(), 2),
+            "continuousFlowSeconds": round(self.continuous_flow_seconds()),
+        }
+
+    def _advance(self, base: int, oldest: int, start: float) -> int:
+        base = max(base, oldest)
+        latest = self._count - 1
+        while base < latest and self._times[(base + 1) % self.capacity] <= start:
+            base += 1
+        return base
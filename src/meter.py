@@ -1,6 +1,10 @@
+import ast
+import copy
 from dataclasses import dataclass, field
 from datetime import datetime
 
+DATA_VERSION = "v2"
+
 
 @dataclass
 class Value:
@@ -22,25 +26,39 @@ class Meter:
 
     def __post_init__(self):
         self._current_value.value = self.value
+        self._litre = round((self.value - self.m3) * 1000, 2)
 
-    def update_litre(self, litre: float) -> None:
+    def update_litre(self, litre: float, time: datetime = None) -> None:
+        """Update reading, time defaults to now."""
         if litre < 100 and self.m3_already_increased is False:
             self.m3 = self.m3 + 1
-            self._update_current_value(litre)
+            self._update_current_value(litre, time)
             self.m3_already_increased = True
         elif litre >= 400 and litre < 700 and self.m3_already_increased is True:
-            self._update_current_value(litre)
+            self._update_current_value(litre, time)
             self.m3_already_increased = False
         else:
-            self._update_current_value(litre)
+            self._update_current_value(litre, time)
         self._calc_instant_consumtion()
         self._round()
 
-    def _update_current_value(self, litre):
+    def peek_litre(self, litre: float, time: datetime = None) -> "Meter":
+        """Meter as update_litre would leave it, this meter is not changed."""
+        meter = copy.deepcopy(self)
+        meter.update_litre(litre, time)
+        return meter
+
+    def update_unchanged(self) -> None:
+        """Repeat the latest reading when the dials haven't moved."""
+        self._update_current_value(self._litre)
+        self._calc_instant_consumtion()
+        self._round()
+
+    def _update_current_value(self, litre, time=None):
         self._previous_value.value = self._current_value.value
         self._previous_value.time = self._current_value.time
         self._current_value.value = self.m3 + litre / 1000
-        self._current_value.time = datetime.now()
+        self._current_value.time = time or datetime.now()
         self._litre = litre
         self.value = self._current_value.value
 
@@ -72,3 +90,50 @@ class Meter:
         self._instant_consumption_l += 0.0  # remove possible negative -0.00
         self._current_value.value = round(self._current_value.value, 6)
         self._previous_value.value = round(self._previous_value.value, 6)
+
+
+def format_time(time: datetime) -> str:
+    return time.isoformat() if time else ""
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value) if value else 0
+
+
+def dump_meter(meter: Meter) -> str:
+    """Serialize meter state with the times of the last two readings."""
+    return ";".join(
+        [
+            DATA_VERSION,
+            "%d" % meter.m3,
+            repr(meter.m3_already_increased),
+            "%f" % meter.value,
+            format_time(meter._current_value.time),
+            "%f" % meter._previous_value.value,
+            format_time(meter._previous_value.time),
+        ]
+    )
+
+
+def load_meter(data: str) -> Meter:
+    """Deserialize meter state, also from the unversioned
+    m3;m3_already_increased;value format without reading times."""
+    fields = data.strip().split(";")
+    if fields[0] == DATA_VERSION:
+        fields = fields[1:]
+    elif len(fields) == 3:
+        fields += ["", "0", ""]
+    m3, m3_already_increased, value, time, previous_value, previous_time = fields
+
+    meter = Meter(
+        m3=int(m3),
+        m3_already_increased=ast.literal_eval(m3_already_increased),
+        value=float(value),
+    )
+    if not isinstance(meter.m3_already_increased, bool):
+        raise ValueError(f"Invalid m3_already_increased: {meter}")
+    if meter.m3 < 0 or not meter.m3 <= meter.value < meter.m3 + 1:
+        raise ValueError(f"Value doesn't match m3: {meter}")
+    meter._current_value.time = parse_time(time)
+    meter._previous_value = Value(float(previous_value), parse_time(previous_time))
+    return meter
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Channel:
+    """Bounded queue between pipeline stages.
+
+    put() blocks while the channel is full, which holds back the producing
+    stage. Closing the channel cancels all waiting and coming puts and gets.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.closed = False
+        self._items = deque()
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item) -> None:
+        with self._condition:
+            self._condition.wait_for(
+                lambda: len(self._items) < self.maxsize or self.closed
+            )
+            self._append(item)
+
+    def offer(self, item) -> bool:
+        """Put item without waiting, False if the channel is full or closed."""
+        with self._condition:
+            if len(self._items) >= self.maxsize or self.closed:
+                return False
+            self._append(item)
+            return True
+
+    def get(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._items or self.closed)
+            if self.closed:
+                raise Cancelled()
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def close(self) -> list:
+        """Cancel the channel. Returns the items that were not taken."""
+        with self._condition:
+            self.closed = True
+            items = list(self._items)
+            self._items.clear()
+            self._condition.notify_all()
+            return items
+
+    def _append(self, item) -> None:
+        if self.closed:
+            raise Cancelled()
+        self._items.append(item)
+        self._condition.notify_all()
+
+
+@dataclass
+class Stage:
+    name: str
+    handler: Callable
+    channel: Channel
+    on_cancel: Callable[[list], None] = None
+    thread: threading.Thread = None
+    dropped: list = field(default_factory=list)
+
+
+class Pipeline:
+    """Stages running in their own threads, connected by bounded channels.
+
+    Every stage takes items from its channel and hands them to its handler,
+    which may put results to the channel of the next stage. cancel() closes
+    all channels, so the stages stop after the item they are handling. Items
+    left in a channel are given to its on_cancel callback in join().
+    """
+
+    def __init__(self, name: str, logger) -> None:
+        self.name = name
+        self.logger = logger
+        self.stages = []
+        self.running = False
+
+    def add_stage(
+        self,
+        name: str,
+        handler: Callable,
+        maxsize: int = 1,
+        on_cancel: Callable[[list], None] = None,
+    ) -> Channel:
+        channel = Channel(maxsize)
+        self.stages.append(Stage(name, handler, channel, on_cancel))
+        return channel
+
+    def start(self) -> None:
+        for stage in self.stages:
+            stage.thread = threading.Thread(
+                target=self._run,
+                args=(stage,),
+                name=f"{self.name}-{stage.name}",
+                daemon=True,
+            )
+            stage.thread.start()
+        self.running = True
+
+    def cancel(self) -> None:
+        self.running = False
+        for stage in self.stages:
+            stage.dropped += stage.channel.close()
+
+    def join(self, timeout: float) -> bool:
+        """Wait for the stages to stop. False if some stage is still running
+        after timeout, its dropped items are then discarded."""
+        self.cancel()
+        deadline = time.monotonic() + timeout
+        stopped = True
+        for stage in self.stages:
+            if stage.thread is not None:
+                stage.thread.join(max(deadline - time.monotonic(), 0))
+                if stage.thread.is_alive():
+                    self.logger.warning(f"Stage {stage.name} didn't stop")
+                    stopped = False
+                    continue
+            dropped, stage.dropped = stage.dropped, []
+            if dropped and stage.on_cancel:
+                stage.on_cancel(dropped)
+        return stopped
+
+    def _run(self, stage: Stage) -> None:
+        while True:
+            try:
+                item = stage.channel.get()
+                stage.handler(item)
+            except Cancelled:
+                return
+            except Exception:
+                self.logger.exception(f"Stage {stage.name} failed")
@@ -0,0 +1,103 @@
+import bisect
+from collections import deque
+
+# l/min, floor of the deviation so that steady flow doesn't make any
+# change an outlier
+MIN_DEVIATION = 1.0
+MIN_SAMPLES = 5
+# scales mean absolute deviation to standard deviation of normal data
+DEVIATION_SCALE = 1.2533
+
+
+class PlausibilityFilter:
+    """Reject readings whose flow is physically impossible or far off the
+    recent flows.
+
+    Flow above max_flow l/min in either direction is rejected. Otherwise flow
+    further than threshold deviations from the median of the last window
+    accepted flows is rejected, threshold 0 disables the check. The median is
+    kept in a sorted window and the deviation as exponentially weighted mean
+    absolute deviation from it, so the cost per reading is bounded by the
+    window size.
+
+    Flow above max_flow is never accepted. An outlier is accepted once it
+    agrees, within threshold deviations, with the outliers of max_rejections
+    previous cycles, so a real change of the flow doesn't block the readings
+    while misreads that don't repeat do. Re-reads of the same cycle don't add
+    to the count.
+    """
+
+    def __init__(
+        self,
+        max_flow: float,
+        threshold: float = 0,
+        window: int = 60,
+        max_rejections: int = 3,
+    ) -> None:
+        self.max_flow = max_flow
+        self.threshold = threshold
+        self.max_rejections = max_rejections
+        # agreeing outliers of consecutive cycles and the latest of them
+        self.rejections = 0
+        self._candidate = None
+        self.deviation = 0.0
+        self._flows = deque(maxlen=window)
+        self._sorted = []
+        self._alpha = 2 / (window + 1)
+
+    @property
+    def median(self) -> float | None:
+        count = len(self._sorted)
+        if not count:
+            return None
+        middle = count // 2
+        if count % 2:
+            return self._sorted[middle]
+        return (self._sorted[middle - 1] + self._sorted[middle]) / 2
+
+    @property
+    def tolerance(self) -> float:
+        """Max distance in l/min of a plausible flow from the median."""
+        return self.threshold * max(self.deviation * DEVIATION_SCALE, MIN_DEVIATION)
+
+    def check(self, flow: float, reread: bool = False) -> str | None:
+        """Reason for rejecting the flow in l/min, None when it's accepted.
+        Accepted flow is added to the statistics. reread tells that the flow
+        is read again in the cycle of the previous rejection."""
+        reason = self.reason(flow)
+        if reason == "outlier" and self.confirmed(flow, reread):
+            reason = None
+        elif reason != "outlier":
+            self.rejections = 0
+            self._candidate = None
+        if reason:
+            return reason
+        self.add(flow)
+        return None
+
+    def confirmed(self, flow: float, reread: bool) -> bool:
+        """Count the outlier, True when it agrees with the outliers of
+        max_rejections previous cycles."""
+        if self._candidate is None or abs(flow - self._candidate) > self.tolerance:
+            self.rejections = 1
+        elif not reread:
+            self.rejections += 1
+        self._candidate = flow
+        return self.rejections > self.max_rejections
+
+    def reason(self, flow: float) -> str | None:
+        if self.max_flow > 0 and abs(flow) > self.max_flow:
+            return "max_flow"
+        if self.threshold > 0 and len(self._flows) >= MIN_SAMPLES:
+            if abs(flow - self.median) > self.tolerance:
+                return "outlier"
+        return None
+
+    def add(self, flow: float) -> None:
+        if len(self._flows) == self._flows.maxlen:
+            oldest = self._flows[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._flows.append(flow)
+        bisect.insort(self._sorted, flow)
+        error = abs(flow - self.median)
+        self.deviation += self._alpha * (error - self.deviation)
@@ -0,0 +1,165 @@
+import cProfile
+import io
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+
+class CycleProfiler:
+    """Profile the next N update cycles with cProfile and tracemalloc.
+
+    Nothing is hooked while no cycles are requested, cycle() is then a no-op.
+    cProfile profiles only the thread it is enabled in, so work handed to
+    other threads is run through call() to be included. A cycle passed
+    between threads, e.g. pipeline stages, is profiled with begin(), thread()
+    and end(). Python 3.12+ runs one profiler at a time, so a thread entering
+    while another one is profiled is skipped with a warning.
+    """
+
+    def __init__(self, frames: int = 1, logger=None) -> None:
+        self.frames = frames
+        self.logger = logger
+        self.remaining = 0
+        self.cycles = 0
+        self.active = False
+        # cycles begun but not ended
+        self.pending = 0
+        self.profiles = []
+        # threads not profiled, as another profiler was active
+        self.skipped = 0
+        self.snapshot = None
+        self._own_tracing = False
+        self._lock = threading.Lock()
+
+    def start(self, cycles: int) -> None:
+        """Profile the next cycles, discarding the previous results."""
+        if cycles < 1:
+            raise ValueError("cycles must be at least 1")
+        with self._lock:
+            self.remaining = cycles
+            self.cycles = 0
+            self.profiles = []
+            self.skipped = 0
+            self.snapshot = None
+
+    @property
+    def finished(self) -> bool:
+        return self.remaining == 0 and self.cycles > 0
+
+    def cycle(self):
+        if not self.begin():
+            return nullcontext()
+        return self._profile_cycle()
+
+    def call(self, func: Callable, *args):
+        if not self.active:
+            return func(*args)
+        with self.thread():
+            return func(*args)
+
+    def begin(self) -> bool:
+        """Start profiling a cycle that is handed between threads, False
+        when no more cycles are requested. The threads profile their part
+        of the cycle with thread() and the last one calls end()."""
+        with self._lock:
+            if self.remaining <= self.pending:
+                return False
+            self.pending += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._own_tracing = True
+            self.active = True
+            return True
+
+    def end(self) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.active = self.pending > 0
+            self.cycles += 1
+            self.remaining = max(self.remaining - 1, 0)
+            if not self.remaining:
+                self.snapshot = tracemalloc.take_snapshot()
+                if self._own_tracing:
+                    tracemalloc.stop()
+                    self._own_tracing = False
+
+    @contextmanager
+    def _profile_cycle(self):
+        try:
+            with self.thread():
+                yield
+        finally:
+            self.end()
+
+    @contextmanager
+    def thread(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            profile = None
+            with self._lock:
+                self.skipped += 1
+            if self.logger:
+                self.logger.warning(
+                    f"{threading.current_thread().name} not profiled: {e}"
+                )
+        if profile is None:
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self.profiles.append(profile)
+
+    def stats(self) -> pstats.Stats | None:
+        with self._lock:
+            if not self.finished or not self.profiles:
+                return None
+            stats = pstats.Stats(self.profiles[0], stream=io.StringIO())
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+            return stats
+
+    def dump_stats(self, path: str) -> bool:
+        """Write the combined profile in pstats format, False if there is no
+        finished profile."""
+        stats = self.stats()
+        if stats is None:
+            return False
+        stats.dump_stats(path)
+        return True
+
+    def report(self, limit: int = 50) -> str | None:
+        stats = self.stats()
+        if stats is None:
+            return None
+        stats.stream = io.StringIO()
+        if self.skipped:
+            print(
+                f"{self.skipped} threads not profiled, another profiler was active",
+                file=stats.stream,
+            )
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stats.stream.getvalue()
+
+    def top_allocations(self, limit: int = 25) -> str | None:
+        """Top allocating source lines at the end of the profiled cycles."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        statistics = snapshot.statistics("lineno")
+        total = sum(stat.size for stat in statistics)
+        lines = [
+            f"Top {min(limit, len(statistics))} of {len(statistics)} allocating "
+            f"lines, total {total / 1024:.1f} KiB after {self.cycles} cycles"
+        ]
+        lines += [str(stat) for stat in statistics[:limit]]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,141 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager
+
+from prometheus_client import Counter
+
+
+class PublisherMetrics:
+    """Publish counters, labeled by meter name."""
+
+    def __init__(self, registry) -> None:
+        self.published = Counter(
+            "mqtt_published_messages", "", ["meter"], registry=registry
+        )
+        self.published_bytes = Counter(
+            "mqtt_published_bytes", "", ["meter"], registry=registry
+        )
+        self.suppressed = Counter(
+            "mqtt_suppressed_messages", "", ["meter"], registry=registry
+        )
+
+
+def state_value(payload: str):
+    try:
+        return float(payload)
+    except ValueError:
+        return payload
+
+
+class MqttPublisher:
+    """Publish values to MQTT, skipping retained payloads that haven't
+    changed since they were last sent.
+
+    Unchanged retained payload is re-sent once heartbeat seconds have elapsed,
+    heartbeat 0 sends every payload. Volatile topics, e.g. timestamps, are
+    sent only together with a changed value or heartbeat. Within batch() the
+    values are collected and sent at the end, optionally also combined to a
+    single JSON state topic. Sending is measured with timer. on_publish is
+    called with all values when something was published.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, str, bool], None],
+        label: str,
+        metrics: PublisherMetrics,
+        prefix: str = "",
+        heartbeat: float = 0,
+        topics: bool = True,
+        state_topic: str = None,
+        timer: Callable[[], ContextManager] = nullcontext,
+        on_publish: Callable[[dict], None] = None,
+    ) -> None:
+        self._publish = publish
+        self.prefix = prefix
+        self.heartbeat = heartbeat
+        self.topics = topics
+        self.state_topic = state_topic
+        self.timer = timer
+        self.on_publish = on_publish
+        self.published_metric = metrics.published.labels(label)
+        self.published_bytes_metric = metrics.published_bytes.labels(label)
+        self.suppressed_metric = metrics.suppressed.labels(label)
+        self.sent = {}  # topic -> (payload, time)
+        self.state = {}
+        self.pending = None
+
+    @contextmanager
+    def batch(self):
+        if self.pending is not None:
+            yield
+            return
+        self.pending = {}
+        try:
+            yield
+        finally:
+            pending, self.pending = self.pending, None
+            self.flush(pending)
+
+    def publish(
+        self, topic: str, value: str, retain: bool, volatile: bool = False
+    ) -> None:
+        if self.pending is None:
+            self.flush({topic: (value, retain, volatile)})
+        else:
+            self.pending[topic] = (value, retain, volatile)
+
+    def flush(self, pending: dict) -> None:
+        if pending:
+            with self.timer():
+                self.send_pending(pending)
+
+    def send_pending(self, pending: dict) -> None:
+        now = time.time()
+        due = {
+            topic
+            for topic, (value, retain, volatile) in pending.items()
+            if not volatile and self.is_due(topic, value, retain, now)
+        }
+        volatile = {topic for topic, message in pending.items() if message[2]}
+        if due:
+            # volatile values go along with the changed ones
+            due |= volatile
+        else:
+            due = {
+                topic
+                for topic in volatile
+                if self.is_due(topic, None, pending[topic][1], now)
+            }
+
+        for topic, (value, retain, _) in pending.items():
+            self.state[topic] = state_value(value)
+            if topic not in due:
+                self.suppressed_metric.inc()
+            elif self.topics:
+                self.send(topic, value, retain)
+            if topic in due:
+                self.sent[topic] = (value, now)
+
+        if self.state_topic:
+            if due:
+                self.send(self.state_topic, json.dumps(self.state), True)
+            else:
+                self.suppressed_metric.inc()
+        if due and self.on_publish:
+            self.on_publish(dict(self.state))
+
+    def is_due(self, topic: str, value: str | None, retain: bool, now: float) -> bool:
+        """Value None compares only the time since the topic was last sent."""
+        if not retain or self.heartbeat <= 0 or topic not in self.sent:
+            return True
+        payload, time_sent = self.sent[topic]
+        changed = value is not None and payload != value
+        return changed or now - time_sent >= self.heartbeat
+
+    def send(self, topic: str, value: str, retain: bool) -> None:
+        topic = f"{self.prefix}{topic}"
+        self._publish(topic, value, retain)
+        self.published_metric.inc()
+        self.published_bytes_metric.inc(len(topic) + len(value))
@@ -0,0 +1,1029 @@
+import contextvars
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Callable
+
+from flask import Response, make_response, render_template, request
+from prometheus_client import Counter, Gauge, Histogram
+
+from meter import Meter, dump_meter, format_time, load_meter
+from dialeye import DialEye, DialEyePool, SubprocessDialEye, WorkerDialEye
+from frame import Frame, FrameFetcher, write_frame
+from change import ChangeDetector
+from dials import METER_SECTION, read_dials
+from tracing import StageTimer, TraceLogger
+from storage import DataWriter, atomic_write, backup_filename
+from history import History
+from consensus import vote
+from framepool import FramePool
+from broadcast import Broadcaster
+from recorder import FlightRecorder
+from roi import RegionCropper
+from pipeline import Cancelled, Pipeline
+from plausibility import PlausibilityFilter
+from profiler import CycleProfiler
+from breaker import HALF_OPEN, STATES, CircuitBreaker
+from publisher import MqttPublisher, PublisherMetrics
+
+RESULT_IMAGE = "dialeye_result.png"
+# frames being fetched, queued and recognised in pipeline mode
+PIPELINE_FRAMES = 3
+PUBLISH_QUEUE_SIZE = 64
+ROI_CONF_FILE = "dialEye_roi.conf"
+
+
+@dataclass
+class Cycle:
+    """Update cycle passed through the pipeline stages. The stages run in
+    copies of the context the cycle was queued in, so that the cycle keeps
+    its trace ID and stage durations in every stage."""
+
+    context: contextvars.Context
+    start: float
+    profiled: bool = False
+    reread: bool = False
+    frame: Frame | None = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+    def run(self, func: Callable, *args):
+        return self.context.copy().run(func, *args)
+
+
+class ReaderMetrics:
+    """Metric families shared by the meter readers, labeled by meter name."""
+
+    def __init__(self, registry) -> None:
+        self.succesfull_fecth = Counter(
+            "succesfull_fecth", "", ["meter"], registry=registry
+        )
+        self.fecth_errors = Counter("fecth_errors", "", ["meter"], registry=registry)
+        self.skipped_recognitions = Counter(
+            "skipped_recognitions", "", ["meter"], registry=registry
+        )
+        self.stage_duration = Histogram(
+            "stage_duration_seconds", "", ["meter", "stage"], registry=registry
+        )
+        self.update_duration = Histogram(
+            "update_duration_seconds", "", registry=registry
+        )
+        self.last_value = Gauge("last_value_m3", "", ["meter"], registry=registry)
+        self.last_consumption = Gauge(
+            "last_consumption_litre_per_min", "", ["meter"], registry=registry
+        )
+        self.last_success = Gauge(
+            "last_success_timestamp_seconds", "", ["meter"], registry=registry
+        )
+        self.recognition_confidence = Gauge(
+            "recognition_confidence", "", ["meter"], registry=registry
+        )
+        self.camera_circuit_state = Gauge(
+            "camera_circuit_state",
+            "0 = closed, 1 = half open, 2 = open",
+            ["meter"],
+            registry=registry,
+        )
+        self.dialeye_peak_rss = Gauge(
+            "dialeye_peak_rss_bytes", "", ["meter"], registry=registry
+        )
+        self.recorder_write_duration = Histogram(
+            "flight_recorder_write_seconds", "", ["meter"], registry=registry
+        )
+        self.recorder_bytes = Gauge(
+            "flight_recorder_bytes", "", ["meter"], registry=registry
+        )
+        self.recorder_dropped = Counter(
+            "flight_recorder_dropped", "", ["meter"], registry=registry
+        )
+        self.rejected_readings = Counter(
+            "rejected_readings", "", ["meter", "reason"], registry=registry
+        )
+        self.publisher = PublisherMetrics(registry)
+
+
+class MeterReader:
+    """Read one meter: fetch image, recognise dials, persist and publish.
+
+    Configuration is looked up from the meter specific config first. Unnamed
+    meter publishes to the app topics as they are, named meter publishes
+    under its own sub-topic.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config,
+        logger,
+        publish_value_to_mqtt_topic: Callable[[str, str, bool], None],
+        metrics: ReaderMetrics,
+        work_dir: str,
+        profiler: CycleProfiler = None,
+    ) -> None:
+        self.name = name
+        self.config = config
+        self.logger = TraceLogger(logger, prefix=name)
+        self.topic_prefix = f"{name}/" if name else ""
+        self.label = name or "default"
+        mode = self.config["PUBLISH_MODE"]
+        self.stages = StageTimer(metrics.stage_duration, meter=self.label)
+        # pipeline cycles are timed and profiled by the stages
+        self.update_duration_metric = metrics.update_duration
+        self.profiler = profiler or CycleProfiler(logger=self.logger)
+        self.mqtt_publish = publish_value_to_mqtt_topic
+        self.publisher = MqttPublisher(
+            self.send_message,
+            self.label,
+            metrics.publisher,
+            prefix=self.topic_prefix,
+            heartbeat=float(self.config["PUBLISH_HEARTBEAT"]),
+            topics=mode in ("topics", "both"),
+            state_topic=self.config["STATE_TOPIC"] if mode != "topics" else None,
+            timer=lambda: self.stages.measure("publish"),
+            on_publish=self.broadcast_state,
+        )
+        self.broadcaster = Broadcaster()
+        self.counts = {"successful": 0, "errors": 0, "skipped": 0, "rejected": 0}
+        self.result_image = f"dialeye_result_{name}.png" if name else RESULT_IMAGE
+
+        self.succesfull_fecth_metric = metrics.succesfull_fecth.labels(self.label)
+        self.fecth_errors_metric = metrics.fecth_errors.labels(self.label)
+        self.skipped_recognitions_metric = metrics.skipped_recognitions.labels(
+            self.label
+        )
+        self.last_value_metric = metrics.last_value.labels(self.label)
+        self.last_consumption_metric = metrics.last_consumption.labels(self.label)
+        self.last_success_metric = metrics.last_success.labels(self.label)
+        self.recognition_confidence_metric = metrics.recognition_confidence.labels(
+            self.label
+        )
+        self.camera_circuit_state_metric = metrics.camera_circuit_state.labels(
+            self.label
+        )
+        self.dialeye_peak_rss_metric = metrics.dialeye_peak_rss.labels(self.label)
+        self.recorder_write_duration_metric = metrics.recorder_write_duration.labels(
+            self.label
+        )
+        self.recorder_bytes_metric = metrics.recorder_bytes.labels(self.label)
+        self.recorder_dropped_metric = metrics.recorder_dropped.labels(self.label)
+        self.rejected_readings_metric = metrics.rejected_readings
+
+        self.active = False
+        self.meter = self.init_meter()
+        self.logger.debug(f"{self.meter}")
+        self.stored_m3_already_increased = self.meter.m3_already_increased
+        self.data_writer = DataWriter(
+            self.store,
+            float(self.config["DATA_FLUSH_INTERVAL"]),
+            name=f"data-writer-{self.label}",
+            logger=self.logger,
+        )
+        self.history = History(int(self.config["HISTORY_SIZE"]))
+        self.burst_size = max(int(self.config["BURST_SIZE"]), 1)
+        self.dialeye = self.create_dialeye()
+        self.frame_pool = self.create_frame_pool()
+        # cleared when dialEye reads the frame only from the file
+        self.sharing_frames = self.frame_pool is not None
+        self.shared_frames = {}  # path -> (frame data, buffer)
+        self.frame_files = {}  # path -> frame data written to it
+        self.burst_executor = (
+            ThreadPoolExecutor(
+                max_workers=self.burst_workers, thread_name_prefix=f"burst-{self.label}"
+            )
+            if self.burst_size > 1
+            else None
+        )
+        self.work_dir = work_dir
+        self.frame_fetcher = FrameFetcher(
+            self.config["IMAGE_URL"],
+            os.path.join(self.work_dir, "frame"),
+            timeout=self.config["TIMEOUT"],
+            mjpeg=self.config["IMAGE_SOURCE"] == "mjpeg",
+            # frames go to shared memory, files are written only as fallback
+            store=self.frame_pool is None,
+        )
+        self.frame = None
+        self.camera_breaker = CircuitBreaker(
+            threshold=int(self.config["CAMERA_FAILURE_THRESHOLD"]),
+            backoff=float(self.config["CAMERA_BACKOFF"]),
+            max_backoff=float(self.config["CAMERA_MAX_BACKOFF"]),
+            on_state_change=self.camera_state_changed,
+        )
+        self.camera_circuit_state_metric.set(STATES[self.camera_breaker.state])
+        dials = read_dials(self.config["CONF_FILE"])
+        self.cropper = self.create_cropper(dials)
+        self.cropped_images = set()
+        self.change_detector = ChangeDetector(
+            dials,
+            threshold=float(self.config["CHANGE_THRESHOLD"]),
+            max_skips=int(self.config["CHANGE_MAX_SKIPS"]),
+        )
+        self.recorder = self.create_recorder()
+        self.plausibility = self.create_plausibility_filter()
+        self.reread_requested = False
+        self.rereading = False
+        self.last_update_time = None
+        self.result_image_time = None
+        self.result_image_requested = False
+        self.pipeline_frames = 0
+        self.last_cycle = None
+        self.pipeline = self.create_pipeline()
+
+    def prime(self) -> None:
+        """Start dialEye and image stream ahead of the first update, so the
+        first reading doesn't pay the start-up cost."""
+        self.frame_fetcher.start()
+        try:
+            self.dialeye.start(timeout=float(self.config["DIALEYE_START_TIMEOUT"]))
+        except Exception as e:
+            self.logger.error(f"DialEye start failed: {e}")
+
+    def cancel(self) -> None:
+        """Stop taking new work and abort the running recognition."""
+        if self.pipeline is not None:
+            self.pipeline.cancel()
+            if self.last_cycle is not None:
+                self.last_cycle.done.set()
+        self.dialeye.cancel()
+
+    def close(self) -> None:
+        self.broadcaster.close()
+        if self.pipeline is not None:
+            self.cancel()
+            self.pipeline.join(float(self.config["TIMEOUT"]) + 1)
+        self.data_writer.close(float(self.config["TIMEOUT"]) + 1)
+        if self.burst_executor:
+            self.burst_executor.shutdown()
+        self.dialeye.close()
+        if self.frame_pool:
+            self.frame_pool.close()
+        self.frame_fetcher.close()
+        if self.recorder:
+            self.recorder.close()
+        with self.publisher.batch():
+            self.publish_zero_consumption()
+
+    def update(self) -> None:
+        if self.pipeline is not None:
+            if not self.queue_cycle():
+                self.logger.debug("Previous frame is still being fetched, skip")
+            return
+        # values of the cycle are sent together at the end
+        with self.publisher.batch():
+            self.update_meter()
+        self.refresh_result_image()
+
+    def update_meter(self) -> None:
+        self.stages.start()
+        self.process_frame(self.fetch_frame())
+        if self.reread_requested:
+            self.reread_requested = False
+            self.logger.info("Re-read rejected reading")
+            self.stages.start()
+            self.rereading = True
+            try:
+                self.process_frame(self.fetch_frame())
+            finally:
+                self.rereading = False
+        self.reread_requested = False
+
+    def fetch_frame(self) -> Frame | None:
+        if not self.camera_available():
+            self.logger.debug("Camera unavailable, skip update")
+            return None
+        frame = self.acquire_frame()
+        if frame is None:
+            self.fecth_errors_metric.inc()
+            self.counts["errors"] += 1
+        return frame
+
+    def process_frame(self, frame: Frame | None) -> None:
+        self.active = False
+        if frame is None:
+            self.publish_zero_consumption()
+            return
+        if self.frame_changed(frame):
+            self.recognise(frame)
+        else:
+            self.skipped_recognitions_metric.inc()
+            self.counts["skipped"] += 1
+            self.handle_unchanged()
+
+    def recognise(self, frame: Frame) -> None:
+        m3 = self.meter.m3
+        if self.burst_size > 1:
+            litre, output = self.recognise_burst(frame)
+        else:
+            image = self.prepare_image(frame.path, frame.data, frame.stored)
+            retval, output = self.get_dialeye_value(image)
+            litre = self.convert_dialeye_value_to_litre(retval, output)
+            if retval != 0 or litre is None:
+                self.logger.error(
+                    f"DialEye command execution failed: {retval} {output}"
+                )
+                litre = None
+        rejected = litre is not None and self.reject(litre)
+        if rejected:
+            self.publish_zero_consumption()
+        elif litre is not None:
+            self.succesfull_fecth_metric.inc()
+            self.counts["successful"] += 1
+            self.change_detector.commit()
+            self.handle_update(litre)
+        else:
+            self.fecth_errors_metric.inc()
+            self.counts["errors"] += 1
+            self.publish_zero_consumption()
+        self.record(
+            frame, output, litre, rollover=self.meter.m3 != m3, rejected=rejected
+        )
+
+    def reject(self, litre: float) -> bool:
+        """Check the reading before it changes the meter state. Rejected
+        reading is re-read right away."""
+        if self.plausibility is None:
+            return False
+        flow = self.meter.peek_litre(litre).instant_consumption_l_per_min
+        reason = self.plausibility.check(flow, reread=self.rereading)
+        if reason is None:
+            return False
+        self.rejected_readings_metric.labels(self.label, reason).inc()
+        self.counts["rejected"] += 1
+        self.logger.warning(
+            "Reading %.2f l rejected (%s), flow %.2f l/min, median %s l/min",
+            litre,
+            reason,
+            flow,
+            self.plausibility.median,
+        )
+        if self.pipeline is not None:
+            self.queue_cycle(reread=True)
+        else:
+            self.reread_requested = True
+        return True
+
+    def record(
+        self,
+        frame: Frame,
+        output,
+        litre: float | None,
+        rollover: bool,
+        rejected: bool = False,
+    ):
+        """Hand the frame and the outcome of its recognition to the flight
+        recorder."""
+        if self.recorder is None:
+            return
+        negative = (
+            litre is not None
+            and not rejected
+            and self.meter.instant_consumption_l_per_min < 0
+        )
+        info = {
+            "time": format_time(datetime.fromtimestamp(frame.time)),
+            "dialeye": output,
+            "litre": litre,
+            "meter": dump_meter(self.meter),
+            "rollover": rollover,
+            "negative_consumption": negative,
+            "rejected": rejected,
+            "stages": dict(self.stages.durations),
+        }
+        self.recorder.record(
+            frame.time, frame.data, os.path.splitext(frame.path)[1], info
+        )
+
+    def recognise_burst(self, frame: Frame) -> tuple[float | None, list]:
+        """Capture BURST_SIZE frames and recognise them in parallel while the
+        next frames are being captured, then vote for the reading. Returns the
+        reading and the readings of the burst."""
+        futures = []
+        for i in range(self.burst_size):
+            if i > 0:
+                time.sleep(float(self.config["BURST_INTERVAL"]))
+                frame = self.acquire_frame()
+                if frame is None:
+                    continue
+            futures.append(
+                self.burst_executor.submit(
+                    contextvars.copy_context().run,
+                    self.read_litre,
+                    self.save_burst_frame(frame, i),
+                )
+            )
+        readings = [future.result() for future in futures]
+        readings += [None] * (self.burst_size - len(readings))
+        consensus = vote(readings, tolerance=float(self.config["BURST_TOLERANCE"]))
+        self.recognition_confidence_metric.set(consensus.confidence)
+        self.logger.debug(
+            "Burst readings %s, consensus %s (confidence=%.2f)",
+            readings,
+            consensus.value,
+            consensus.confidence,
+        )
+        if consensus.value is None:
+            self.logger.error("DialEye recognition failed for all burst frames")
+            return None, readings
+        if consensus.confidence < float(self.config["BURST_MIN_CONFIDENCE"]):
+            self.logger.error(
+                "Burst readings %s disagree (confidence=%.2f), ignore update",
+                readings,
+                consensus.confidence,
+            )
+            return None, readings
+        return consensus.value, readings
+
+    def save_burst_frame(self, frame: Frame, index: int) -> str:
+        # the fetcher overwrites its frame file while earlier frames of the
+        # burst are being recognised
+        ext = os.path.splitext(frame.path)[1]
+        path = os.path.join(self.work_dir, f"burst_{index}{ext}")
+        return self.prepare_image(path, frame.data, stored=False)
+
+    def prepare_image(self, path: str, data: bytes, stored: bool = True) -> str:
+        """Crop frame to the dials when configured and hand it to dialEye.
+        stored tells whether the file at path already holds the frame.
+        Returns the path of the image to recognise."""
+        if self.cropper is not None:
+            root, ext = os.path.splitext(path)
+            cropped = os.path.join(self.work_dir, f"{os.path.basename(root)}_roi{ext}")
+            try:
+                with self.stages.measure("crop"):
+                    data = self.cropper.crop(data)
+                path, stored = cropped, False
+                self.cropped_images.add(cropped)
+            except Exception as e:
+                # recognise the full frame with the original configuration
+                self.logger.warning(f"Image crop failed: {e}")
+                self.cropped_images.discard(cropped)
+        self.hand_over(path, data, stored)
+        return path
+
+    def hand_over(self, path: str, data: bytes, stored: bool) -> None:
+        """Hand frame to dialEye in shared memory, or in the file at path when
+        it can't be shared."""
+        if self.share_frame(path, data):
+            # never read a stale file in place of the shared frame
+            if self.frame_files.pop(path, None) is not None:
+                os.remove(path)
+            return
+        if stored:
+            return
+        if self.frame_files.get(path) is not data:
+            write_frame(path, data)
+            self.frame_files[path] = data
+
+    def share_frame(self, path: str, data: bytes) -> bool:
+        """Hand frame to dialEye workers in shared memory. The buffer of the
+        previous frame of the same path is recycled. False if the frame is
+        not shared."""
+        if self.frame_pool is None:
+            return False
+        previous = self.shared_frames.pop(path, None)
+        if previous is not None:
+            if previous[0] is data and self.sharing_frames:
+                self.shared_frames[path] = previous
+                return True
+            self.frame_pool.release(previous[1])
+        if not self.sharing_frames:
+            return False
+        try:
+            buffer = self.frame_pool.put(data)
+        except Exception as e:
+            # dialEye reads the frame file instead
+            self.logger.debug(f"Frame sharing failed: {e}")
+            return False
+        if buffer is None:
+            return False
+        self.shared_frames[path] = (data, buffer)
+        return True
+
+    def read_litre(self, image: str) -> float | None:
+        try:
+            retval, raw = self.get_dialeye_value(image)
+            return self.convert_dialeye_value_to_litre(retval, raw)
+        except Exception as e:
+            self.logger.error(f"DialEye command execution failed: {e}")
+            return None
+
+    def camera_available(self) -> bool:
+        """False while the camera circuit is open. When the backoff delay has
+        passed, the camera is probed before trying to fetch again."""
+        if not self.camera_breaker.allow():
+            return False
+        if self.camera_breaker.state == HALF_OPEN:
+            timeout = float(self.config["CAMERA_PROBE_TIMEOUT"])
+            if not self.frame_fetcher.probe(timeout):
+                self.camera_breaker.record_failure()
+                return False
+        return True
+
+    def camera_state_changed(self, state: str) -> None:
+        self.camera_circuit_state_metric.set(STATES[state])
+        if self.camera_breaker.is_open:
+            self.logger.warning(
+                "Camera unavailable, retry in %.0f sec", self.camera_breaker.delay
+            )
+        else:
+            self.logger.info(f"Camera circuit {state}")
+
+    def acquire_frame(self) -> Frame | None:
+        try:
+            with self.stages.measure("fetch"):
+                frame = self.frame_fetcher.fetch()
+        except Exception as e:
+            self.logger.error(f"Image fetch failed: {e}")
+            self.camera_breaker.record_failure()
+            return None
+        self.camera_breaker.record_success()
+        self.logger.debug(
+            "Image fetched (size=%d, changed=%r)", len(frame.data), frame.changed
+        )
+        self.frame = frame
+        return frame
+
+    def frame_changed(self, frame: Frame) -> bool:
+        try:
+            with self.stages.measure("change_detection"):
+                changed = self.change_detector.changed(frame)
+        except Exception as e:
+            self.logger.debug(f"Change detection failed: {e}")
+            return True
+        self.logger.debug(
+            "Frame changed=%r (difference=%s)",
+            changed,
+            self.change_detector.difference,
+        )
+        return changed
+
+    def get_dialeye_value(self, image: str) -> tuple[int, str | None]:
+        start = time.time()
+        retval, result = self.execute_dialeye(
+            [
+                "-f",
+                self.conf_file(image),
+                "-s",
+                "-u",
+                METER_SECTION,
+                image,
+            ],
+            timeout=self.config["TIMEOUT"],
+        )
+        end = time.time()
+        result = result.strip()
+        self.observe_dialeye_time(end - start)
+        if self.dialeye.peak_rss:
+            self.dialeye_peak_rss_metric.set(self.dialeye.peak_rss)
+
+        self.logger.debug(
+            "DialEye result (retval=%d, time=%f): %s",
+            retval,
+            (end - start),
+            result,
+        )
+        return retval, result
+
+    def conf_file(self, image: str) -> str:
+        if image in self.cropped_images:
+            return os.path.join(self.work_dir, ROI_CONF_FILE)
+        return self.config["CONF_FILE"]
+
+    def observe_dialeye_time(self, duration: float) -> None:
+        exec_time = self.dialeye.exec_time
+        if exec_time is None:
+            self.stages.observe("recognition", duration)
+        else:
+            self.stages.observe("dispatch", max(duration - exec_time, 0))
+            self.stages.observe("recognition", exec_time)
+
+    def convert_dialeye_value_to_litre(self, retval: int, value: str) -> float | None:
+        return float(value) / 10 if retval == 0 else None
+
+    def handle_update(self, litre: float):
+        with self.stages.measure("meter"):
+            self.meter.update_litre(litre)
+        self.last_update_time = time.time()
+        self.active = self.meter.instant_consumption_l_per_min > 0
+        self.logger.debug(f"{self.meter}")
+        self.store_data()
+        if self.meter.instant_consumption_l_per_min >= 0:
+            self.handle_consumption()
+        else:
+            self.handle_negative_consumption()
+
+    def handle_unchanged(self) -> None:
+        self.meter.update_unchanged()
+        self.last_update_time = time.time()
+        self.logger.debug(f"{self.meter}")
+        self.handle_consumption()
+
+    def handle_consumption(self) -> None:
+        self.last_value_metric.set(self.meter.value)
+        self.last_consumption_metric.set(self.meter.instant_consumption_l_per_min)
+        self.last_success_metric.set_to_current_time()
+        self.logger.info(
+            "Current value = %.5f m3, consumption = %.2f l/min",
+            self.meter.value,
+            self.meter.instant_consumption_l_per_min,
+        )
+        self.publish_consumption_values(
+            self.meter.value,
+            self.meter.instant_consumption_l_per_min,
+        )
+        self.history.add(
+            time.time(), self.meter.value, self.meter.instant_consumption_l_per_min
+        )
+        self.publish_history()
+
+    def handle_negative_consumption(self) -> None:
+        self.logger.error(
+            "Consuption %.2f l/min is less than 0, ignore update",
+            self.meter.instant_consumption_l_per_min,
+        )
+        self.publish_zero_consumption()
+
+    def execute_dialeye(self, args, timeout=5, cwd=None) -> tuple[int, str]:
+        path = args[-1]
+        shared = self.shared_frames.get(path)
+        if shared is None:
+            return self.dialeye.run(args, timeout=timeout, cwd=cwd)
+        retval, result = self.dialeye.run(
+            args, timeout=timeout, cwd=cwd, frame=shared[1]
+        )
+        if retval == 0:
+            return retval, result
+        # dialEye may read the image past the shared frame, retry from the file
+        write_frame(path, shared[0])
+        self.frame_files[path] = shared[0]
+        retval, result = self.dialeye.run(args, timeout=timeout, cwd=cwd)
+        if retval == 0 and self.sharing_frames:
+            self.sharing_frames = False
+            self.logger.warning(
+                "DialEye failed with shared frame but read the frame file, "
+                "frames are handed over in files from now on"
+            )
+        return retval, result
+
+    def create_pipeline(self) -> Pipeline | None:
+        """Fetch, recognition, data file writes and MQTT publishing run as
+        stages of their own, so the next frame is fetched while the current
+        one is being recognised."""
+        if self.config["UPDATE_MODE"] != "pipeline":
+            return None
+        pipeline = Pipeline(f"pipeline-{self.label}", self.logger)
+        self.fetch_channel = pipeline.add_stage("fetch", self.fetch_stage)
+        self.recognise_channel = pipeline.add_stage("recognise", self.recognise_stage)
+        self.publish_channel = pipeline.add_stage(
+            "publish",
+            self.publish_stage,
+            maxsize=PUBLISH_QUEUE_SIZE,
+            on_cancel=self.publish_dropped,
+        )
+        pipeline.start()
+        return pipeline
+
+    def queue_cycle(self, reread: bool = False) -> bool:
+        """Queue fetch of the next frame, False if the previous one is still
+        being fetched. reread queues the re-read of a rejected reading."""
+        context = contextvars.copy_context()
+        # own stage durations, not mixed with the frame being recognised
+        context.run(self.stages.start)
+        cycle = Cycle(
+            context, time.perf_counter(), self.profiler.begin(), reread=reread
+        )
+        if not self.fetch_channel.offer(cycle):
+            if cycle.profiled:
+                self.profiler.end()
+            return False
+        self.last_cycle = cycle
+        return True
+
+    def wait_cycle(self, timeout: float) -> None:
+        """Wait until the frame queued last has been recognised."""
+        cycle = self.last_cycle
+        if cycle is not None:
+            cycle.done.wait(timeout)
+
+    def run_cycle(self, cycle: Cycle, func: Callable) -> None:
+        with self.profiler.thread() if cycle.profiled else nullcontext():
+            cycle.run(func, cycle)
+
+    def end_cycle(self, cycle: Cycle) -> None:
+        self.update_duration_metric.observe(time.perf_counter() - cycle.start)
+        if cycle.profiled:
+            self.profiler.end()
+        cycle.done.set()
+
+    def fetch_stage(self, cycle: Cycle) -> None:
+        try:
+            self.run_cycle(cycle, self.fetch_cycle)
+        except Exception:
+            # the cycle didn't reach recognition
+            self.end_cycle(cycle)
+            raise
+
+    def fetch_cycle(self, cycle: Cycle) -> None:
+        frame = self.fetch_frame()
+        if frame is not None:
+            # the next frame replaces the one of the fetcher while this one
+            # waits, the file is written only when the frame isn't shared
+            ext = os.path.splitext(frame.path)[1]
+            path = os.path.join(
+                self.work_dir, f"pipeline_{self.pipeline_frames % PIPELINE_FRAMES}{ext}"
+            )
+            self.pipeline_frames += 1
+            frame = replace(frame, path=path, stored=False)
+            self.frame = frame
+        cycle.frame = frame
+        self.recognise_channel.put(cycle)
+
+    def recognise_stage(self, cycle: Cycle) -> None:
+        try:
+            self.run_cycle(cycle, self.recognise_cycle)
+        finally:
+            self.end_cycle(cycle)
+
+    def recognise_cycle(self, cycle: Cycle) -> None:
+        self.rereading = cycle.reread
+        with self.publisher.batch():
+            self.process_frame(cycle.frame)
+        self.refresh_result_image()
+
+    def publish_stage(self, message: tuple[str, str, bool]) -> None:
+        self.mqtt_publish(*message)
+
+    def publish_dropped(self, dropped: list[tuple[str, str, bool]]) -> None:
+        for message in dropped:
+            self.publish_stage(message)
+
+    def send_message(self, topic: str, value: str, retain: bool) -> None:
+        if self.pipeline is not None and self.pipeline.running:
+            try:
+                self.publish_channel.put((topic, value, retain))
+                return
+            except Cancelled:
+                pass
+        self.mqtt_publish(topic, value, retain)
+
+    def create_recorder(self) -> FlightRecorder | None:
+        size = int(self.config["RECORDER_SIZE"])
+        if size <= 0:
+            return None
+        directory = self.config["RECORDER_DIR"]
+        return FlightRecorder(
+            os.path.join(directory, self.name) if self.name else directory,
+            size,
+            int(self.config["RECORDER_MAX_BYTES"]),
+            on_write=self.recorder_written,
+            on_drop=self.recorder_dropped_metric.inc,
+        )
+
+    def recorder_written(self, duration: float, size: int) -> None:
+        self.recorder_write_duration_metric.observe(duration)
+        self.recorder_bytes_metric.set(size)
+
+    def create_cropper(self, dials: list) -> RegionCropper | None:
+        if self.config["IMAGE_REGION"] != "dials":
+            return None
+        try:
+            cropper = RegionCropper(
+                dials,
+                margin=float(self.config["ROI_MARGIN"]),
+                max_size=int(self.config["ROI_MAX_SIZE"]),
+            )
+            cropper.rewrite_conf(
+                self.config["CONF_FILE"], os.path.join(self.work_dir, ROI_CONF_FILE)
+            )
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Image cropping disabled: {e}")
+            return None
+        self.logger.info("Crop images to %s, scale %.2f", cropper.box, cropper.scale)
+        return cropper
+
+    def create_plausibility_filter(self) -> PlausibilityFilter | None:
+        max_flow = float(self.config["PLAUSIBILITY_MAX_FLOW"])
+        threshold = float(self.config["PLAUSIBILITY_THRESHOLD"])
+        if max_flow <= 0 and threshold <= 0:
+            return None
+        return PlausibilityFilter(
+            max_flow,
+            threshold=threshold,
+            window=int(self.config["PLAUSIBILITY_WINDOW"]),
+            max_rejections=int(self.config["PLAUSIBILITY_MAX_REJECTIONS"]),
+        )
+
+    def create_frame_pool(self) -> FramePool | None:
+        size = int(self.config["FRAME_BUFFER_SIZE"])
+        if size <= 0 or not self.dialeye.shared_frames:
+            return None
+        # frames of a burst and the latest frame for the result image
+        slots = self.burst_size + 1
+        if self.config["UPDATE_MODE"] == "pipeline":
+            slots += PIPELINE_FRAMES
+        return FramePool(slots, size)
+
+    @property
+    def burst_workers(self) -> int:
+        return min(max(int(self.config["BURST_WORKERS"]), 1), self.burst_size)
+
+    def create_dialeye(self) -> DialEye:
+        mode = self.config["DIALEYE_MODE"]
+        self.logger.info(f"DialEye mode: {mode}")
+        cls = SubprocessDialEye if mode == "subprocess" else WorkerDialEye
+        if self.burst_workers > 1:
+            return DialEyePool(
+                [
+                    cls(self.config["DIALEYE_PYTHON"], self.config["DIALEYE"])
+                    for _ in range(self.burst_workers)
+                ]
+            )
+        return cls(self.config["DIALEYE_PYTHON"], self.config["DIALEYE"])
+
+    def init_meter(self) -> Meter:
+        meter = self.create_meter_from_file_data()
+        if meter is None:
+            m3 = int(self.config["M3_INIT_VALUE"])
+            self.logger.info(f"Initialize m3 to {m3}")
+            meter = Meter(m3=m3, m3_already_increased=False, value=float(m3))
+
+        self.logger.info(
+            "Initial values: m3=%d, m3_already_increased=%r, value=%f, time=%s",
+            meter.m3,
+            meter.m3_already_increased,
+            meter.value,
+            meter._current_value.time or None,
+        )
+        return meter
+
+    def create_meter_from_file_data(self) -> Meter | None:
+        filename = self.config["DATA_FILE"]
+        # fall back to the last good snapshot if the data file is broken
+        for filename in (filename, backup_filename(filename)):
+            if not os.path.isfile(filename):
+                self.logger.info(f"{filename} file does not exists")
+                continue
+            self.logger.info(f"Initialize data from {filename} file")
+            data = self.read_data_file(filename)
+            try:
+                return self.create_meter_from_string(data)
+            except Exception:
+                self.logger.error(f"{filename} file content is invalid")
+        return None
+
+    def create_meter_from_string(self, data: str) -> Meter:
+        return load_meter(data)
+
+    def store_data(self) -> None:
+        """Hand the meter state to the data writer, which writes it behind."""
+        m3_already_increased = self.meter.m3_already_increased
+        # rollover state is always stored immediately
+        urgent = m3_already_increased != self.stored_m3_already_increased
+        self.stored_m3_already_increased = m3_already_increased
+        self.data_writer.put(dump_meter(self.meter), urgent=urgent)
+
+    def store(self, data: str) -> None:
+        with self.stages.measure("store"):
+            self.write_data_file(self.config["DATA_FILE"], data)
+
+    def read_data_file(self, filename: str) -> str:
+        with open(filename, "r+") as file:
+            data = file.read().strip()
+        return data
+
+    def write_data_file(self, filename: str, data: str) -> None:
+        atomic_write(filename, data)
+
+    def publish_value_to_mqtt_topic(
+        self, topic: str, value: str, retain: bool, volatile: bool = False
+    ):
+        self.publisher.publish(topic, value, retain, volatile)
+
+    def publish_update_time(self) -> None:
+        self.publish_value_to_mqtt_topic(
+            "lastUpdateTime",
+            str(datetime.now().replace(microsecond=0).isoformat()),
+            True,
+            volatile=True,
+        )
+
+    def publish_consumption_values(
+        self, current_value: float, instant_consumption_l_per_min: float
+    ) -> None:
+        self.publish_value_to_mqtt_topic("value", f"{current_value:.5f}", True)
+        self.publish_value_to_mqtt_topic(
+            "consumptionLitrePerMin",
+            f"{instant_consumption_l_per_min:.2f}",
+            True,
+        )
+        self.publish_update_time()
+
+    def publish_history(self) -> None:
+        for name in self.history.windows:
+            self.publish_value_to_mqtt_topic(
+                f"litresLast{name}", f"{self.history.litres(name):.2f}", True
+            )
+        self.publish_value_to_mqtt_topic(
+            "peakFlowLitrePerMin", f"{self.history.peak_flow():.2f}", True
+        )
+        self.publish_value_to_mqtt_topic(
+            "continuousFlowSeconds",
+            f"{self.history.continuous_flow_seconds():.0f}",
+            True,
+        )
+
+    def publish_zero_consumption(self) -> None:
+        self.publish_value_to_mqtt_topic("consumptionLitrePerMin", "0.00", True)
+        self.publish_update_time()
+
+    def state(self) -> dict:
+        """Latest published values and counters, served from memory."""
+        return {
+            "meter": self.label,
+            **self.publisher.state,
+            "active": self.active,
+            **self.counts,
+        }
+
+    def broadcast_state(self, _values: dict) -> None:
+        self.broadcaster.publish(json.dumps(self.state()))
+
+    def stream(self, keepalive: float = 15) -> Response:
+        """Server-Sent Events of the state, sent as the values are published."""
+
+        def events():
+            sequence = self.broadcaster.sequence
+            message = json.dumps(self.state())
+            while not self.broadcaster.closed:
+                yield f"data: {message}\n\n" if message else ": keepalive\n\n"
+                sequence, message = self.broadcaster.wait(sequence, keepalive)
+
+        response = Response(events(), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    def result_page(self, meters: list[str]):
+        self.result_image_requested = True
+        response = make_response(
+            render_template(
+                "index.html",
+                meter=self.name,
+                meters=meters,
+                current_value_m3=self.meter.value,
+                result_image=self.result_image,
+                image_version=int(self.result_image_time or 0),
+            )
+        )
+        response.set_etag(f"{self.meter.value}-{self.result_image_time}")
+        times = [t for t in (self.last_update_time, self.result_image_time) if t]
+        if times:
+            response.last_modified = max(times)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def refresh_result_image(self) -> None:
+        """Render result image from the current frame when it's been viewed and
+        is older than RESULT_IMAGE_MAX_AGE."""
+        if self.frame is None or not self.result_image_requested:
+            return
+        max_age = float(self.config["RESULT_IMAGE_MAX_AGE"])
+        if self.result_image_time and time.time() - self.result_image_time < max_age:
+            return
+        self.result_image_requested = False
+        try:
+            self.update_image()
+        except (OSError, subprocess.SubprocessError) as e:
+            self.logger.error(f"Result image update failed: {e}")
+
+    def update_image(self) -> None:
+        # the fetch stage replaces the frame meanwhile in pipeline mode
+        frame = self.frame
+        self.hand_over(frame.path, frame.data, frame.stored)
+        with self.stages.measure("render"):
+            retval, result = self.execute_dialeye(
+                [
+                    "-f",
+                    self.config["CONF_FILE"],
+                    "-r",
+                    "-u",
+                    METER_SECTION,
+                    frame.path,
+                ],
+                timeout=self.config["TIMEOUT"],
+                cwd=self.work_dir,
+            )
+        self.logger.info("Image update result (retval=%d): %s", retval, result)
+        if retval != 0:
+            return
+
+        # replace atomically to never serve partially written image
+        image = os.path.join(self.config["WEB_STATIC_DIR"], self.result_image)
+        shutil.copyfile(os.path.join(self.work_dir, RESULT_IMAGE), image + ".tmp")
+        os.replace(image + ".tmp", image)
+        self.result_image_time = time.time()
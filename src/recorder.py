@@ -0,0 +1,138 @@
+import json
+import os
+import queue
+import re
+import tarfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable
+
+# pending records, each holding one frame
+QUEUE_SIZE = 4
+ENTRY_PATTERN = re.compile(r"_(\d{8})\.\w+$")
+
+
+class FlightRecorder:
+    """Keep the latest readings with their frames in a ring on disk.
+
+    Records are queued and written by a background thread, a record is
+    dropped when the queue is full. The oldest records are removed when
+    there are more than size records or they take more than max_bytes.
+    Frames are named by their time, so the directory can be replayed with
+    replay.py as it is.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        size: int,
+        max_bytes: int,
+        on_write: Callable[[float, int], None] = None,
+        on_drop: Callable[[], None] = None,
+    ) -> None:
+        self.directory = directory
+        self.size = size
+        self.max_bytes = max_bytes
+        self.on_write = on_write
+        self.on_drop = on_drop
+        os.makedirs(directory, exist_ok=True)
+        self.entries = self._scan()  # sequence -> (files, bytes)
+        self.bytes = sum(size for _, size in self.entries.values())
+        self.sequence = next(reversed(self.entries), 0)
+        self._evict()
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, timestamp: float, frame: bytes, ext: str, info: dict) -> bool:
+        """Queue record for writing, False if it was dropped."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="recorder", daemon=True
+            )
+            self._thread.start()
+        try:
+            self._queue.put_nowait((timestamp, frame, ext, info))
+        except queue.Full:
+            if self.on_drop:
+                self.on_drop()
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Wait until the queued records are written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def archive(self, file) -> None:
+        """Write the records in order as tar.gz to file object."""
+        with self._lock, tarfile.open(fileobj=file, mode="w:gz") as tar:
+            for files, _ in self.entries.values():
+                for path in files:
+                    tar.add(path, arcname=os.path.basename(path))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                start = time.perf_counter()
+                self._write(*item)
+                if self.on_write:
+                    self.on_write(time.perf_counter() - start, self.bytes)
+            except OSError:
+                if self.on_drop:
+                    self.on_drop()
+            finally:
+                self._queue.task_done()
+
+    def _write(self, timestamp: float, frame: bytes, ext: str, info: dict) -> None:
+        with self._lock:
+            self.sequence += 1
+            stamp = datetime.fromtimestamp(timestamp).strftime("%Y%m%dT%H%M%S")
+            base = os.path.join(self.directory, f"{stamp}_{self.sequence:08d}")
+            files = []
+            if frame is not None:
+                files.append(base + ext)
+                with open(files[-1], "wb") as file:
+                    file.write(frame)
+            files.append(base + ".json")
+            with open(files[-1], "w") as file:
+                json.dump({"sequence": self.sequence, **info}, file)
+            size = sum(os.path.getsize(path) for path in files)
+            self.entries[self.sequence] = (files, size)
+            self.bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.size or self.bytes > self.max_bytes
+        ):
+            _, (files, size) = self.entries.popitem(last=False)
+            for path in files:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.bytes -= size
+
+    def _scan(self) -> OrderedDict:
+        """Records left by the previous run."""
+        entries = {}
+        for name in os.listdir(self.directory):
+            match = ENTRY_PATTERN.search(name)
+            path = os.path.join(self.directory, name)
+            if match and os.path.isfile(path):
+                files, size = entries.setdefault(int(match.group(1)), ([], 0))
+                files.append(path)
+                entries[int(match.group(1))] = (files, size + os.path.getsize(path))
+        return OrderedDict(sorted(entries.items()))
@@ -0,0 +1,255 @@
+"""Replay archived meter images.
+
+Recognises a directory of timestamped images in parallel, runs the readings
+in timestamp order through the meter rollover logic and writes the corrected
+series as CSV and the final meter state as data file.
+
+Usage: python replay.py IMAGE_DIR [--data-file FILE] [--output FILE] [options]
+
+Image time is parsed from the file name (e.g. 20240101T120000.jpg,
+2024-01-01_12-00-00.jpg or unix time 1704103200.jpg) or taken from the file
+modification time.
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+
+from dialeye import DialEye, SubprocessDialEye, WorkerDialEye
+from dials import METER_SECTION
+from meter import Meter, dump_meter
+from storage import atomic_write
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+DATETIME_PATTERN = re.compile(
+    r"(\d{4})-?(\d{2})-?(\d{2})[T_ -]?(\d{2})[-:]?(\d{2})[-:]?(\d{2})"
+)
+UNIX_TIME_PATTERN = re.compile(r"(?<!\d)(\d{10})(?!\d)")
+
+
+def image_time(path: str) -> datetime:
+    name = os.path.basename(path)
+    match = DATETIME_PATTERN.search(name)
+    if match:
+        return datetime(*map(int, match.groups()))
+    match = UNIX_TIME_PATTERN.search(name)
+    if match:
+        return datetime.fromtimestamp(int(match.group(1)))
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def list_images(directory: str) -> list[tuple[datetime, str]]:
+    """Images in timestamp order, only the first image of the same time."""
+    images = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+            images.setdefault(image_time(path), path)
+    return sorted(images.items())
+
+
+class Recogniser:
+    """Run dialEye for images in parallel, one dialEye per pool thread."""
+
+    def __init__(
+        self,
+        python: str,
+        dialeye: str,
+        conf_file: str,
+        mode: str = "worker",
+        workers: int = None,
+        timeout: float = 30,
+    ) -> None:
+        self.python = python
+        self.dialeye = dialeye
+        self.conf_file = conf_file
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.local = threading.local()
+        self.instances = []
+        self.lock = threading.Lock()
+
+    def get_dialeye(self) -> DialEye:
+        if not hasattr(self.local, "dialeye"):
+            cls = SubprocessDialEye if self.mode == "subprocess" else WorkerDialEye
+            self.local.dialeye = cls(self.python, self.dialeye)
+            with self.lock:
+                self.instances.append(self.local.dialeye)
+        return self.local.dialeye
+
+    def recognise(self, image: str) -> float | None:
+        """Reading in litres, None if recognition failed."""
+        try:
+            retval, result = self.get_dialeye().run(
+                ["-f", self.conf_file, "-s", "-u", METER_SECTION, image],
+                timeout=self.timeout,
+            )
+            return float(result.strip()) / 10 if retval == 0 else None
+        except Exception:
+            return None
+
+    def recognise_all(self, images: list[str]) -> list[float | None]:
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return list(executor.map(self.recognise, images))
+        finally:
+            for dialeye in self.instances:
+                dialeye.close()
+
+
+@dataclass
+class Series:
+    time: np.ndarray
+    litre: np.ndarray
+    m3: np.ndarray
+    m3_already_increased: np.ndarray
+    value: list[float]
+    consumption: list[float]
+
+    def __len__(self) -> int:
+        return len(self.litre)
+
+
+def python_round(values: np.ndarray, digits: int) -> list[float]:
+    # numpy rounds scaled binary values, which differs from round() in the
+    # last digit for some values
+    return [round(value, digits) + 0.0 for value in values.tolist()]
+
+
+def replay(meter: Meter, times: list[datetime], litres: list[float]) -> Series:
+    """Apply readings to meter state as Meter.update_litre does one by one.
+
+    Rollover and consumption are calculated over the whole series. Results
+    and the final meter state are equal to the streaming updates. Times must
+    be increasing.
+    """
+    litre = np.asarray(litres, dtype=np.float64)
+    time = np.asarray(times, dtype="datetime64[us]")
+    count = len(litre)
+    if count == 0:
+        return Series(time, litre, np.empty(0, np.int64), np.empty(0, bool), [], [])
+    if count > 1 and not (np.diff(time) > np.timedelta64(0)).all():
+        raise ValueError("Times must be increasing")
+
+    # m3_already_increased follows the latest rollover (< 100 l) or reset
+    # (400 - 700 l) reading, m3 increases on every rollover while not set
+    rollover = litre < 100
+    reset = (litre >= 400) & (litre < 700)
+    index = np.arange(count)
+    last_event = np.maximum.accumulate(np.where(rollover | reset, index, -1))
+    increased = np.where(
+        last_event >= 0, rollover[last_event], meter.m3_already_increased
+    )
+    previous_increased = np.concatenate(([meter.m3_already_increased], increased[:-1]))
+    m3 = meter.m3 + np.cumsum(rollover & ~previous_increased)
+
+    current = m3 + litre / 1000
+    previous = np.empty(count)
+    previous[0] = meter._current_value.value
+    previous[1:] = python_round(current[:-1], 6)
+
+    consumption = np.full(count, meter.instant_consumption_l_per_min, np.float64)
+    first = 0 if meter._current_value.time else 1
+    if count > first:
+        previous_time = np.empty(count, dtype="datetime64[us]")
+        previous_time[1:] = time[:-1]
+        if first == 0:
+            previous_time[0] = np.datetime64(meter._current_value.time, "us")
+        seconds = (time - previous_time)[first:].astype(np.int64) / 1e6
+        consumption[first:] = (current - previous)[first:] * 1000 / seconds * 60
+
+    series = Series(
+        time=time,
+        litre=litre,
+        m3=m3,
+        m3_already_increased=increased,
+        value=python_round(current, 5),
+        consumption=python_round(consumption, 2),
+    )
+
+    # final state as left by the last update
+    current, previous = float(current[-1]), float(previous[-1])
+    if count > first:
+        meter._instant_consumption_l = round((current - previous) * 1000, 3) + 0.0
+    meter._previous_value.value = round(previous, 6)
+    meter._previous_value.time = times[-2] if count > 1 else meter._current_value.time
+    meter._current_value.value = round(current, 6)
+    meter._current_value.time = times[-1]
+    meter.m3 = int(m3[-1])
+    meter.m3_already_increased = bool(increased[-1])
+    meter.value = series.value[-1]
+    meter.instant_consumption_l_per_min = series.consumption[-1]
+    meter._litre = round(float(litre[-1]), 2)
+    return series
+
+
+def write_csv(file, series: Series) -> None:
+    writer = csv.writer(file)
+    writer.writerow(
+        ["time", "litre", "m3", "m3_already_increased", "value", "consumption"]
+    )
+    for i in range(len(series)):
+        writer.writerow(
+            [
+                series.time[i].item().isoformat(),
+                series.litre[i].item(),
+                int(series.m3[i]),
+                bool(series.m3_already_increased[i]),
+                f"{series.value[i]:.5f}",
+                f"{series.consumption[i]:.2f}",
+            ]
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", help="directory of archived images")
+    parser.add_argument("--conf-file", default="/conf/dialEye.conf")
+    parser.add_argument("--dialeye", default="/opt/dialEye/dialEye.py")
+    parser.add_argument("--dialeye-python", default="python3")
+    parser.add_argument("--mode", choices=["worker", "subprocess"], default="worker")
+    parser.add_argument("--workers", type=int, help="default: number of CPUs")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--m3-init", type=int, default=0, help="m3 before images")
+    parser.add_argument("--output", help="CSV file for the series, default stdout")
+    parser.add_argument("--data-file", help="write final meter state to file")
+    args = parser.parse_args()
+
+    images = list_images(args.images)
+    recogniser = Recogniser(
+        args.dialeye_python,
+        args.dialeye,
+        args.conf_file,
+        mode=args.mode,
+        workers=args.workers,
+        timeout=args.timeout,
+    )
+    litres = recogniser.recognise_all([path for _, path in images])
+    readings = [
+        (t, litre) for (t, _), litre in zip(images, litres) if litre is not None
+    ]
+    print(f"Recognised {len(readings)}/{len(images)} images", file=sys.stderr)
+
+    meter = Meter(m3=args.m3_init, m3_already_increased=False, value=args.m3_init)
+    series = replay(meter, [t for t, _ in readings], [litre for _, litre in readings])
+
+    if args.output:
+        with open(args.output, "w", newline="") as file:
+            write_csv(file, series)
+    else:
+        write_csv(sys.stdout, series)
+    if args.data_file:
+        atomic_write(args.data_file, dump_meter(meter))
+
+
+if __name__ == "__main__":
+    main()
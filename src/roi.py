@@ -0,0 +1,116 @@
+import io
+import math
+import re
+
+from PIL import Image
+
+from dials import DIAL_VALUE, METER_SECTION, Dial
+
+SECTION = re.compile(r"^\s*\[([^\]]+)\]")
+OPTION = re.compile(r"^(\s*([^=:\s][^=:]*?)\s*[=:]\s*)(.*)$")
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+class RegionCropper:
+    """Crop frames to the bounding box of the dials and downscale them.
+
+    The box is the dials with margin pixels around them. The cropped region
+    is downscaled so that its longer side is at most max_size pixels, 0
+    keeps the resolution. JPEG frames are decoded directly at the reduced
+    scale when downscaling.
+    """
+
+    def __init__(self, dials: list[Dial], margin: float, max_size: int = 0) -> None:
+        if not dials:
+            raise ValueError("No dials configured")
+        self.box = (
+            max(math.floor(min(dial.box[0] for dial in dials) - margin), 0),
+            max(math.floor(min(dial.box[1] for dial in dials) - margin), 0),
+            math.ceil(max(dial.box[2] for dial in dials) + margin),
+            math.ceil(max(dial.box[3] for dial in dials) + margin),
+        )
+        width, height = self.box[2] - self.box[0], self.box[3] - self.box[1]
+        longest = max(width, height)
+        self.scale = max_size / longest if 0 < max_size < longest else 1.0
+
+    def transform(self, x: float, y: float, r: float) -> tuple[float, float, float]:
+        """Frame coordinates to the coordinates of the cropped frame."""
+        return (
+            (x - self.box[0]) * self.scale,
+            (y - self.box[1]) * self.scale,
+            r * self.scale,
+        )
+
+    def crop(self, data: bytes) -> bytes:
+        """Cropped frame encoded in the format of the original frame."""
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = image.format
+            width, height = image.size
+            box = (
+                self.box[0],
+                self.box[1],
+                min(self.box[2], width),
+                min(self.box[3], height),
+            )
+            if box[0] >= box[2] or box[1] >= box[3]:
+                raise ValueError(f"Dials are outside of {width}x{height} frame")
+            if self.scale < 1:
+                image.draft(
+                    image.mode,
+                    (math.ceil(width * self.scale), math.ceil(height * self.scale)),
+                )
+            # draft may have decoded the frame at reduced scale
+            reduced = image.size[0] / width
+            region = image.crop(tuple(round(v * reduced) for v in box))
+            size = (
+                max(round((box[2] - box[0]) * self.scale), 1),
+                max(round((box[3] - box[1]) * self.scale), 1),
+            )
+            if region.size != size:
+                region = region.resize(size, Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        if image_format == "JPEG":
+            region.save(output, format="JPEG", quality=95)
+        else:
+            region.save(output, format=image_format or "PNG")
+        return output.getvalue()
+
+    def rewrite_conf(
+        self, conf_file: str, output_file: str, section: str = METER_SECTION
+    ):
+        """Write dialEye configuration with the dial coordinates transformed
+        to the cropped frame. Other lines are copied as they are."""
+        with open(conf_file, "r") as file:
+            lines = file.readlines()
+        current = None
+        for i, line in enumerate(lines):
+            match = SECTION.match(line)
+            if match:
+                current = match.group(1).strip()
+                continue
+            match = OPTION.match(line)
+            if current != section or not match:
+                continue
+            name, value = match.group(2).lower(), match.group(3)
+            values = DIAL_VALUE.match(value)
+            if "dial" in name and values:
+                lines[i] = (
+                    match.group(1)
+                    + self._transform_value(value, values)
+                    + line[match.end(3) :]
+                )
+        with open(output_file, "w") as file:
+            file.writelines(lines)
+
+    def _transform_value(self, value: str, values: re.Match) -> str:
+        numbers = self.transform(*(float(v) for v in values.groups()))
+        parts = iter(numbers)
+
+        def replace(number: re.Match) -> str:
+            new = next(parts)
+            if "." in number.group(0):
+                return f"{new:.1f}"
+            return str(round(new))
+
+        head = NUMBER.sub(replace, value[: values.end()], count=3)
+        return head + value[values.end() :]
@@ -0,0 +1,56 @@
+import threading
+from typing import Callable
+
+# seconds to wait for the running update when stopping
+STOP_TIMEOUT = 10
+
+
+class AdaptiveScheduler:
+    """Run updates quickly while the meter is active and back off when idle.
+
+    The callback returns True when the meter was active during the update.
+    The interval is then reset to the minimum, otherwise it is multiplied by
+    the backoff factor up to the maximum.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[], bool],
+        min_interval: float,
+        max_interval: float,
+        factor: float = 2.0,
+        on_interval_change: Callable[[float], None] = None,
+    ) -> None:
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.on_interval_change = on_interval_change
+        self.interval = min_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._set_interval(self.min_interval)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def next_interval(self, active: bool) -> float:
+        if active:
+            return self.min_interval
+        return min(self.interval * self.factor, self.max_interval)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._set_interval(self.next_interval(self.callback()))
+
+    def _set_interval(self, interval: float) -> None:
+        self.interval = interval
+        if self.on_interval_change:
+            self.on_interval_change(interval)
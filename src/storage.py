@@ -0,0 +1,128 @@
+import os
+import shutil
+import threading
+import time
+from typing import Callable
+
+# seconds, min delay before retrying a failed write
+RETRY_DELAY = 5
+
+
+def backup_filename(filename: str) -> str:
+    return filename + ".bak"
+
+
+def atomic_write(filename: str, data: str) -> None:
+    """Write file atomically and keep the previous version as backup.
+
+    Data is written to a temporary file, which is synced to disk before it
+    replaces the original file. The file is therefore never left truncated,
+    nor missing: the backup is a hard link to the previous version, or a
+    copy where links aren't supported, and it is also replaced atomically.
+    """
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "w") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    if os.path.isfile(filename):
+        _backup(filename)
+    os.replace(tmp_filename, filename)
+    _fsync_dir(os.path.dirname(os.path.abspath(filename)))
+
+
+def _backup(filename: str) -> None:
+    tmp_backup = backup_filename(filename) + ".tmp"
+    if os.path.lexists(tmp_backup):
+        os.remove(tmp_backup)
+    try:
+        os.link(filename, tmp_backup)
+    except OSError:
+        shutil.copyfile(filename, tmp_backup)
+    os.replace(tmp_backup, backup_filename(filename))
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DataWriter:
+    """Write-behind of the latest data to a file.
+
+    put() only replaces the pending data. A background thread writes it at
+    most every interval seconds, so the data put in between is coalesced
+    into one write, and it is written also when nothing more is put.
+    Urgent data is written right away. close() writes the pending data and
+    stops the thread. A failed write is logged and retried, unless newer
+    data is put meanwhile.
+    """
+
+    def __init__(
+        self, write: Callable[[str], None], interval: float, name: str, logger
+    ) -> None:
+        self.write = write
+        self.interval = interval
+        self.logger = logger
+        self._condition = threading.Condition()
+        self._pending = None
+        self._urgent = False
+        self._closed = False
+        self._last_write = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    def put(self, data: str, urgent: bool = False) -> None:
+        with self._condition:
+            self._pending = data
+            self._urgent = self._urgent or urgent
+            self._condition.notify()
+
+    def close(self, timeout: float = None) -> bool:
+        """Write the pending data and stop. False if it is still being
+        written after timeout."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _next(self) -> str | None:
+        """Wait until the pending data is due, None when closed."""
+        with self._condition:
+            while True:
+                if self._pending is not None:
+                    delay = self._last_write + self.interval - time.monotonic()
+                    if self._urgent or self._closed or delay <= 0:
+                        data, self._pending = self._pending, None
+                        self._urgent = False
+                        return data
+                    self._condition.wait(delay)
+                elif self._closed:
+                    return None
+                else:
+                    self._condition.wait()
+
+    def _run(self) -> None:
+        while (data := self._next()) is not None:
+            self._last_write = time.monotonic()
+            try:
+                self.write(data)
+            except Exception as e:
+                self.logger.error(f"Data file write failed: {e}")
+                with self._condition:
+                    if self._pending is None and not self._closed:
+                        self._pending = data
+                        self._last_write += max(RETRY_DELAY - self.interval, 0)
@@ -0,0 +1,179 @@
+import http.client
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+# reset parser if a part grows beyond this without a frame boundary
+MAX_PART_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class MjpegParser:
+    """Split multipart/x-mixed-replace stream to frames incrementally.
+
+    Only the part being received is buffered. Parts are delimited by
+    Content-Length when the camera sends it, otherwise by the next boundary.
+    """
+
+    def __init__(self, boundary: str) -> None:
+        self.delimiter = b"\r\n--" + boundary.removeprefix("--").encode()
+        self._buffer = bytearray()
+        self._length = None
+        self._in_body = False
+
+    def feed(self, data: bytes) -> list[bytes]:
+        self._buffer += data
+        frames = []
+        while True:
+            frame = self._body() if self._in_body else self._headers()
+            if frame is None:
+                break
+            if frame:
+                frames.append(frame)
+        if len(self._buffer) > MAX_PART_SIZE:
+            self._buffer.clear()
+            self._in_body = False
+        return frames
+
+    def _headers(self) -> bytes | None:
+        # line breaks between the parts
+        while self._buffer.startswith(b"\r\n"):
+            del self._buffer[:2]
+        end = self._buffer.find(b"\r\n\r\n")
+        if end < 0:
+            return None
+        self._length = None
+        for line in bytes(self._buffer[:end]).split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                self._length = int(value)
+        del self._buffer[: end + 4]
+        self._in_body = True
+        return b""
+
+    def _body(self) -> bytes | None:
+        if self._length is not None:
+            if len(self._buffer) < self._length:
+                return None
+            end = next_part = self._length
+        else:
+            end = self._buffer.find(self.delimiter)
+            if end < 0:
+                return None
+            next_part = end + 2
+        frame = bytes(self._buffer[:end])
+        del self._buffer[:next_part]
+        self._in_body = False
+        return frame
+
+
+class MjpegStream:
+    """Keep MJPEG stream open and the latest frame in a single slot.
+
+    The stream is read by a background thread, which reconnects with
+    backoff when the connection fails.
+    """
+
+    def __init__(
+        self, url: str, timeout: float, headers: dict = None, max_backoff: float = 30
+    ) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.max_backoff = max_backoff
+        self._parts = urlsplit(url)
+        self._condition = threading.Condition()
+        self._frame = None
+        self._frame_time = None
+        self._sequence = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._connection = None
+        self._backoff = 1.0
+        self.error = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="mjpeg", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            # unblock the reader
+            connection.close()
+        if self._thread is not None:
+            self._thread.join(self.timeout)
+            self._thread = None
+
+    def latest(self, timeout: float) -> tuple[int, bytes, float] | None:
+        """Sequence number, data and receive time of the latest frame. Waits
+        for the first frame up to timeout. A stopped stream is not restarted."""
+        if not self._stop.is_set():
+            self.start()
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame is not None, timeout)
+            if self._frame is None:
+                return None
+            return self._sequence, self._frame, self._frame_time
+
+    def _put(self, frame: bytes) -> None:
+        with self._condition:
+            self._frame = frame
+            self._frame_time = time.time()
+            self._sequence += 1
+            self._condition.notify_all()
+        # the connection works, a failure after this reconnects quickly again
+        self._backoff = 1.0
+
+    def _run(self) -> None:
+        self._backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._read_stream()
+            except (http.client.HTTPException, OSError, ValueError) as e:
+                self.error = e
+            if self._stop.wait(self._backoff):
+                break
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def _read_stream(self) -> None:
+        cls = (
+            http.client.HTTPSConnection
+            if self._parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self._connection = cls(
+            self._parts.hostname, self._parts.port, timeout=self.timeout
+        )
+        try:
+            target = self._parts.path or "/"
+            if self._parts.query:
+                target += "?" + self._parts.query
+            self._connection.request("GET", target, headers=self.headers)
+            response = self._connection.getresponse()
+            if response.status != 200:
+                raise ValueError(
+                    f"MJPEG stream failed with HTTP status {response.status}"
+                )
+            parser = MjpegParser(boundary(response.getheader("Content-Type", "")))
+            self.error = None
+            while not self._stop.is_set():
+                data = response.read1(CHUNK_SIZE)
+                if not data:
+                    raise ValueError("MJPEG stream ended")
+                for frame in parser.feed(data):
+                    self._put(frame)
+        finally:
+            self._connection.close()
+            self._connection = None
+
+
+def boundary(content_type: str) -> str:
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not content_type.startswith("multipart/") or not match:
+        raise ValueError(f"Not a MJPEG stream: {content_type}")
+    return match.group(1).strip()
@@ -0,0 +1,69 @@
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from prometheus_client import Histogram
+
+trace_id = contextvars.ContextVar("trace_id", default=None)
+stage_durations = contextvars.ContextVar("stage_durations", default=None)
+
+
+@contextmanager
+def trace():
+    """Assign new trace ID for the log lines of the update cycle."""
+    token = trace_id.set(uuid.uuid4().hex[:8])
+    try:
+        yield trace_id.get()
+    finally:
+        trace_id.reset(token)
+
+
+class TraceLogger(logging.LoggerAdapter):
+    """Prefix log messages with the trace ID of the current update cycle and
+    optional prefix, e.g. meter name."""
+
+    def __init__(self, logger, prefix: str = None) -> None:
+        super().__init__(logger, {})
+        self.prefix = prefix
+
+    def process(self, msg, kwargs):
+        if self.prefix:
+            msg = f"{self.prefix}: {msg}"
+        current = trace_id.get()
+        return (f"[{current}] {msg}" if current else msg), kwargs
+
+
+class StageTimer:
+    """Observe duration of update cycle stages to a labeled histogram. The
+    durations of the current cycle are kept in durations. They are context
+    local, so frames of overlapping cycles, e.g. in pipeline stages, don't
+    mix."""
+
+    def __init__(self, histogram: Histogram, **labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    @property
+    def durations(self) -> dict:
+        durations = stage_durations.get()
+        return self.start() if durations is None else durations
+
+    def start(self) -> dict:
+        """Start timing a new cycle in the current context."""
+        durations = {}
+        stage_durations.set(durations)
+        return durations
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, duration: float) -> None:
+        self.histogram.labels(stage=stage, **self.labels).observe(duration)
+        self.durations[stage] = duration
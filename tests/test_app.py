@@ -1,18 +1,73 @@
 from datetime import datetime, timedelta
+import io
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 import pytest
-from src.app import MyApp
+from flask import Flask
+from PIL import Image
+from src.app import MyApp, MyConfig
+from reader import MeterReader
+from dialeye import WorkerDialEye
+from frame import Frame, FrameError, FrameFetcher
+from tracing import trace_id
 from mqtt_framework.app import TriggerSource
 
 
-class TestSuccesfullCase(TestCase):
-    @patch.object(MyApp, "get_dialeye_value")
-    @patch.object(MyApp, "write_data_file")
-    @patch.object(MyApp, "read_data_file")
-    @patch.object(MyApp, "publish_consumption_values")
-    @patch.object(MyApp, "publish_zero_consumption")
+class DataFile(str):
+    """Match data file content regardless of the reading times."""
+
+    def __eq__(self, other) -> bool:
+        return other.startswith(f"v2;{self};")
+
+    __hash__ = str.__hash__
+
+
+def create_config(**kwargs) -> dict:
+    config = {k: getattr(MyConfig, k) for k in dir(MyConfig) if k.isupper()}
+    config.update(kwargs)
+    return config
+
+
+def write_data_files(app: MyApp) -> None:
+    """Have the data writers write the pending data and stop."""
+    for reader in app.readers:
+        reader.data_writer.close()
+
+
+class AppTestCase(TestCase):
+    """Work directories of the apps are created under a temporary directory,
+    which is removed after the test. dialEye is not primed, so no dialEye
+    worker is started."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp(prefix="test_app-")
+        for patcher in (
+            patch("tempfile.tempdir", self.tmp_dir),
+            patch.object(MyApp, "prime"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class TestSuccesfullCase(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
     @patch("os.path.isfile")
     def test_app(
         self,
@@ -22,6 +77,7 @@ class TestSuccesfullCase(TestCase):
         mock_read_data_file,
         mock_write_data_file,
         mock_get_dialeye_value,
+        mock_acquire_frame,
     ):
         # Mock
         mock_get_dialeye_value.return_value = (0, "5691")
@@ -29,17 +85,20 @@ class TestSuccesfullCase(TestCase):
         mock_os_path_isfile.return_value = True
 
         m = MagicMock()
-        m.get_config.return_value = {
-            "DATA_FILE": "dummy_file",
-            "M3_INIT_VALUE": "1234",
-        }
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
 
         # Execute app
         app = MyApp()
         app.init(m)
         # emulate 30 sec update interval to get instant value update
-        app.meter._current_value.time = datetime.now() - timedelta(seconds=30)
+        app.readers[0].meter._current_value.time = datetime.now() - timedelta(
+            seconds=30
+        )
         app.do_update(TriggerSource.INTERVAL)
+        write_data_files(app)
 
         # Verify
         mock_get_dialeye_value.assert_called_once()
@@ -48,15 +107,18 @@ class TestSuccesfullCase(TestCase):
         mock_publish_consumption_values.assert_called_once_with(
             5.5691, pytest.approx(4.2, 0.01)
         )
-        mock_write_data_file.assert_called_once_with("dummy_file", "5;False;5.569100")
+        mock_write_data_file.assert_called_once_with(
+            "dummy_file", DataFile("5;False;5.569100")
+        )
 
 
-class TestRollover(TestCase):
-    @patch.object(MyApp, "get_dialeye_value")
-    @patch.object(MyApp, "write_data_file")
-    @patch.object(MyApp, "read_data_file")
-    @patch.object(MyApp, "publish_consumption_values")
-    @patch.object(MyApp, "publish_zero_consumption")
+class TestRollover(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
     @patch("os.path.isfile")
     def test_app(
         self,
@@ -66,6 +128,7 @@ class TestRollover(TestCase):
         mock_read_data_file,
         mock_write_data_file,
         mock_get_dialeye_value,
+        mock_acquire_frame,
     ):
         # Mock
         mock_get_dialeye_value.return_value = (0, "00012")
@@ -75,14 +138,17 @@ class TestRollover(TestCase):
         # Execute app
         app = MyApp()
         m = MagicMock()
-        m.get_config.return_value = {
-            "DATA_FILE": "dummy_file",
-            "M3_INIT_VALUE": "1234",
-        }
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
         app.init(m)
         # emulate 30 sec update interval to get instant value update
-        app.meter._current_value.time = datetime.now() - timedelta(seconds=30)
+        app.readers[0].meter._current_value.time = datetime.now() - timedelta(
+            seconds=30
+        )
         app.do_update(TriggerSource.INTERVAL)
+        write_data_files(app)
 
         # Verify
         mock_get_dialeye_value.assert_called_once()
@@ -91,15 +157,18 @@ class TestRollover(TestCase):
         mock_publish_consumption_values.assert_called_once_with(
             6.0012, pytest.approx(4.4, 0.01)
         )
-        mock_write_data_file.assert_called_once_with("dummy_file", "6;True;6.001200")
+        mock_write_data_file.assert_called_once_with(
+            "dummy_file", DataFile("6;True;6.001200")
+        )
 
 
-class TestFailedDialEyeExecution(TestCase):
-    @patch.object(MyApp, "get_dialeye_value")
-    @patch.object(MyApp, "write_data_file")
-    @patch.object(MyApp, "read_data_file")
-    @patch.object(MyApp, "publish_consumption_values")
-    @patch.object(MyApp, "publish_zero_consumption")
+class TestFailedDialEyeExecution(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
     @patch("os.path.isfile")
     def test_app(
         self,
@@ -109,6 +178,7 @@ class TestFailedDialEyeExecution(TestCase):
         mock_read_data_file,
         mock_write_data_file,
         mock_get_dialeye_value,
+        mock_acquire_frame,
     ):
         # Mock
         mock_get_dialeye_value.return_value = (1, "")
@@ -118,10 +188,10 @@ class TestFailedDialEyeExecution(TestCase):
         # Execute app
         app = MyApp()
         m = MagicMock()
-        m.get_config.return_value = {
-            "DATA_FILE": "dummy_file",
-            "M3_INIT_VALUE": "1234",
-        }
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
         app.init(m)
         app.do_update(TriggerSource.INTERVAL)
 
@@ -133,12 +203,13 @@ class TestFailedDialEyeExecution(TestCase):
         mock_write_data_file.assert_not_called()
 
 
-class TestEmptyDataFile(TestCase):
-    @patch.object(MyApp, "get_dialeye_value")
-    @patch.object(MyApp, "write_data_file")
-    @patch.object(MyApp, "read_data_file")
-    @patch.object(MyApp, "publish_consumption_values")
-    @patch.object(MyApp, "publish_zero_consumption")
+class TestEmptyDataFile(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
     @patch("os.path.isfile")
     def test_app(
         self,
@@ -148,6 +219,7 @@ class TestEmptyDataFile(TestCase):
         mock_read_data_file,
         mock_write_data_file,
         mock_get_dialeye_value,
+        mock_acquire_frame,
     ):
         # Mock
         mock_get_dialeye_value.return_value = (0, "5678.1")
@@ -157,12 +229,13 @@ class TestEmptyDataFile(TestCase):
         # Execute app
         app = MyApp()
         m = MagicMock()
-        m.get_config.return_value = {
-            "DATA_FILE": "dummy_file",
-            "M3_INIT_VALUE": "1234",
-        }
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
         app.init(m)
         app.do_update(TriggerSource.INTERVAL)
+        write_data_files(app)
 
         # Verify
         mock_get_dialeye_value.assert_called_once()
@@ -170,5 +243,1171 @@ class TestEmptyDataFile(TestCase):
         mock_publish_zero_consumption.assert_not_called()
         mock_publish_consumption_values.assert_called_once_with(1234.56781, 0)
         mock_write_data_file.assert_called_once_with(
-            "dummy_file", "1234;False;1234.567810"
+            "dummy_file", DataFile("1234;False;1234.567810")
+        )
+
+
+class TestFailedImageFetch(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_publish_zero_consumption,
+        mock_publish_consumption_values,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_acquire_frame.return_value = None
+        mock_os_path_isfile.return_value = False
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
+        app.init(m)
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        mock_acquire_frame.assert_called_once()
+        mock_get_dialeye_value.assert_not_called()
+        mock_publish_zero_consumption.assert_called_once()
+        mock_publish_consumption_values.assert_not_called()
+        mock_write_data_file.assert_not_called()
+
+
+class TestResultPage(AppTestCase):
+    @patch.object(MeterReader, "update_image")
+    @patch.object(MeterReader, "create_meter_from_file_data")
+    def test_app(self, mock_create_meter_from_file_data, mock_update_image):
+        # Mock
+        mock_create_meter_from_file_data.return_value = None
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
+        app.init(m)
+        reader = app.readers[0]
+        reader.frame = MagicMock()
+        web = Flask(
+            __name__,
+            template_folder=os.path.join(
+                os.path.dirname(__file__), "..", "web", "templates"
+            ),
+        )
+        web.add_url_rule("/", view_func=app.result_page)
+        client = web.test_client()
+
+        # Execute app
+        reader.refresh_result_image()
+        mock_update_image.assert_not_called()
+
+        response = client.get("/")
+        etag = response.headers["ETag"]
+        assert response.status_code == 200
+        assert client.get("/", headers={"If-None-Match": etag}).status_code == 304
+
+        reader.refresh_result_image()
+        reader.result_image_time = 1.0
+        reader.refresh_result_image()
+        mock_update_image.assert_called_once()
+
+        # missing render doesn't abort the update
+        mock_update_image.side_effect = FileNotFoundError("dialeye_result.png")
+        reader.result_image_requested = True
+        reader.refresh_result_image()
+        assert mock_update_image.call_count == 2
+
+        # neither does a hanging dialEye
+        mock_update_image.side_effect = subprocess.TimeoutExpired("dialEye", 30)
+        reader.result_image_requested = True
+        reader.refresh_result_image()
+        assert mock_update_image.call_count == 3
+
+        # Verify
+        response = client.get("/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+
+class TestStateApi(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_get_dialeye_value.return_value = (0, "5691")
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", STREAM_MAX_CLIENTS=1
+        )
+        app.init(m)
+        web = Flask(__name__)
+        web.add_url_rule("/api/state", view_func=app.state_page)
+        web.add_url_rule("/api/stream", view_func=app.stream_page)
+        client = web.test_client()
+
+        # Execute app
+        app.do_update(TriggerSource.INTERVAL)
+        state = client.get("/api/state").get_json()
+        stream = client.get("/api/stream", buffered=False)
+        events = iter(stream.response)
+        first = next(events)
+        too_many = client.get("/api/stream", buffered=False)
+        mock_get_dialeye_value.return_value = (0, "5791")
+        app.do_update(TriggerSource.INTERVAL)
+        second = next(events)
+
+        # Verify
+        mock_get_dialeye_value.assert_called()
+        assert state["meter"] == "default"
+        assert state["value"] == 0.5691
+        assert state["successful"] == 1
+        assert state["errors"] == 0
+        assert stream.mimetype == "text/event-stream"
+        assert json.loads(first.decode().removeprefix("data: "))["value"] == 0.5691
+        assert json.loads(second.decode().removeprefix("data: "))["value"] == 0.5791
+        assert too_many.status_code == 503
+        app.stop()
+        assert list(events) == []
+        stream.close()
+        # the slot of a closed stream is free again
+        assert client.get("/api/stream").status_code == 200
+
+
+class TestProfiling(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_get_dialeye_value.return_value = (0, "5691")
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", PROFILE_TOKEN="secret"
+        )
+        app.init(m)
+        web = Flask(__name__)
+        web.add_url_rule("/api/profile", view_func=app.profile_page)
+        web.add_url_rule("/api/profile/cpu", view_func=app.profile_cpu_page)
+        web.add_url_rule("/api/profile/memory", view_func=app.profile_memory_page)
+        client = web.test_client()
+        auth = {"Authorization": "Bearer secret"}
+
+        # Execute app
+        assert client.get("/api/profile?cycles=2").status_code == 401
+        assert client.get("/api/profile?token=wrong").status_code == 401
+        assert client.get("/api/profile/cpu", headers=auth).status_code == 404
+        response = client.get("/api/profile?cycles=2", headers=auth)
+        assert response.get_json() == {"cycles": 2}
+        app.do_update(TriggerSource.INTERVAL)
+        assert client.get("/api/profile/cpu", headers=auth).status_code == 404
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        response = client.get("/api/profile/cpu", headers=auth)
+        assert response.status_code == 200
+        assert "attachment" in response.headers["Content-Disposition"]
+        response = client.get("/api/profile/cpu?format=text&token=secret")
+        assert "update_meter" in response.get_data(as_text=True)
+        response = client.get("/api/profile/memory", headers=auth)
+        assert response.mimetype == "text/plain"
+        assert "after 2 cycles" in response.get_data(as_text=True)
+        assert client.get("/api/profile?cycles=0", headers=auth).status_code == 400
+        app.stop()
+
+
+class TestFlightRecorder(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_get_dialeye_value.side_effect = [(0, "5691"), (0, "5600")]
+        mock_acquire_frame.return_value = Frame(b"jpeg", "/tmp/frame.jpg", 1.7e9)
+        directory = tempfile.mkdtemp()
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", RECORDER_SIZE=10, RECORDER_DIR=directory
+        )
+        app.init(m)
+        web = Flask(__name__)
+        web.add_url_rule("/api/recorder", view_func=app.recorder_page)
+        client = web.test_client()
+
+        # Execute app
+        app.do_update(TriggerSource.INTERVAL)
+        app.do_update(TriggerSource.INTERVAL)
+        app.readers[0].recorder.flush()
+        response = client.get("/api/recorder")
+
+        # Verify
+        assert response.status_code == 200
+        with tarfile.open(fileobj=io.BytesIO(response.data)) as tar:
+            names = sorted(tar.getnames())
+            records = [
+                json.load(tar.extractfile(name))
+                for name in names
+                if name.endswith(".json")
+            ]
+        assert len(names) == 4
+        assert [r["dialeye"] for r in records] == ["5691", "5600"]
+        assert [r["negative_consumption"] for r in records] == [False, True]
+        assert records[1]["meter"].startswith("v2;0;False;0.560000;")
+        assert "meter" in records[0]["stages"]
+        app.stop()
+        shutil.rmtree(directory)
+
+
+class TestImageRegion(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "execute_dialeye")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_execute_dialeye,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        directory = tempfile.mkdtemp()
+        conf_file = os.path.join(directory, "dialEye.conf")
+        with open(conf_file, "w") as file:
+            file.write("[meter]\ndial1 = 1000, 600, 50\ndial2 = 1200, 600, 50\n")
+        image = io.BytesIO()
+        Image.new("RGB", (1920, 1080), "white").save(image, "JPEG")
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_execute_dialeye.return_value = (0, "5691")
+        mock_acquire_frame.return_value = Frame(
+            image.getvalue(), os.path.join(directory, "frame.jpg"), time.time()
+        )
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt",
+            CONF_FILE=conf_file,
+            IMAGE_REGION="dials",
+            ROI_MAX_SIZE=170,
+        )
+        app.init(m)
+
+        # Execute app
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        reader = app.readers[0]
+        args = mock_execute_dialeye.call_args.args[0]
+        assert args[1] == os.path.join(reader.work_dir, "dialEye_roi.conf")
+        # -u names the conf section, the frame is passed as local file path
+        assert args[2:5] == ["-s", "-u", "meter"]
+        assert args[-1] == os.path.join(reader.work_dir, "frame_roi.jpg")
+        with open(args[1]) as file:
+            assert "dial1 = 35, 35, 25" in file.read()
+        # cropped frame is handed over in shared memory only
+        assert not os.path.exists(args[-1])
+        with Image.open(io.BytesIO(reader.shared_frames[args[-1]][0])) as cropped:
+            assert cropped.size == (170, 70)
+        m.publish_value_to_mqtt_topic.assert_any_call("value", "0.56910", True)
+        app.stop()
+        shutil.rmtree(directory)
+
+
+class TestFrameFileFallback(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_get_dialeye_value.return_value = (0, "5691")
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", FRAME_BUFFER_SIZE=4
+        )
+        app.init(m)
+        reader = app.readers[0]
+        path = os.path.join(reader.work_dir, "frame.jpg")
+        mock_acquire_frame.side_effect = [
+            Frame(b"img", path, time.time(), stored=False),
+            Frame(b"large image", path, time.time(), stored=False),
+        ]
+
+        # Execute app
+        app.do_update(TriggerSource.INTERVAL)
+        shared = os.path.exists(path)
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        assert not reader.frame_fetcher.store
+        assert not shared
+        with open(path, "rb") as file:
+            assert file.read() == b"large image"
+        app.stop()
+
+
+class TestSharedFrameFallback(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(WorkerDialEye, "run")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_run,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        def run(args, timeout, cwd=None, frame=None):
+            # dialEye that reads the image only from the file
+            if frame is not None or not os.path.exists(args[-1]):
+                return 1, "cannot identify image file"
+            return 0, "5691"
+
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_run.side_effect = run
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", FRAME_BUFFER_SIZE=1024
+        )
+        app.init(m)
+        reader = app.readers[0]
+        path = os.path.join(reader.work_dir, "frame.jpg")
+        mock_acquire_frame.side_effect = [
+            Frame(b"img", path, time.time(), stored=False),
+            Frame(b"next image", path, time.time(), stored=False),
+        ]
+
+        # Execute app
+        app.do_update(TriggerSource.INTERVAL)
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        # shared frame failed and was read from the file, then files only
+        assert [c.kwargs.get("frame") is not None for c in mock_run.call_args_list] == [
+            True,
+            False,
+            False,
+        ]
+        assert reader.counts["successful"] == 2
+        assert not reader.sharing_frames
+        with open(path, "rb") as file:
+            assert file.read() == b"next image"
+        app.stop()
+
+
+class TestPipelineMode(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        def slow_fetch():
+            time.sleep(0.2)
+            return Frame(b"jpeg", "/tmp/frame.jpg", time.time())
+
+        def slow_dialeye(image):
+            time.sleep(0.2)
+            return (0, "5691")
+
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_acquire_frame.side_effect = slow_fetch
+        mock_get_dialeye_value.side_effect = slow_dialeye
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", UPDATE_MODE="pipeline"
+        )
+        app.init(m)
+
+        # Execute app
+        start = time.monotonic()
+        for _ in range(3):
+            app.do_update(TriggerSource.INTERVAL)
+            time.sleep(0.2)
+        while mock_get_dialeye_value.call_count < 3 and time.monotonic() < start + 2:
+            time.sleep(0.01)
+        duration = time.monotonic() - start
+        time.sleep(0.1)
+        stop_start = time.monotonic()
+        app.stop()
+
+        # Verify
+        # fetch of the next frame overlaps with the recognition
+        assert duration < 1.1
+        assert time.monotonic() - stop_start < 1
+        assert mock_get_dialeye_value.call_args.args[0].startswith(
+            os.path.join(app.readers[0].work_dir, "pipeline_")
+        )
+        mock_write_data_file.assert_called_with(
+            "/data/data.txt", DataFile("0;False;0.569100")
+        )
+        m.publish_value_to_mqtt_topic.assert_any_call("value", "0.56910", True)
+
+
+class TestPipelineStageDurations(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        frames = iter(range(1, 4))
+
+        def fetch():
+            index = next(frames)
+            app.readers[0].stages.observe("fetch", index)
+            return Frame(b"%d" % index, "/tmp/frame.jpg", time.time())
+
+        def dialeye(image):
+            index = int(app.readers[0].shared_frames[image][0])
+            # next frame is fetched meanwhile
+            time.sleep(0.2)
+            app.readers[0].stages.observe("recognition", index)
+            return (0, f"569{index}")
+
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_acquire_frame.side_effect = fetch
+        mock_get_dialeye_value.side_effect = dialeye
+        directory = tempfile.mkdtemp()
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt",
+            UPDATE_MODE="pipeline",
+            RECORDER_SIZE=10,
+            RECORDER_DIR=directory,
+        )
+        app.init(m)
+        reader = app.readers[0]
+
+        # Execute app
+        for _ in range(3):
+            app.do_update(TriggerSource.INTERVAL)
+            time.sleep(0.1)
+        deadline = time.monotonic() + 2
+        while len(reader.recorder.entries) < 3 and time.monotonic() < deadline:
+            reader.recorder.flush()
+            time.sleep(0.01)
+        app.stop()
+
+        # Verify
+        records = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name)) as file:
+                    records.append(json.load(file))
+        assert [r["dialeye"] for r in records] == ["5691", "5692", "5693"]
+        for r in records:
+            index = int(r["dialeye"][-1])
+            assert r["stages"]["fetch"] == index
+            assert r["stages"]["recognition"] == index
+        shutil.rmtree(directory)
+
+
+class TestPipelineCycle(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        trace_ids = []
+
+        def fetch():
+            trace_ids.append(trace_id.get())
+            return Frame(b"jpeg", "/tmp/frame.jpg", time.time())
+
+        def dialeye(image):
+            trace_ids.append(trace_id.get())
+            time.sleep(0.2)
+            return (0, "5691")
+
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_acquire_frame.side_effect = fetch
+        mock_get_dialeye_value.side_effect = dialeye
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", UPDATE_MODE="pipeline"
+        )
+        app.init(m)
+        app.profiler.start(1)
+
+        # Execute app
+        active = app.scheduled_update()
+        app.stop()
+
+        # Verify
+        # scheduled update waits for the recognition of its frame
+        mock_get_dialeye_value.assert_called_once()
+        assert active == app.readers[0].active
+        assert len(trace_ids) == 2 and trace_ids[0] and trace_ids[0] == trace_ids[1]
+        assert app.profiler.finished
+        report = app.profiler.report()
+        assert "fetch_cycle" in report and "recognise_cycle" in report
+        samples = {
+            s.name: s.value for s in app.update_duration_metric.collect()[0].samples
+        }
+        assert samples["update_duration_seconds_count"] == 1
+        assert samples["update_duration_seconds_sum"] >= 0.2
+
+
+class TestPlausibilityFilter(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        # misread jumps 400 l forward, the re-read is right
+        mock_get_dialeye_value.side_effect = [(0, "5691"), (0, "9691"), (0, "5691")]
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt", PLAUSIBILITY_MAX_FLOW=100
+        )
+        app.init(m)
+
+        # Execute app
+        app.do_update(TriggerSource.INTERVAL)
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        reader = app.readers[0]
+        assert mock_acquire_frame.call_count == 3
+        assert reader.meter.value == 0.5691
+        assert reader.counts["rejected"] == 1
+        assert reader.counts["successful"] == 2
+        for call in mock_write_data_file.call_args_list:
+            assert ";0.969100;" not in call.args[1]
+        app.stop()
+
+
+class TestPlausibilityMaxFlow(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        # meter at 500 l, then the same misread in every read of two cycles
+        mock_get_dialeye_value.side_effect = [(0, "5000")] + [(0, "0500")] * 4
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt",
+            M3_INIT_VALUE="5",
+            PLAUSIBILITY_MAX_FLOW=30,
+            PLAUSIBILITY_MAX_REJECTIONS=1,
+        )
+        app.init(m)
+
+        # Execute app
+        for _ in range(3):
+            app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        reader = app.readers[0]
+        assert mock_get_dialeye_value.call_count == 5
+        assert reader.meter.m3 == 5
+        assert reader.meter.value == 5.5
+        assert reader.counts["rejected"] == 4
+        for call in mock_write_data_file.call_args_list:
+            assert ";6.050000;" not in call.args[1]
+        app.stop()
+
+
+class TestUnchangedFrame(AppTestCase):
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_publish_zero_consumption,
+        mock_publish_consumption_values,
+        mock_read_data_file,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_acquire_frame,
+        mock_frame_changed,
+    ):
+        # Mock
+        mock_frame_changed.return_value = False
+        mock_read_data_file.return_value = "5;True;5.567000"
+        mock_os_path_isfile.return_value = True
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
+        app.init(m)
+        # emulate 30 sec update interval to get instant value update
+        app.readers[0].meter._current_value.time = datetime.now() - timedelta(
+            seconds=30
+        )
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        mock_get_dialeye_value.assert_not_called()
+        mock_publish_zero_consumption.assert_not_called()
+        mock_publish_consumption_values.assert_called_once_with(5.567, 0)
+        mock_write_data_file.assert_not_called()
+
+
+class TestPublishEveryCycle(AppTestCase):
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_read_data_file,
+        mock_write_data_file,
+        mock_acquire_frame,
+        mock_frame_changed,
+    ):
+        # Mock
+        mock_frame_changed.return_value = False
+        mock_read_data_file.return_value = "5;True;5.567000"
+        mock_os_path_isfile.return_value = True
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
+        app.init(m)
+        app.do_update(TriggerSource.INTERVAL)
+        app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        topics = [c.args[0] for c in m.publish_value_to_mqtt_topic.call_args_list]
+        assert topics.count("lastUpdateTime") == 2
+        assert topics.count("value") == 2
+        app.stop()
+
+
+class TestAdaptivePolling(AppTestCase):
+    @patch.object(MyApp, "update")
+    @patch("os.path.isfile")
+    def test_app(self, mock_os_path_isfile, mock_update):
+        # Mock
+        mock_os_path_isfile.return_value = False
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+            ADAPTIVE_POLLING="true",
+            POLL_MIN_INTERVAL=60,
+        )
+        app.init(m)
+        app.do_update(TriggerSource.INTERVAL)
+        mock_update.assert_not_called()
+
+        app.active = True
+        assert app.scheduled_update() is True
+        app.scheduler.stop()
+
+        # Verify
+        mock_update.assert_called_once()
+
+
+class TestStopDuringScheduledUpdate(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        started = threading.Event()
+
+        def slow_recognition(image):
+            # recognition that ends only when dialEye is cancelled
+            started.set()
+            dialeye = app.readers[0].dialeye
+            deadline = time.monotonic() + 10
+            while not dialeye._cancelled and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return (-1, "")
+
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_acquire_frame.return_value = Frame(b"image", "frame.jpg", time.time())
+        mock_get_dialeye_value.side_effect = slow_recognition
+
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            ADAPTIVE_POLLING="true",
+            POLL_MIN_INTERVAL=0.01,
+        )
+        app.init(m)
+        assert started.wait(5)
+
+        # Execute app
+        start = time.monotonic()
+        app.stop()
+
+        # Verify
+        assert time.monotonic() - start < 2
+        assert app.idle.is_set()
+
+
+class TestCoalescedDataWrites(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_publish_zero_consumption,
+        mock_publish_consumption_values,
+        mock_read_data_file,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        mock_frame_changed.return_value = True
+        mock_get_dialeye_value.side_effect = [
+            (0, "5691"),
+            (0, "5692"),
+            (0, "0005"),
+            (0, "0006"),
+        ]
+        mock_read_data_file.return_value = "5;False;5.567000"
+        mock_os_path_isfile.return_value = True
+        written = threading.Event()
+        mock_write_data_file.side_effect = lambda filename, data: written.set()
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+            DATA_FLUSH_INTERVAL=3600,
+        )
+        app.init(m)
+        app.do_update(TriggerSource.INTERVAL)
+        app.do_update(TriggerSource.INTERVAL)
+        assert not written.wait(0.2)
+
+        # rollover is stored immediately, in the background
+        app.do_update(TriggerSource.INTERVAL)
+        assert written.wait(5)
+        mock_write_data_file.assert_called_once_with(
+            "dummy_file", DataFile("6;True;6.000500")
+        )
+
+        # pending data is stored on stop
+        app.do_update(TriggerSource.INTERVAL)
+        app.stop()
+
+        # Verify
+        mock_write_data_file.assert_called_with(
+            "dummy_file", DataFile("6;True;6.000600")
+        )
+        assert mock_write_data_file.call_count == 2
+
+
+class TestBrokenDataFile(AppTestCase):
+    @patch.object(MeterReader, "read_data_file")
+    @patch("os.path.isfile")
+    def test_app(self, mock_os_path_isfile, mock_read_data_file):
+        # Mock
+        mock_read_data_file.side_effect = ["5;True;", "5;True;5.567000"]
+        mock_os_path_isfile.return_value = True
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="1234",
+        )
+        app.init(m)
+
+        # Verify
+        mock_read_data_file.assert_called_with("dummy_file.bak")
+        assert app.readers[0].meter.m3 == 5
+        assert app.readers[0].meter.m3_already_increased is True
+        assert app.readers[0].meter.value == 5.567
+
+
+class TestMultipleMeters(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_frame_changed,
+        mock_acquire_frame,
+    ):
+        # Mock
+        def slow_dialeye(image):
+            time.sleep(0.5)
+            return (0, "5691")
+
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_get_dialeye_value.side_effect = slow_dialeye
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="/data/data.txt",
+            METERS='{"water": {"M3_INIT_VALUE": 5}, '
+            '"gas": {"DATA_FILE": "/data/gas.txt"}, "hot": {}}',
+        )
+        app.init(m)
+        start = time.monotonic()
+        app.do_update(TriggerSource.INTERVAL)
+        duration = time.monotonic() - start
+        app.executor.shutdown()
+        write_data_files(app)
+
+        # Verify
+        assert [reader.name for reader in app.readers] == ["water", "gas", "hot"]
+        assert mock_get_dialeye_value.call_count == 3
+        # readings run concurrently
+        assert duration < 1.0
+        mock_write_data_file.assert_any_call(
+            "/data/data_water.txt", DataFile("5;False;5.569100")
+        )
+        mock_write_data_file.assert_any_call(
+            "/data/gas.txt", DataFile("0;False;0.569100")
+        )
+        mock_write_data_file.assert_any_call(
+            "/data/data_hot.txt", DataFile("0;False;0.569100")
+        )
+        m.publish_value_to_mqtt_topic.assert_any_call("water/value", "5.56910", True)
+        m.publish_value_to_mqtt_topic.assert_any_call("gas/value", "0.56910", True)
+
+
+class TestBurstMode(AppTestCase):
+    @patch.object(MeterReader, "frame_changed")
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch.object(MeterReader, "publish_zero_consumption")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_publish_zero_consumption,
+        mock_publish_consumption_values,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_acquire_frame,
+        mock_frame_changed,
+    ):
+        # Mock
+        readings = {b"1": (0, "5691"), b"2": (0, "9691"), b"3": (0, "5691")}
+
+        def dialeye(image):
+            return readings[app.readers[0].shared_frames[image][0]]
+
+        mock_os_path_isfile.return_value = False
+        mock_frame_changed.return_value = True
+        mock_acquire_frame.side_effect = [
+            Frame(data=data, path="frame.jpg", time=0) for data in readings
+        ]
+        mock_get_dialeye_value.side_effect = dialeye
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            M3_INIT_VALUE="5",
+            BURST_SIZE=3,
+            BURST_INTERVAL=0,
+        )
+        app.init(m)
+        app.do_update(TriggerSource.INTERVAL)
+        app.stop()
+
+        # Verify
+        assert mock_acquire_frame.call_count == 3
+        assert mock_get_dialeye_value.call_count == 3
+        mock_publish_zero_consumption.assert_called_once()  # on stop
+        mock_publish_consumption_values.assert_called_once_with(5.5691, 0)
+        mock_write_data_file.assert_called_once_with(
+            "dummy_file", DataFile("5;False;5.569100")
+        )
+
+
+class TestCameraCircuitBreaker(AppTestCase):
+    @patch.object(FrameFetcher, "fetch")
+    @patch.object(FrameFetcher, "probe")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "publish_zero_consumption")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_publish_zero_consumption,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_probe,
+        mock_fetch,
+    ):
+        # Mock
+        mock_os_path_isfile.return_value = False
+        mock_fetch.side_effect = FrameError("Connection refused")
+        mock_probe.return_value = False
+
+        # Execute app
+        app = MyApp()
+        m = MagicMock()
+        m.get_config.return_value = create_config(
+            DATA_FILE="dummy_file",
+            CAMERA_FAILURE_THRESHOLD=3,
+        )
+        app.init(m)
+        breaker = app.readers[0].camera_breaker
+        for _ in range(3):
+            assert app.do_healthy_check()
+            app.do_update(TriggerSource.INTERVAL)
+
+        # Verify
+        assert mock_fetch.call_count == 3
+        assert not app.do_healthy_check()
+
+        # open circuit skips fetch
+        app.do_update(TriggerSource.INTERVAL)
+        assert mock_fetch.call_count == 3
+        mock_probe.assert_not_called()
+
+        # failed probe after backoff doubles delay
+        breaker.retry_time = 0
+        app.do_update(TriggerSource.INTERVAL)
+        mock_probe.assert_called_once()
+        assert mock_fetch.call_count == 3
+        assert breaker.delay == 60
+
+        # successful probe and fetch close circuit
+        breaker.retry_time = 0
+        mock_probe.return_value = True
+        mock_fetch.side_effect = None
+        mock_fetch.return_value = Frame(data=b"image", path="frame.jpg", time=0)
+        mock_get_dialeye_value.return_value = (0, "5691")
+        app.do_update(TriggerSource.INTERVAL)
+        assert mock_fetch.call_count == 4
+        assert app.do_healthy_check()
+        mock_get_dialeye_value.assert_called_once()
+        assert mock_publish_zero_consumption.call_count == 5
+        app.stop()
+        mock_write_data_file.assert_called_once()
+
+
+class TestWarmStart(AppTestCase):
+    @patch.object(MeterReader, "acquire_frame")
+    @patch.object(MeterReader, "get_dialeye_value")
+    @patch.object(MeterReader, "write_data_file")
+    @patch.object(MeterReader, "read_data_file")
+    @patch.object(MeterReader, "publish_consumption_values")
+    @patch("os.path.isfile")
+    def test_app(
+        self,
+        mock_os_path_isfile,
+        mock_publish_consumption_values,
+        mock_read_data_file,
+        mock_write_data_file,
+        mock_get_dialeye_value,
+        mock_acquire_frame,
+    ):
+        # Mock
+        last_reading = datetime.now() - timedelta(seconds=30)
+        mock_get_dialeye_value.return_value = (0, "5691")
+        mock_read_data_file.return_value = (
+            f"v2;5;True;5.567000;{last_reading.isoformat()};5.566000;"
+            f"{(last_reading - timedelta(seconds=30)).isoformat()}"
+        )
+        mock_os_path_isfile.return_value = True
+
+        m = MagicMock()
+        m.get_config.return_value = create_config(DATA_FILE="dummy_file")
+
+        # Execute app
+        app = MyApp()
+        app.init(m)
+        app.do_update(TriggerSource.INTERVAL)
+        write_data_files(app)
+
+        # Verify
+        # first reading after restart gives consumption
+        mock_publish_consumption_values.assert_called_once_with(
+            5.5691, pytest.approx(4.2, 0.01)
         )
+        data = mock_write_data_file.call_args.args[1]
+        assert data.startswith("v2;5;False;5.569100;")
+        assert data.split(";")[5:] == ["5.567000", last_reading.isoformat()]
@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock, patch
+
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@patch("time.monotonic")
+def test_open_after_threshold_and_backoff(mock_monotonic):
+    on_state_change = MagicMock()
+    breaker = CircuitBreaker(
+        threshold=3, backoff=10, max_backoff=30, on_state_change=on_state_change
+    )
+    mock_monotonic.return_value = 100
+
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    # half open after backoff, failure doubles the delay
+    mock_monotonic.return_value = 110
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.delay == 20
+    mock_monotonic.return_value = 129
+    assert not breaker.allow()
+
+    mock_monotonic.return_value = 130
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.delay == 30  # max backoff
+
+    mock_monotonic.return_value = 160
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.delay == 10
+    assert [c.args[0] for c in on_state_change.call_args_list] == [
+        OPEN,
+        HALF_OPEN,
+        OPEN,
+        HALF_OPEN,
+        OPEN,
+        HALF_OPEN,
+        CLOSED,
+    ]
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker(threshold=2, backoff=10, max_backoff=30)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_threshold_zero_never_opens():
+    breaker = CircuitBreaker(threshold=0, backoff=10, max_backoff=30)
+
+    for _ in range(10):
+        breaker.record_failure()
+
+    assert breaker.allow()
@@ -0,0 +1,42 @@
+import threading
+
+from broadcast import Broadcaster
+
+
+def test_wait_returns_latest_message():
+    broadcaster = Broadcaster()
+    broadcaster.publish("a")
+    broadcaster.publish("b")
+
+    assert broadcaster.wait(0, timeout=1) == (2, "b")
+    assert broadcaster.wait(2, timeout=0.01) == (2, None)
+
+
+def test_waiting_clients_are_woken():
+    broadcaster = Broadcaster()
+    results = []
+    clients = [
+        threading.Thread(target=lambda: results.append(broadcaster.wait(0, 5)))
+        for _ in range(10)
+    ]
+    for client in clients:
+        client.start()
+
+    broadcaster.publish("value")
+    for client in clients:
+        client.join()
+
+    assert results == [(1, "value")] * 10
+
+
+def test_close_wakes_clients():
+    broadcaster = Broadcaster()
+    result = []
+    client = threading.Thread(target=lambda: result.append(broadcaster.wait(0, 5)))
+    client.start()
+
+    broadcaster.close()
+    client.join(1)
+
+    assert result == [(0, None)]
+    assert broadcaster.closed
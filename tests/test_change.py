@@ -0,0 +1,71 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from change import ChangeDetector
+from dials import Dial, read_dials
+from frame import Frame
+
+DIALS = [Dial("dial1", 100, 100, 40), Dial("dial2", 300, 100, 40)]
+
+
+def create_frame(angle: int, changed: bool = True) -> Frame:
+    image = Image.new("RGB", (400, 200), "white")
+    draw = ImageDraw.Draw(image)
+    for dial in DIALS:
+        draw.ellipse(dial.box, outline="black", width=3)
+    draw.pieslice(DIALS[1].box, angle, angle + 20, fill="red")
+    data = io.BytesIO()
+    image.save(data, "JPEG")
+    return Frame(data=data.getvalue(), path="frame.jpg", time=0, changed=changed)
+
+
+def test_read_dials(tmp_path):
+    conf = tmp_path / "dialEye.conf"
+    conf.write_text(
+        "[meter]\n"
+        "dials = 2\n"
+        "dial1 = 100, 100, 40\n"
+        "dial2 = 300 100 40 ; comment\n"
+        "[other]\n"
+        "dial1 = 1, 2, 3\n"
+    )
+    assert read_dials(str(conf)) == DIALS
+    assert read_dials(str(tmp_path / "missing.conf")) == []
+
+
+def test_skip_unchanged_frames():
+    detector = ChangeDetector(DIALS, threshold=2.0, max_skips=10)
+
+    assert detector.changed(create_frame(0)) is True
+    detector.commit()
+    assert detector.changed(create_frame(0, changed=False)) is False
+    assert detector.changed(create_frame(0)) is False
+    assert detector.changed(create_frame(90)) is True
+    detector.commit()
+    assert detector.changed(create_frame(90)) is False
+
+
+def test_no_reference_without_successful_recognition():
+    detector = ChangeDetector(DIALS, threshold=2.0, max_skips=10)
+
+    assert detector.changed(create_frame(0)) is True
+    assert detector.changed(create_frame(0)) is True
+
+
+def test_max_skips():
+    detector = ChangeDetector([], threshold=2.0, max_skips=2)
+
+    assert detector.changed(create_frame(0)) is True
+    detector.commit()
+    assert detector.changed(create_frame(0)) is False
+    assert detector.changed(create_frame(0)) is False
+    assert detector.changed(create_frame(0)) is True
+
+
+def test_disabled():
+    detector = ChangeDetector(DIALS, threshold=0, max_skips=10)
+
+    assert detector.changed(create_frame(0)) is True
+    detector.commit()
+    assert detector.changed(create_frame(0)) is True
@@ -0,0 +1,25 @@
+import pytest
+
+from consensus import vote
+
+
+def test_majority():
+    consensus = vote([567.8, 567.8, 967.8, 567.9, None], tolerance=1.0)
+
+    assert consensus.value == 567.8
+    assert consensus.confidence == pytest.approx(0.6)
+    assert consensus.readings == 4
+
+
+def test_median_without_majority():
+    consensus = vote([567.8, 567.9, 568.0, 100.0, 900.0], tolerance=1.0)
+
+    assert consensus.value == 567.9
+    assert consensus.confidence == pytest.approx(0.6)
+
+
+def test_all_failed():
+    consensus = vote([None, None, None], tolerance=1.0)
+
+    assert consensus.value is None
+    assert consensus.confidence == 0.0
@@ -0,0 +1,134 @@
+import subprocess  # nosec
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from dialeye import DialEyePool, SubprocessDialEye, WorkerDialEye
+from framepool import FramePool
+
+DIALEYE_STUB = """
+import sys
+import time
+
+if __name__ == "__main__":
+    if sys.argv[-1] == "crash":
+        import os
+        os._exit(3)
+    if sys.argv[-1] == "hang":
+        time.sleep(10)
+    if sys.argv[-1] == "slow":
+        time.sleep(0.5)
+    if sys.argv[-1] == "fail":
+        sys.exit(2)
+    print("5678.1")
+"""
+
+
+IMAGE_SIZE_STUB = """
+import sys
+from PIL import Image
+
+if __name__ == "__main__":
+    print(Image.open(sys.argv[-1]).size)
+"""
+
+
+@pytest.fixture
+def stub(tmp_path):
+    path = tmp_path / "dialEye.py"
+    path.write_text(DIALEYE_STUB)
+    return str(path)
+
+
+@pytest.fixture
+def worker(stub):
+    dialeye = WorkerDialEye(sys.executable, stub)
+    yield dialeye
+    dialeye.close()
+
+
+def test_subprocess_mode(stub):
+    dialeye = SubprocessDialEye(sys.executable, stub)
+    assert dialeye.run(["-s", "image.jpg"], timeout=5) == (0, "5678.1\n")
+    assert dialeye.run(["fail"], timeout=5) == (2, "")
+
+
+def test_worker_mode(worker):
+    assert worker.run(["-s", "image.jpg"], timeout=5) == (0, "5678.1\n")
+    pid = worker.pid
+    assert worker.run(["-s", "image.jpg"], timeout=5) == (0, "5678.1\n")
+    assert worker.run(["fail"], timeout=5) == (2, "")
+    assert worker.pid == pid
+
+
+def test_worker_restart_on_crash(worker):
+    assert worker.run(["crash"], timeout=5) == (3, "")
+    assert worker.pid is None
+    assert worker.run(["-s", "image.jpg"], timeout=5) == (0, "5678.1\n")
+
+
+def test_worker_timeout(worker):
+    with pytest.raises(subprocess.TimeoutExpired):
+        worker.run(["hang"], timeout=0.5)
+    assert worker.pid is None
+    assert worker.run(["-s", "image.jpg"], timeout=5) == (0, "5678.1\n")
+
+
+def test_worker_cancel(worker):
+    assert worker.start(timeout=5)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(worker.run, ["hang"], timeout=10)
+        time.sleep(0.2)
+        start = time.monotonic()
+        worker.cancel()
+        retval, _ = future.result()
+
+    assert retval != 0
+    assert time.monotonic() - start < 2
+    # no new worker is started once cancelled
+    assert worker.run(["-s", "image.jpg"], timeout=5) == (-1, "")
+    assert worker.pid is None
+
+
+def test_pool_runs_commands_concurrently(stub):
+    pool = DialEyePool([WorkerDialEye(sys.executable, stub) for _ in range(3)])
+    try:
+        # start workers
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            list(executor.map(lambda _: pool.run(["warm"], timeout=5), range(3)))
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(
+                executor.map(lambda _: pool.run(["slow"], timeout=5), range(3))
+            )
+        duration = time.monotonic() - start
+    finally:
+        pool.close()
+
+    assert results == [(0, "5678.1\n")] * 3
+    assert duration < 1.0
+    assert all(instance.pid is None for instance in pool.instances)
+
+
+def test_worker_reads_shared_frame(tmp_path):
+    path = tmp_path / "dialEye.py"
+    path.write_text(IMAGE_SIZE_STUB)
+    image = BytesIO()
+    Image.new("RGB", (64, 48)).save(image, "PNG")
+    pool = FramePool(slots=1, slot_size=1024 * 1024)
+    worker = WorkerDialEye(sys.executable, str(path))
+    try:
+        frame = pool.put(image.getvalue())
+        # the frame file doesn't exist, image is read from shared memory
+        image_path = str(tmp_path / "frame.png")
+        assert worker.run([image_path], timeout=5, frame=frame) == (0, "(64, 48)\n")
+        assert worker.peak_rss > 0
+        assert worker.run([image_path], timeout=5)[0] != 0
+    finally:
+        worker.close()
+        pool.close()
@@ -0,0 +1,147 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from frame import FrameError, FrameFetcher
+
+IMAGE = b"\xff\xd8 jpeg image \xff\xd9"
+
+
+class CameraHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    image = IMAGE
+    requests = []
+    connections = set()
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+        self.connections.add(self.client_address)
+        if self.path != "/image.jpg":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"%d"' % hash(self.image)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(self.image)))
+        self.end_headers()
+        self.wfile.write(self.image)
+
+    def do_HEAD(self):
+        self.requests.append({"method": "HEAD", **self.headers})
+        self.send_response(200 if self.path == "/image.jpg" else 404)
+        self.send_header("Content-Length", str(len(self.image)))
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def camera():
+    CameraHandler.image = IMAGE
+    CameraHandler.requests = []
+    CameraHandler.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CameraHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_conditional_get_over_kept_alive_connection(camera, tmp_path):
+    fetcher = FrameFetcher(f"{camera}/image.jpg", str(tmp_path / "frame"), 5)
+
+    frame = fetcher.fetch()
+    assert frame.changed is True
+    assert frame.data == IMAGE
+    assert frame.path == str(tmp_path / "frame.jpg")
+    assert (tmp_path / "frame.jpg").read_bytes() == IMAGE
+
+    frame = fetcher.fetch()
+    assert frame.changed is False
+    assert frame.data == IMAGE
+    assert "If-None-Match" in CameraHandler.requests[-1]
+
+    CameraHandler.image = b"new image"
+    frame = fetcher.fetch()
+    assert frame.changed is True
+    assert (tmp_path / "frame.jpg").read_bytes() == b"new image"
+
+    assert len(CameraHandler.requests) == 3
+    assert len(CameraHandler.connections) == 1
+    fetcher.close()
+
+
+def test_concurrent_fetches_share_connection(camera, tmp_path):
+    fetcher = FrameFetcher(f"{camera}/image.jpg", str(tmp_path / "frame"), 5)
+    frames = []
+    errors = []
+
+    def fetch():
+        try:
+            for _ in range(10):
+                frames.append(fetcher.fetch())
+        except FrameError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(frame.data == IMAGE for frame in frames)
+    assert len(CameraHandler.connections) == 1
+    fetcher.close()
+
+
+def test_frame_not_stored(camera, tmp_path):
+    fetcher = FrameFetcher(
+        f"{camera}/image.jpg", str(tmp_path / "frame"), 5, store=False
+    )
+
+    frame = fetcher.fetch()
+    assert frame.data == IMAGE
+    assert frame.stored is False
+    assert not (tmp_path / "frame.jpg").exists()
+    fetcher.close()
+
+
+def test_http_error(camera, tmp_path):
+    fetcher = FrameFetcher(f"{camera}/missing.jpg", str(tmp_path / "frame"), 5)
+    with pytest.raises(FrameError):
+        fetcher.fetch()
+
+
+def test_local_file(tmp_path):
+    image = tmp_path / "image.jpg"
+    image.write_bytes(IMAGE)
+    fetcher = FrameFetcher(str(image), str(tmp_path / "frame"), 5)
+
+    assert fetcher.fetch().path == str(image)
+    assert fetcher.fetch().changed is False
+    image.write_bytes(b"new image")
+    assert fetcher.fetch().changed is True
+
+
+def test_probe(camera, tmp_path):
+    fetcher = FrameFetcher(f"{camera}/image.jpg", str(tmp_path / "frame"), 5)
+    assert fetcher.probe(timeout=1) is True
+    assert CameraHandler.requests[-1]["method"] == "HEAD"
+
+    fetcher = FrameFetcher(f"{camera}/missing.jpg", str(tmp_path / "frame"), 5)
+    assert fetcher.probe(timeout=1) is False
+
+    fetcher = FrameFetcher("http://127.0.0.1:1/image.jpg", str(tmp_path / "frame"), 5)
+    assert fetcher.probe(timeout=1) is False
+
+    fetcher = FrameFetcher(str(tmp_path / "missing.jpg"), str(tmp_path / "frame"), 5)
+    assert fetcher.probe(timeout=1) is False
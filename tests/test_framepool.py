@@ -0,0 +1,19 @@
+from framepool import FramePool
+
+
+def test_buffers_are_recycled():
+    pool = FramePool(slots=2, slot_size=16)
+    try:
+        first = pool.put(b"frame 1")
+        second = pool.put(b"frame 2")
+        assert first.name != second.name
+        assert pool.put(b"frame 3") is None  # all in use
+
+        pool.release(first)
+        third = pool.put(b"frame 3")
+        assert third.name == first.name
+        assert third.generation > second.generation
+        assert third.size == 7
+        assert pool.put(b"too large for a buffer") is None
+    finally:
+        pool.close()
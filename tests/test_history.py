@@ -0,0 +1,53 @@
+import pytest
+
+from history import History
+
+
+def test_windowed_litres():
+    history = History(capacity=100, windows={"1min": 60, "5min": 300})
+
+    assert history.litres("1min") == 0
+    for i in range(11):
+        # 1 litre every 30 seconds
+        history.add(1000 + i * 30, 5.0 + i * 0.001, 2.0)
+
+    assert len(history) == 11
+    assert history.litres("1min") == pytest.approx(2.0)
+    assert history.litres("5min") == pytest.approx(10.0)
+
+
+def test_peak_flow_and_continuous_flow():
+    history = History(capacity=100, windows={"1min": 60, "5min": 300})
+
+    history.add(0, 5.0, 0.0)
+    history.add(30, 5.001, 2.0)
+    history.add(60, 5.006, 10.0)
+    history.add(90, 5.008, 4.0)
+    assert history.peak_flow() == 10.0
+    assert history.continuous_flow_seconds() == 90
+
+    history.add(120, 5.008, 0.0)
+    assert history.continuous_flow_seconds() == 0
+    assert history.peak_flow() == 10.0
+
+    # peak flow drops out of the longest window
+    history.add(400, 5.008, 0.0)
+    assert history.peak_flow() == 0.0
+
+
+def test_bounded_capacity():
+    history = History(capacity=4, windows={"1h": 3600})
+
+    for i in range(10):
+        history.add(i * 10, 1.0 + i * 0.001, 6.0 + i)
+
+    assert len(history) == 4
+    # oldest retained reading is the base when the buffer is too short
+    assert history.litres("1h") == pytest.approx(3.0)
+    assert history.peak_flow() == 15.0
+    assert history.summary() == {
+        "readings": 4,
+        "litres": {"1h": 3.0},
+        "peakFlowLitrePerMin": 15.0,
+        "continuousFlowSeconds": 90,
+    }
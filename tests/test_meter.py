@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 import pytest
 
-from meter import Meter
+from meter import Meter, dump_meter, load_meter
 
 
 def test_normal_flow():
@@ -76,3 +76,76 @@ def test_back_flow():
     assert meter.m3_already_increased is False
     assert meter.value == 1234.1231
     assert meter.instant_consumption_l_per_min == pytest.approx(1.7, 0.01)
+
+
+def test_unchanged():
+    meter = Meter(m3=1234, m3_already_increased=False, value=1234.123)
+
+    meter.update_litre(125.0)
+    # emulate 60 sec update interval to get instant value update
+    meter._current_value.time = datetime.now() - timedelta(seconds=60)
+
+    meter.update_unchanged()
+    assert meter.m3 == 1234
+    assert meter.value == 1234.125
+    assert meter.instant_consumption_l_per_min == 0
+
+
+def test_unchanged_after_restart():
+    meter = Meter(m3=1234, m3_already_increased=True, value=1234.123)
+
+    meter.update_unchanged()
+    assert meter.m3 == 1234
+    assert meter.m3_already_increased is True
+    assert meter.value == 1234.123
+
+
+def test_dump_and_load():
+    meter = Meter(m3=5, m3_already_increased=True, value=5.0123)
+    meter.update_litre(12.5, datetime(2024, 1, 1, 12, 0, 0))
+    meter.update_litre(14.5, datetime(2024, 1, 1, 12, 0, 30, 500))
+
+    data = dump_meter(meter)
+    assert data == (
+        "v2;5;True;5.014500;2024-01-01T12:00:30.000500;5.012500;2024-01-01T12:00:00"
+    )
+
+    restored = load_meter(data)
+    assert restored.m3 == 5
+    assert restored.m3_already_increased is True
+    assert restored.value == 5.0145
+    assert restored._current_value.time == datetime(2024, 1, 1, 12, 0, 30, 500)
+    assert restored._previous_value.value == 5.0125
+
+    restored.update_litre(15.5, datetime(2024, 1, 1, 12, 1, 30, 500))
+    assert restored.instant_consumption_l_per_min == pytest.approx(1.0)
+
+
+def test_load_unversioned():
+    meter = load_meter("5;False;5.567000")
+
+    assert meter.m3 == 5
+    assert meter.m3_already_increased is False
+    assert meter.value == 5.567
+    assert meter._current_value.time == 0
+
+    with pytest.raises(ValueError):
+        load_meter("5;None;5.567000")
+    with pytest.raises(ValueError):
+        load_meter("v2;5;False;6.567000;;0.000000;")
+
+
+def test_peek_litre():
+    meter = Meter(m3=1234, m3_already_increased=False, value=1234.950)
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    meter.update_litre(950.0, now)
+
+    peeked = meter.peek_litre(50.0, now + timedelta(minutes=1))
+
+    assert peeked.m3 == 1235
+    assert peeked.value == 1235.050
+    assert peeked.instant_consumption_l_per_min == 100
+    assert (
+        dump_meter(meter)
+        == "v2;1234;False;1234.950000;2024-01-01T12:00:00;1234.950000;"
+    )
@@ -0,0 +1,95 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from pipeline import Cancelled, Channel, Pipeline
+
+
+def test_channel_backpressure():
+    channel = Channel(1)
+    channel.put(1)
+    assert not channel.offer(2)
+
+    put = threading.Thread(target=channel.put, args=(3,))
+    put.start()
+    time.sleep(0.05)
+    assert put.is_alive()
+    assert channel.get() == 1
+    put.join(1)
+
+    assert channel.get() == 3
+
+
+def test_closed_channel_cancels_waiting_put():
+    channel = Channel(1)
+    channel.put(1)
+    errors = []
+
+    def put():
+        try:
+            channel.put(2)
+        except Cancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=put)
+    thread.start()
+    time.sleep(0.05)
+
+    assert channel.close() == [1]
+    thread.join(1)
+    assert len(errors) == 1
+    assert not channel.offer(3)
+    with pytest.raises(Cancelled):
+        channel.get()
+
+
+def test_stages_overlap():
+    pipeline = Pipeline("test", MagicMock())
+    results = []
+    done = threading.Event()
+
+    def first(item):
+        time.sleep(0.1)
+        second.put(item * 2)
+
+    def last(item):
+        time.sleep(0.1)
+        results.append(item)
+        if len(results) == 4:
+            done.set()
+
+    inputs = pipeline.add_stage("first", first, maxsize=4)
+    second = pipeline.add_stage("second", last)
+    pipeline.start()
+    start = time.monotonic()
+    for i in range(4):
+        inputs.put(i)
+    done.wait(2)
+    duration = time.monotonic() - start
+    pipeline.join(1)
+
+    assert results == [0, 2, 4, 6]
+    # 4 items through two 0.1 s stages
+    assert duration < 0.7
+
+
+def test_cancel_hands_dropped_items_to_stage():
+    pipeline = Pipeline("test", MagicMock())
+    release = threading.Event()
+    dropped = []
+    channel = pipeline.add_stage(
+        "slow", lambda item: release.wait(1), maxsize=3, on_cancel=dropped.extend
+    )
+    pipeline.start()
+    for i in range(3):
+        channel.put(i)
+    time.sleep(0.05)
+
+    pipeline.cancel()
+    assert not pipeline.running
+    release.set()
+
+    assert pipeline.join(1)
+    assert dropped == [1, 2]
@@ -0,0 +1,59 @@
+from plausibility import MIN_SAMPLES, PlausibilityFilter
+
+
+def test_max_flow():
+    plausibility = PlausibilityFilter(max_flow=60, max_rejections=3)
+
+    assert plausibility.check(10) is None
+    assert plausibility.check(61) == "max_flow"
+    assert plausibility.check(-100) == "max_flow"
+    assert plausibility.check(20) is None
+    assert plausibility.median == 15
+
+
+def test_max_flow_never_accepted():
+    plausibility = PlausibilityFilter(max_flow=60, max_rejections=2)
+
+    for _ in range(5):
+        assert plausibility.check(100) == "max_flow"
+    assert plausibility.median is None
+
+
+def test_outlier_accepted_when_confirmed():
+    plausibility = PlausibilityFilter(max_flow=0, threshold=5, max_rejections=2)
+    for flow in [0] * MIN_SAMPLES:
+        plausibility.add(flow)
+
+    # misreads that don't agree are never accepted
+    assert plausibility.check(550) == "outlier"
+    assert plausibility.check(275) == "outlier"
+    assert plausibility.check(183) == "outlier"
+    # a real change of the flow is, after two previous cycles
+    assert plausibility.check(15) == "outlier"
+    assert plausibility.check(15, reread=True) == "outlier"
+    assert plausibility.check(16) == "outlier"
+    assert plausibility.check(15) is None
+    assert plausibility.check(14) is None
+    # plausible flow ends the run
+    assert plausibility.check(0) is None
+    assert plausibility.rejections == 0
+
+
+def test_outlier():
+    plausibility = PlausibilityFilter(max_flow=0, threshold=5, window=10)
+    for flow in [10, 11, 9, 10, 12, 10][:MIN_SAMPLES]:
+        assert plausibility.check(flow) is None
+
+    assert plausibility.check(14) is None
+    assert plausibility.check(40) == "outlier"
+    assert plausibility.check(0) == "outlier"
+
+
+def test_window_is_rolling():
+    plausibility = PlausibilityFilter(max_flow=0, threshold=5, window=5)
+    for flow in [0] * 5 + [20] * 5:
+        plausibility.add(flow)
+
+    assert plausibility.median == 20
+    assert plausibility.check(20) is None
+    assert plausibility.check(0) == "outlier"
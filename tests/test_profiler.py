@@ -0,0 +1,105 @@
+import cProfile
+import pstats
+import threading
+import tracemalloc
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from profiler import CycleProfiler
+
+
+def allocate():
+    return [bytearray(1024) for _ in range(100)]
+
+
+def test_idle_profiler_hooks_nothing():
+    profiler = CycleProfiler()
+
+    with profiler.cycle():
+        assert not profiler.active
+        assert not tracemalloc.is_tracing()
+
+    assert profiler.stats() is None
+    assert profiler.top_allocations() is None
+
+
+def test_profiles_requested_cycles_only(tmp_path):
+    profiler = CycleProfiler()
+    profiler.start(2)
+    kept = []
+
+    for _ in range(3):
+        with profiler.cycle():
+            kept.append(allocate())
+            # work in another thread is included through call()
+            thread = threading.Thread(target=profiler.call, args=(allocate,))
+            thread.start()
+            thread.join()
+
+    assert profiler.finished
+    assert profiler.cycles == 2
+    assert not tracemalloc.is_tracing()
+    assert "allocate" in profiler.report()
+    assert "test_profiler.py" in profiler.top_allocations(limit=5)
+    assert profiler.dump_stats(str(tmp_path / "cycles.prof"))
+    stats = pstats.Stats(str(tmp_path / "cycles.prof"))
+    calls = [stat[0] for func, stat in stats.stats.items() if func[2] == "allocate"]
+    assert calls == [4]
+
+
+def test_cycle_handed_between_threads():
+    profiler = CycleProfiler()
+    profiler.start(1)
+
+    assert profiler.begin()
+    # only the requested cycles are begun
+    assert not profiler.begin()
+
+    def stage():
+        with profiler.thread():
+            allocate()
+
+    for _ in range(2):
+        thread = threading.Thread(target=stage)
+        thread.start()
+        thread.join()
+    assert not profiler.finished
+    profiler.end()
+
+    assert profiler.finished
+    assert not profiler.active
+    assert not tracemalloc.is_tracing()
+    stats = profiler.stats()
+    calls = [stat[0] for func, stat in stats.stats.items() if func[2] == "allocate"]
+    assert calls == [2]
+
+
+def test_thread_skipped_while_another_profiler_is_active():
+    logger = MagicMock()
+    profiler = CycleProfiler(logger=logger)
+    profiler.start(1)
+
+    with profiler.cycle():
+        allocate()
+        # as cProfile of Python 3.12+ while the cycle is profiled
+        with patch.object(
+            cProfile.Profile,
+            "enable",
+            side_effect=ValueError("Another profiling tool is already active"),
+        ):
+            with profiler.thread():
+                allocate()
+
+    assert profiler.finished
+    assert profiler.skipped == 1
+    logger.warning.assert_called_once()
+    assert "1 threads not profiled" in profiler.report()
+    stats = profiler.stats()
+    calls = [stat[0] for func, stat in stats.stats.items() if func[2] == "allocate"]
+    assert calls == [2]
+
+
+def test_start_requires_cycles():
+    with pytest.raises(ValueError):
+        CycleProfiler().start(0)
@@ -0,0 +1,77 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from prometheus_client import CollectorRegistry
+
+from publisher import MqttPublisher, PublisherMetrics
+
+
+def create_publisher(**kwargs) -> tuple[MqttPublisher, MagicMock]:
+    publish = MagicMock()
+    metrics = PublisherMetrics(CollectorRegistry())
+    return MqttPublisher(publish, "default", metrics, **kwargs), publish
+
+
+def publish_cycle(publisher: MqttPublisher, value: str, timestamp: str) -> None:
+    with publisher.batch():
+        publisher.publish("value", value, True)
+        publisher.publish("lastUpdateTime", timestamp, True, volatile=True)
+
+
+@patch("time.time")
+def test_unchanged_payload_is_skipped_until_heartbeat(mock_time):
+    publisher, publish = create_publisher(prefix="water/", heartbeat=300)
+
+    mock_time.return_value = 1000
+    publish_cycle(publisher, "1.00000", "t1")
+    mock_time.return_value = 1060
+    publish_cycle(publisher, "1.00000", "t2")
+    assert publish.call_count == 2
+
+    mock_time.return_value = 1120
+    publish_cycle(publisher, "1.00100", "t3")
+    publish.assert_any_call("water/value", "1.00100", True)
+    publish.assert_any_call("water/lastUpdateTime", "t3", True)
+    assert publish.call_count == 4
+
+    # heartbeat re-sends the unchanged payload
+    mock_time.return_value = 1420
+    publish_cycle(publisher, "1.00100", "t4")
+    publish.assert_any_call("water/lastUpdateTime", "t4", True)
+    assert publish.call_count == 6
+    assert publisher.suppressed_metric._value.get() == 2
+    assert publisher.published_metric._value.get() == 6
+
+
+def test_heartbeat_zero_publishes_every_payload():
+    publisher, publish = create_publisher(heartbeat=0)
+
+    publish_cycle(publisher, "1.00000", "t1")
+    publish_cycle(publisher, "1.00000", "t1")
+
+    assert publish.call_count == 4
+
+
+def test_not_retained_is_always_published():
+    publisher, publish = create_publisher(heartbeat=300)
+
+    publisher.publish("event", "x", False)
+    publisher.publish("event", "x", False)
+
+    assert publish.call_count == 2
+
+
+def test_state_topic():
+    publisher, publish = create_publisher(
+        prefix="water/", heartbeat=300, topics=False, state_topic="state"
+    )
+
+    publish_cycle(publisher, "1.00000", "t1")
+    publish_cycle(publisher, "1.00000", "t2")
+
+    publish.assert_called_once()
+    topic, payload, retain = publish.call_args.args
+    assert topic == "water/state"
+    assert json.loads(payload) == {"value": 1.0, "lastUpdateTime": "t1"}
+    assert retain
+    assert publisher.published_bytes_metric._value.get() == len(topic) + len(payload)
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import tarfile
+import threading
+
+from recorder import QUEUE_SIZE, FlightRecorder
+from replay import list_images
+
+START = 1700000000
+
+
+def record(recorder: FlightRecorder, count: int, size: int = 100) -> None:
+    for i in range(count):
+        recorder.record(START + i, b"x" * size, ".jpg", {"litre": i})
+        recorder.flush()
+
+
+def test_ring_keeps_latest_records(tmp_path):
+    writes = []
+    recorder = FlightRecorder(
+        str(tmp_path), 3, 10000, on_write=lambda *args: writes.append(args)
+    )
+
+    record(recorder, 5)
+    recorder.close()
+
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 6
+    with open(tmp_path / names[-1]) as file:
+        assert json.load(file) == {"sequence": 5, "litre": 4}
+    assert len(writes) == 5
+    assert writes[-1][1] == recorder.bytes
+    # frames are named by time for replay
+    assert len(list_images(str(tmp_path))) == 3
+
+
+def test_disk_usage_is_capped(tmp_path):
+    recorder = FlightRecorder(str(tmp_path), 100, 1000)
+
+    record(recorder, 10, size=300)
+    recorder.close()
+
+    assert list(recorder.entries) == [8, 9, 10]
+    assert recorder.bytes <= 1000
+    assert recorder.bytes == sum(f.stat().st_size for f in tmp_path.iterdir())
+
+
+def test_records_survive_restart(tmp_path):
+    recorder = FlightRecorder(str(tmp_path), 3, 10000)
+    record(recorder, 2)
+    recorder.close()
+
+    recorder = FlightRecorder(str(tmp_path), 3, 10000)
+    record(recorder, 2)
+    recorder.close()
+
+    assert list(recorder.entries) == [2, 3, 4]
+
+
+def test_record_is_dropped_when_writer_is_behind(tmp_path):
+    blocked = threading.Event()
+    release = threading.Event()
+    drops = []
+
+    def on_write(duration, size):
+        blocked.set()
+        release.wait(5)
+
+    recorder = FlightRecorder(
+        str(tmp_path), 10, 10000, on_write=on_write, on_drop=lambda: drops.append(1)
+    )
+    recorder.record(START, b"x", ".jpg", {})
+    blocked.wait(5)
+    results = [recorder.record(START, b"x", ".jpg", {}) for _ in range(QUEUE_SIZE + 1)]
+    release.set()
+    recorder.close()
+
+    assert results == [True] * QUEUE_SIZE + [False]
+    assert drops == [1]
+
+
+def test_archive(tmp_path):
+    recorder = FlightRecorder(str(tmp_path / "recorder"), 3, 10000)
+    record(recorder, 2)
+    recorder.close()
+
+    file = io.BytesIO()
+    recorder.archive(file)
+    file.seek(0)
+
+    with tarfile.open(fileobj=file) as tar:
+        names = tar.getnames()
+    assert [os.path.splitext(name)[1] for name in names] == [
+        ".jpg",
+        ".json",
+        ".jpg",
+        ".json",
+    ]
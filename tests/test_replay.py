@@ -0,0 +1,79 @@
+import copy
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from meter import Meter
+from replay import image_time, list_images, replay
+
+
+def create_readings(count: int, seed: int) -> tuple[list[datetime], list[float]]:
+    rnd = random.Random(seed)
+    time = datetime(2024, 1, 1, 12, 0, 0)
+    litre = 900.0
+    times, litres = [], []
+    for _ in range(count):
+        time += timedelta(
+            seconds=rnd.choice([5, 30, 60]), microseconds=rnd.randint(0, 999999)
+        )
+        # mostly forward flow, some misreadings backwards
+        litre = round((litre + rnd.uniform(-2, 40)) % 1000, 1)
+        times.append(time)
+        litres.append(litre)
+    return times, litres
+
+
+@pytest.mark.parametrize(
+    "meter",
+    [
+        Meter(m3=1234, m3_already_increased=False, value=1234.9),
+        Meter(m3=5, m3_already_increased=True, value=5.0123456789),
+    ],
+)
+def test_replay_matches_streaming_updates(meter):
+    times, litres = create_readings(2000, seed=meter.m3)
+    streaming = copy.deepcopy(meter)
+
+    series = replay(meter, times, litres)
+
+    for i, (time, litre) in enumerate(zip(times, litres)):
+        streaming.update_litre(litre, time)
+        assert series.m3[i] == streaming.m3
+        assert series.m3_already_increased[i] == streaming.m3_already_increased
+        assert series.value[i] == streaming.value
+        assert series.consumption[i] == streaming.instant_consumption_l_per_min
+    assert meter == streaming
+    assert series.m3[-1] > series.m3[0]
+
+
+def test_replay_continues_from_updated_meter():
+    times, litres = create_readings(20, seed=1)
+    meter = Meter(m3=10, m3_already_increased=False, value=10.5)
+    meter.update_litre(890.0, times[0] - timedelta(seconds=30))
+    streaming = copy.deepcopy(meter)
+
+    replay(meter, times, litres)
+    for time, litre in zip(times, litres):
+        streaming.update_litre(litre, time)
+
+    assert meter == streaming
+
+
+def test_replay_requires_increasing_times():
+    time = datetime(2024, 1, 1)
+    with pytest.raises(ValueError):
+        replay(Meter(m3=0, m3_already_increased=False, value=0), [time, time], [1, 2])
+
+
+def test_image_time(tmp_path):
+    assert image_time("cam_20240101T120005.jpg") == datetime(2024, 1, 1, 12, 0, 5)
+    assert image_time("2024-01-01_12-00-05.jpg") == datetime(2024, 1, 1, 12, 0, 5)
+    assert image_time("1704103200.jpg") == datetime.fromtimestamp(1704103200)
+
+    for name in ["20240101T120010.jpg", "20240101T120005.png", "notes.txt"]:
+        (tmp_path / name).write_bytes(b"")
+    assert [path for _, path in list_images(tmp_path)] == [
+        str(tmp_path / "20240101T120005.png"),
+        str(tmp_path / "20240101T120010.jpg"),
+    ]
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from dials import Dial, read_dials
+from roi import RegionCropper
+
+DIALS = [Dial("dial1", 1000, 600, 50), Dial("dial2", 1200, 600.5, 50)]
+CONF = (
+    "[meter]\n"
+    "dials = 2\n"
+    "dial1 = 1000, 600, 50\n"
+    "dial2 = 1200 600.5 50 ; comment\n"
+    "threshold = 100, 100, 100\n"
+    "[other]\n"
+    "dial1 = 1, 2, 3\n"
+)
+
+
+def create_image(image_format: str = "JPEG") -> bytes:
+    image = Image.new("RGB", (1920, 1080), "white")
+    draw = ImageDraw.Draw(image)
+    for dial in DIALS:
+        draw.ellipse(dial.box, fill="red")
+    data = io.BytesIO()
+    image.save(data, image_format)
+    return data.getvalue()
+
+
+def test_box_and_scale():
+    cropper = RegionCropper(DIALS, margin=20, max_size=160)
+
+    assert cropper.box == (930, 530, 1270, 671)
+    assert cropper.scale == pytest.approx(160 / 340)
+    assert cropper.transform(930, 530, 10) == (0, 0, pytest.approx(10 * 160 / 340))
+    assert RegionCropper(DIALS, margin=20, max_size=1000).scale == 1.0
+    assert RegionCropper([Dial("dial", 10, 10, 5)], margin=20).box == (0, 0, 35, 35)
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+@pytest.mark.parametrize("max_size", [0, 160])
+def test_crop(image_format, max_size):
+    cropper = RegionCropper(DIALS, margin=20, max_size=max_size)
+
+    with Image.open(io.BytesIO(cropper.crop(create_image(image_format)))) as image:
+        assert image.format == image_format
+        assert image.size == (
+            round(340 * cropper.scale),
+            round(141 * cropper.scale),
+        )
+        # dial centers and the margin
+        for dial in DIALS:
+            x, y, _ = cropper.transform(dial.x, dial.y, dial.r)
+            red, green, _ = image.getpixel((int(x), int(y)))
+            assert red > 200 and green < 60
+        assert image.getpixel((1, 1))[1] > 200
+
+
+def test_dials_outside_frame():
+    cropper = RegionCropper([Dial("dial", 3000, 100, 50)], margin=20)
+
+    with pytest.raises(ValueError):
+        cropper.crop(create_image())
+
+
+def test_rewrite_conf(tmp_path):
+    conf = tmp_path / "dialEye.conf"
+    conf.write_text(CONF)
+    cropper = RegionCropper(DIALS, margin=20, max_size=170)
+
+    cropper.rewrite_conf(str(conf), str(tmp_path / "roi.conf"))
+
+    assert (tmp_path / "roi.conf").read_text() == CONF.replace(
+        "1000, 600, 50", "35, 35, 25"
+    ).replace("1200 600.5 50", "135 35.2 25")
+    assert read_dials(str(tmp_path / "roi.conf"))[0] == Dial("dial1", 35, 35, 25)
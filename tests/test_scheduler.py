@@ -0,0 +1,44 @@
+import threading
+import time
+
+from scheduler import AdaptiveScheduler
+
+
+def test_next_interval():
+    scheduler = AdaptiveScheduler(lambda: False, min_interval=5, max_interval=60)
+
+    assert scheduler.next_interval(active=True) == 5
+    scheduler.interval = scheduler.next_interval(active=False)
+    assert scheduler.interval == 10
+    scheduler.interval = scheduler.next_interval(active=False)
+    scheduler.interval = scheduler.next_interval(active=False)
+    assert scheduler.interval == 40
+    scheduler.interval = scheduler.next_interval(active=False)
+    assert scheduler.interval == 60
+    assert scheduler.next_interval(active=True) == 5
+
+
+def test_backoff_and_prompt_stop():
+    activity = [True, False, False, False]
+    intervals = []
+    done = threading.Event()
+
+    def callback():
+        active = activity.pop(0) if activity else False
+        if not activity:
+            done.set()
+        return active
+
+    scheduler = AdaptiveScheduler(
+        callback,
+        min_interval=0.01,
+        max_interval=0.04,
+        on_interval_change=intervals.append,
+    )
+    scheduler.start()
+    assert done.wait(5)
+
+    start = time.monotonic()
+    scheduler.stop(timeout=5)
+    assert time.monotonic() - start < 1
+    assert intervals[:5] == [0.01, 0.01, 0.02, 0.04, 0.04]
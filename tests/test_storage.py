@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from storage import DataWriter, atomic_write, backup_filename
+
+
+def test_atomic_write(tmp_path):
+    filename = str(tmp_path / "data.txt")
+
+    atomic_write(filename, "5;False;5.567000")
+    atomic_write(filename, "5;False;5.569100")
+
+    assert open(filename).read() == "5;False;5.569100"
+    assert open(backup_filename(filename)).read() == "5;False;5.567000"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["data.txt", "data.txt.bak"]
+
+
+def test_backup_copied_without_links(tmp_path):
+    filename = str(tmp_path / "data.txt")
+    atomic_write(filename, "5;False;5.567000")
+
+    with patch("os.link", side_effect=OSError("Operation not permitted")):
+        atomic_write(filename, "5;False;5.569100")
+
+    assert open(filename).read() == "5;False;5.569100"
+    assert open(backup_filename(filename)).read() == "5;False;5.567000"
+    assert not os.path.samefile(filename, backup_filename(filename))
+
+
+def test_writes_coalesced_and_written_behind():
+    written = []
+    event = threading.Event()
+
+    def write(data):
+        written.append(data)
+        event.set()
+
+    writer = DataWriter(write, interval=0.3, name="writer", logger=MagicMock())
+    writer.put("1")
+    writer.put("2")
+    assert written == []
+
+    # written after interval without further data
+    assert event.wait(5)
+    assert written == ["2"]
+
+    event.clear()
+    writer.put("3")
+    writer.put("4", urgent=True)
+    assert event.wait(0.2)
+    assert written == ["2", "4"]
+
+    writer.put("5")
+    assert writer.close(5)
+    assert written == ["2", "4", "5"]
+
+
+def test_failed_write_retried():
+    logger = MagicMock()
+    write = MagicMock(side_effect=[OSError("No space left on device"), None])
+    writer = DataWriter(write, interval=0, name="writer", logger=logger)
+
+    with patch("storage.RETRY_DELAY", 0.1):
+        writer.put("1")
+        deadline = time.monotonic() + 5
+        while write.call_count < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert write.call_count == 2
+    logger.error.assert_called_once()
+    assert writer.close(5)
+    assert write.call_count == 2
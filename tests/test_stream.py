@@ -0,0 +1,123 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from frame import FrameError, FrameFetcher
+from stream import MjpegParser, MjpegStream, boundary
+
+
+def multipart(frames: list[bytes], content_length: bool = True) -> bytes:
+    data = b""
+    for frame in frames:
+        data += b"--frame\r\nContent-Type: image/jpeg\r\n"
+        if content_length:
+            data += b"Content-Length: %d\r\n" % len(frame)
+        data += b"\r\n" + frame + b"\r\n"
+    return data
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_parser_byte_by_byte(content_length):
+    frames = [b"\xff\xd8 first \r\n\r\n \xff\xd9", b"\xff\xd8 second \xff\xd9"] * 2
+    data = multipart(frames, content_length) + b"--frame\r\n"
+    parser = MjpegParser("frame")
+
+    received = []
+    for i in range(len(data)):
+        received += parser.feed(data[i : i + 1])
+
+    assert received == frames
+    # only the part being received is buffered
+    assert len(parser._buffer) < 32
+
+
+def test_boundary():
+    assert boundary("multipart/x-mixed-replace; boundary=frame") == "frame"
+    assert boundary('multipart/x-mixed-replace;boundary="--myboundary"') == (
+        "--myboundary"
+    )
+    with pytest.raises(ValueError):
+        boundary("image/jpeg")
+
+
+class MjpegHandler(BaseHTTPRequestHandler):
+    frames = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.end_headers()
+        try:
+            while True:
+                MjpegHandler.frames += 1
+                frame = b"\xff\xd8 frame %d \xff\xd9" % MjpegHandler.frames
+                self.wfile.write(multipart([frame]))
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mjpeg_camera():
+    MjpegHandler.frames = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MjpegHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/stream"
+    server.shutdown()
+    server.server_close()
+
+
+def test_latest_frame_from_stream(mjpeg_camera, tmp_path):
+    fetcher = FrameFetcher(mjpeg_camera, str(tmp_path / "frame"), 2, mjpeg=True)
+    try:
+        frame = fetcher.fetch()
+        assert frame.data.startswith(b"\xff\xd8 frame ")
+        assert frame.path == str(tmp_path / "frame.jpg")
+        assert (tmp_path / "frame.jpg").read_bytes() == frame.data
+        assert fetcher.probe(timeout=1)
+
+        time.sleep(0.2)
+        latest = fetcher.fetch()
+        assert latest.changed
+        assert latest.data != frame.data
+    finally:
+        fetcher.close()
+
+
+def test_stream_unavailable(tmp_path):
+    fetcher = FrameFetcher(
+        "http://127.0.0.1:1/stream", str(tmp_path / "frame"), 0.2, mjpeg=True
+    )
+    try:
+        with pytest.raises(FrameError):
+            fetcher.fetch()
+        assert not fetcher.probe(timeout=0.1)
+    finally:
+        fetcher.close()
+
+
+def test_backoff_reset_by_frame(mjpeg_camera):
+    stream = MjpegStream(mjpeg_camera, 2)
+    try:
+        sequence = stream.latest(timeout=1)[0]
+        # earlier disconnects have grown the delay
+        stream._backoff = stream.max_backoff
+        time.sleep(0.2)
+        assert stream.latest(timeout=1)[0] > sequence
+        assert stream._backoff == 1.0
+    finally:
+        stream.stop()
+
+
+def test_latest_after_stop(mjpeg_camera):
+    stream = MjpegStream(mjpeg_camera, 2)
+    stream.stop()
+    assert stream.latest(timeout=0.1) is None
+    assert stream._thread is None
@@ -0,0 +1,65 @@
+import contextvars
+import logging
+
+import pytest
+
+from prometheus_client import CollectorRegistry, Histogram
+
+from tracing import StageTimer, TraceLogger, trace
+
+
+def test_trace_id_in_log_lines(caplog):
+    logger = TraceLogger(logging.getLogger("test"))
+
+    with caplog.at_level(logging.INFO):
+        logger.info("outside")
+        with trace() as trace_id:
+            logger.info("value=%d", 1)
+        logger.info("after")
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "outside",
+        f"[{trace_id}] value=1",
+        "after",
+    ]
+
+
+def test_stage_timer():
+    registry = CollectorRegistry()
+    stages = StageTimer(
+        Histogram("stage_duration_seconds", "", ["stage"], registry=registry)
+    )
+
+    with stages.measure("fetch"):
+        pass
+    stages.observe("recognition", 0.2)
+    stages.observe("recognition", 0.3)
+
+    def count(stage):
+        return registry.get_sample_value(
+            "stage_duration_seconds_count", {"stage": stage}
+        )
+
+    assert count("fetch") == 1
+    assert count("recognition") == 2
+    assert registry.get_sample_value(
+        "stage_duration_seconds_sum", {"stage": "recognition"}
+    ) == pytest.approx(0.5)
+
+
+def test_stage_durations_per_context():
+    registry = CollectorRegistry()
+    stages = StageTimer(
+        Histogram("stage_duration_seconds", "", ["stage"], registry=registry)
+    )
+    stages.start()
+    stages.observe("fetch", 0.1)
+
+    # overlapping cycle in its own context
+    context = contextvars.copy_context()
+    context.run(stages.start)
+    context.copy().run(stages.observe, "fetch", 0.2)
+    context.copy().run(stages.observe, "recognition", 0.3)
+
+    assert stages.durations == {"fetch": 0.1}
+    assert context.run(lambda: stages.durations) == {"fetch": 0.2, "recognition": 0.3}